@@ -0,0 +1,5 @@
+"""
+mp3po : decode MP3 files
+"""
+
+from .probe import ProbeResult, probe
@@ -0,0 +1,61 @@
+"""
+__main__.py : command line tools
+
+usage: python -m mp3po decode [--format {s16le,f32le}] [--raw] [--max-frames N] IN OUT
+decodes IN to a WAV file (or with --raw, bare samples) at OUT. OUT can be - for stdout
+"""
+
+import argparse
+import os
+import sys
+
+from .header import ChannelEncodings
+from .mp3 import MP3File
+from .output import RawWriter, SAMPLE_FORMATS, S16LE, WavWriter, decode_to
+
+def decode(args) -> int:
+    """
+    decode : decode one file, frame by frame, straight into the output
+    """
+    mp3 = MP3File(args.input)
+    header = mp3.first_header
+    if header is None:
+        print('{0}: no MP3 frames found'.format(args.input), file=sys.stderr)
+        return 1
+    channels = 1 if header.channel == ChannelEncodings.MONO else 2
+    out = sys.stdout.buffer if args.output == '-' else args.output
+    if args.raw:
+        writer = RawWriter(out, channels, args.format)
+    else:
+        writer = WavWriter(out, channels, header.frequency, args.format)
+    with writer:
+        decode_to(mp3, writer, args.max_frames)
+    return 0
+
+def main(argv=None) -> int:
+    """
+    main : run the command given on the command line
+    """
+    parser = argparse.ArgumentParser(prog='python -m mp3po', description='MP3 tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    parser_decode = commands.add_parser('decode', help='decode an MP3 file to WAV or raw PCM')
+    parser_decode.add_argument('input', help='the MP3 file')
+    parser_decode.add_argument('output', help='where to write the PCM, - for stdout')
+    parser_decode.add_argument('--format', choices=SAMPLE_FORMATS, default=S16LE,
+                               help='sample format (default: s16le)')
+    parser_decode.add_argument('--raw', action='store_true',
+                               help='write bare interleaved samples, with no WAV header')
+    parser_decode.add_argument('--max-frames', type=int, default=None,
+                               help='decode at most this many frames')
+    parser_decode.set_defaults(run=decode)
+    args = parser.parse_args(argv)
+    try:
+        return args.run(args)
+    except BrokenPipeError:
+        # whatever was reading stdout stopped (e.g. head): stop quietly, and keep the
+        # interpreter from complaining when it flushes stdout on the way out
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""
+batch.py : decode lots of files at once, one process per core
+
+decoding is CPU bound pure Python, so threads don't help: files are farmed out to a process
+pool instead. PCM comes back through shared memory, so only a small description of each
+file is pickled between processes
+
+long files can also be split into segments decoded by different processes and stitched
+back together, sample for sample the same as decoding them in one go
+
+usage: python -m mp3po.batch [-j WORKERS] [--chunksize N] [--unordered] [--split]
+                             PATH [PATH ...]
+prints one JSON summary per file. directories are searched for .mp3 files
+"""
+
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import sys
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+
+from .mp3 import MP3File
+
+# frames to decode per read_pcm call
+FRAMES_PER_READ = 256
+
+# granules decoded and thrown away before each segment of a split file. the IMDCT overlap only
+# holds what the previous granule left, so the first granule puts it right, and the
+# polyphase filterbank only holds 16 of the 18 blocks each granule makes, so the second
+# granule's output refills it. after that the decoder is in exactly the state it would be in
+# decoding the file from the start. that's one MPEG 1 frame, but two MPEG 2/2.5 frames
+WARMUP_GRANULES = 2
+
+# how far a split point may move to land where the bit reservoir is empty
+SPLIT_SEARCH_FRAMES = 16
+
+class BatchResult(object):
+    """
+    BatchResult : what decoding one file gave
+
+    Attributes :
+    - path : the file
+    - channels : number of channels
+    - frequency : sampling rate
+    - samples : samples per channel
+    - peak : largest absolute sample, per channel
+    - rms : root mean square of the samples, per channel
+    - pcm : list of array('d') of samples per channel, or None for summaries only
+    - error : why the file couldn't be decoded, or None
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.channels = 0
+        self.frequency = 0
+        self.samples = 0
+        self.peak = []
+        self.rms = []
+        self.pcm = None
+        self.error = None
+        # name of the shared memory block holding the PCM on its way back from a worker
+        self._shared_name = None
+
+    def duration(self) -> float:
+        """
+        duration : length of the decoded audio in seconds
+        """
+        return self.samples / self.frequency if self.frequency else 0.0
+
+    def summary(self) -> dict:
+        """
+        summary : everything but the PCM, for printing
+        """
+        return {
+            'path' : self.path,
+            'channels' : self.channels,
+            'frequency' : self.frequency,
+            'samples' : self.samples,
+            'duration' : self.duration(),
+            'peak' : self.peak,
+            'rms' : self.rms,
+            'error' : self.error,
+        }
+
+def iter_paths(paths) -> list:
+    """
+    iter_paths : the files in paths, with directories replaced by the .mp3 files under them
+    in sorted order
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith('.mp3'))
+        else:
+            found.append(path)
+    return found
+
+def decode_file(path: str, max_frames=None) -> BatchResult:
+    """
+    decode_file : decode a whole file (or its first max_frames frames) in this process
+    """
+    result = BatchResult(path)
+    try:
+        mp3 = MP3File(path)
+        if mp3.first_header is None:
+            result.error = 'no MP3 frames found'
+            return result
+        result.frequency = mp3.first_header.frequency
+        pcm = _read_pcm(mp3, max_frames)
+    except Exception as err: # pylint: disable=broad-except
+        # one bad file shouldn't stop the batch
+        result.error = '{0}: {1}'.format(type(err).__name__, err)
+        return result
+    _set_pcm(result, pcm)
+    return result
+
+def _read_pcm(mp3: MP3File, max_frames=None) -> list:
+    """
+    _read_pcm : decode from the current position to the end of the file or for max_frames
+    frames, FRAMES_PER_READ frames at a time
+    """
+    pcm = []
+    frames = 0
+    while max_frames is None or frames < max_frames:
+        count = FRAMES_PER_READ if max_frames is None else min(FRAMES_PER_READ,
+                                                               max_frames - frames)
+        block = mp3.read_pcm(count)
+        if not block:
+            break
+        frames += count
+        if not pcm:
+            pcm = block
+        else:
+            for chan, samples in enumerate(block):
+                pcm[chan].extend(samples)
+    return pcm
+
+def _set_pcm(result: BatchResult, pcm: list):
+    """
+    _set_pcm : fill in a result's samples and the summary of them
+    """
+    result.pcm = pcm
+    result.channels = len(pcm)
+    result.samples = len(pcm[0]) if pcm else 0
+    result.peak = []
+    result.rms = []
+    for samples in pcm:
+        result.peak.append(max(map(abs, samples), default=0.0))
+        result.rms.append(math.sqrt(math.fsum(s * s for s in samples) / len(samples))
+                          if samples else 0.0)
+
+def _decode_chunk(paths: list, keep_pcm: bool, max_frames) -> list:
+    """
+    _decode_chunk : worker side: decode some files, leaving their PCM in shared memory
+    """
+    results = []
+    for path in paths:
+        result = decode_file(path, max_frames)
+        if result.pcm is not None and keep_pcm and result.samples:
+            _to_shared_memory(result)
+        result.pcm = None
+        results.append(result)
+    return results
+
+def _to_shared_memory(result: BatchResult):
+    """
+    _to_shared_memory : copy the PCM of a result into a new shared memory block, one channel
+    after the other. the block outlives this process until the parent unlinks it
+    """
+    size = result.samples * result.channels * array('d').itemsize
+    block = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        position = 0
+        for samples in result.pcm:
+            raw_bytes = samples.tobytes()
+            block.buf[position:position + len(raw_bytes)] = raw_bytes
+            position += len(raw_bytes)
+        result._shared_name = block.name
+    finally:
+        block.close()
+
+def _from_shared_memory(result: BatchResult):
+    """
+    _from_shared_memory : parent side: take the PCM out of a result's shared memory block
+    and free the block
+    """
+    if result._shared_name is None:
+        return
+    block = shared_memory.SharedMemory(name=result._shared_name)
+    try:
+        channel_size = result.samples * array('d').itemsize
+        result.pcm = []
+        for chan in range(0, result.channels):
+            samples = array('d')
+            samples.frombytes(block.buf[chan * channel_size:(chan + 1) * channel_size])
+            result.pcm.append(samples)
+    finally:
+        block.close()
+        block.unlink()
+        result._shared_name = None
+
+def decode_files(paths, workers=None, chunksize=1, ordered=True, keep_pcm=True,
+                 max_frames=None):
+    """
+    decode_files : decode many files over a pool of worker processes, generating a
+    BatchResult for each one. directories in paths are searched for .mp3 files
+
+    workers : number of processes, the number of CPUs by default
+    chunksize : files handed to a worker at a time. more files per chunk means less overhead
+                per file, fewer means better load balancing
+    ordered : whether results come out in the order of paths or as soon as they're ready
+    keep_pcm : whether to return the samples or just the summaries
+    max_frames : decode at most this many frames of each file
+    """
+    paths = iter_paths(paths)
+    chunksize = max(1, chunksize)
+    chunks = [paths[i:i + chunksize] for i in range(0, len(paths), chunksize)]
+    # the workers share this process's resource tracker, so blocks they create and this
+    # process unlinks are accounted for once, and leaked ones are cleaned up at exit
+    resource_tracker.ensure_running()
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    futures = [executor.submit(_decode_chunk, chunk, keep_pcm, max_frames) for chunk in chunks]
+    try:
+        done = futures if ordered else concurrent.futures.as_completed(futures)
+        for future in done:
+            for result in future.result():
+                _from_shared_memory(result)
+                yield result
+    finally:
+        # stopped early: free the blocks of results nobody is going to collect
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures:
+            if not future.cancelled() and future.exception() is None:
+                for result in future.result():
+                    _release(result)
+
+def _release(result: BatchResult):
+    """
+    _release : unlink a result's shared memory block without reading it
+    """
+    if result._shared_name is None:
+        return
+    try:
+        block = shared_memory.SharedMemory(name=result._shared_name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+    result._shared_name = None
+
+def warmup_frames(header) -> int:
+    """
+    warmup_frames : frames to warm up on before a segment of a file with this header: two
+    granules make one MPEG 1 frame, but two MPEG 2/2.5 frames
+    """
+    granules = 1 if header.lsf else 2
+    return -(-WARMUP_GRANULES // granules)
+
+def split_points(index, segments: int, warmup=None) -> list:
+    """
+    split_points : cut the frames of a FrameIndex into up to segments pieces of about the
+    same length. returns (warm-up start, start, end) frame numbers for each. split points are
+    moved forward, if there's one close by, to where the warm-up frames start with an empty
+    bit reservoir (main_data_begin 0), so the worker doesn't have to read earlier frames.
+    warmup is the number of warm-up frames, by default warmup_frames of the first frame
+    """
+    frames = len(index)
+    if warmup is None:
+        warmup = warmup_frames(index.header(0)) if frames else 0
+    size = max(1, -(-frames // max(1, segments)))
+    starts = [0]
+    for target in range(size, frames, size):
+        start = target
+        for candidate in range(target, min(target + SPLIT_SEARCH_FRAMES, frames)):
+            if index.main_data_begin(max(0, candidate - warmup)) == 0:
+                start = candidate
+                break
+        if start > starts[-1]:
+            starts.append(start)
+    ends = starts[1:] + [frames]
+    return [(max(0, start - warmup), start, end) for start, end in zip(starts, ends)]
+
+def _decode_segment(path: str, warm_start: int, start: int, end: int) -> BatchResult:
+    """
+    _decode_segment : worker side: decode frames start to end of a file after warming up on
+    the frames from warm_start, leaving the PCM in shared memory
+    """
+    result = BatchResult(path)
+    mp3 = MP3File(path)
+    index = mp3.frame_index()
+    mp3.seek_frame(warm_start)
+    pcm = _read_pcm(mp3, end - warm_start)
+    warmup = index.samples[start] - index.samples[warm_start]
+    _set_pcm(result, [samples[warmup:] for samples in pcm])
+    if result.samples:
+        _to_shared_memory(result)
+    result.pcm = None
+    return result
+
+def decode_file_parallel(path: str, workers=None, segments=None,
+                         warmup=None) -> BatchResult:
+    """
+    decode_file_parallel : decode one file split into segments (one per worker by default)
+    decoded by a pool of worker processes. with the default warm-up (warmup_frames of the
+    first frame), the PCM is identical to decode_file's for MPEG 1 and MPEG 2/2.5 alike.
+    fewer warm-up frames leave the samples just after each split point off
+    """
+    result = BatchResult(path)
+    try:
+        mp3 = MP3File(path)
+        if mp3.first_header is None:
+            result.error = 'no MP3 frames found'
+            return result
+        result.frequency = mp3.first_header.frequency
+        workers = workers or os.cpu_count() or 1
+        points = split_points(mp3.frame_index(), segments or workers, warmup)
+    except Exception as err: # pylint: disable=broad-except
+        result.error = '{0}: {1}'.format(type(err).__name__, err)
+        return result
+    resource_tracker.ensure_running()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_decode_segment, path, warm_start, start, end)
+                   for warm_start, start, end in points]
+    pieces = []
+    for future in futures:
+        if future.exception() is not None:
+            err = future.exception()
+            result.error = '{0}: {1}'.format(type(err).__name__, err)
+            continue
+        piece = future.result()
+        if result.error is None:
+            _from_shared_memory(piece)
+            pieces.append(piece)
+        else:
+            _release(piece)
+    if result.error is not None:
+        for piece in pieces:
+            piece.pcm = None
+        return result
+    pcm = []
+    for piece in pieces:
+        if not pcm:
+            pcm = piece.pcm or []
+        else:
+            for chan, samples in enumerate(piece.pcm or []):
+                pcm[chan].extend(samples)
+    _set_pcm(result, pcm)
+    return result
+
+def main(argv=None):
+    """
+    main : decode the files given on the command line and print a summary of each
+    """
+    parser = argparse.ArgumentParser(prog='python -m mp3po.batch',
+                                     description='decode MP3 files in parallel')
+    parser.add_argument('paths', nargs='+', help='files, or directories to search for .mp3s')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    parser.add_argument('--chunksize', type=int, default=1, help='files per task')
+    parser.add_argument('--unordered', action='store_true',
+                        help='print results as they finish instead of in order')
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='decode at most this many frames per file')
+    parser.add_argument('--split', action='store_true',
+                        help='decode one file at a time, split across the workers')
+    args = parser.parse_args(argv)
+    if args.split:
+        results = (decode_file_parallel(path, args.workers) for path in iter_paths(args.paths))
+    else:
+        results = decode_files(args.paths, args.workers, args.chunksize, not args.unordered,
+                               keep_pcm=False, max_frames=args.max_frames)
+    failed = 0
+    for result in results:
+        failed += result.error is not None
+        print(json.dumps(result.summary()))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
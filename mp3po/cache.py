@@ -0,0 +1,298 @@
+"""
+cache.py : keep decoded PCM around for files that get decoded over and over
+
+PCM is cached in blocks of a fixed number of frames, keyed by the file and the block's
+frame range, so overlapping clips of the same file share blocks. a clip made only of cached
+blocks doesn't open the file at all: no headers, side info, huffman decoding or synthesis
+
+blocks live in memory, least recently used first out once the byte budget is spent. with a
+spill directory, blocks pushed out of memory go to raw files there instead of being thrown
+away, and are read straight back into arrays (and memory) when they're needed again
+
+the cache isn't thread safe
+"""
+
+import hashlib
+import os
+from array import array
+from collections import OrderedDict
+
+from .batch import warmup_frames
+from .mp3 import MP3File
+
+# frames per cached block
+BLOCK_FRAMES = 64
+
+# MP3Files (with their frame indexes) kept open for decoding misses
+OPEN_FILES = 8
+
+# bytes and file object sources whose keys are remembered, so they're only hashed once
+REMEMBERED_KEYS = 64
+
+def file_key(source) -> tuple:
+    """
+    file_key : what identifies a file's contents: its path, size and modification time for a
+    path, a hash of the contents for bytes or a file object
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return ('blake2b', hashlib.blake2b(source, digest_size=16).hexdigest())
+    if hasattr(source, 'read'):
+        digest = hashlib.blake2b(digest_size=16)
+        source.seek(0)
+        for chunk in iter(lambda: source.read(MP3File.chunk_size), b''):
+            digest.update(chunk)
+        return ('blake2b', digest.hexdigest())
+    status = os.stat(source)
+    return ('path', os.path.realpath(source), status.st_size, status.st_mtime_ns)
+
+class CacheStats(object):
+    """
+    CacheStats : what the cache has been doing, counted in blocks
+
+    Attributes :
+    - hits : blocks found in memory
+    - spill_hits : blocks found in the spill directory
+    - misses : blocks that had to be decoded
+    - evictions : blocks pushed out of memory
+    - spills : of those, blocks written to the spill directory
+    - spill_evictions : blocks deleted from the spill directory to make room
+    - memory_bytes : bytes of PCM in memory
+    - spill_bytes : bytes of PCM in the spill directory
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+        self.spill_evictions = 0
+        self.memory_bytes = 0
+        self.spill_bytes = 0
+
+    def hit_rate(self) -> float:
+        """
+        hit_rate : the fraction of blocks that didn't have to be decoded
+        """
+        lookups = self.hits + self.spill_hits + self.misses
+        return (self.hits + self.spill_hits) / lookups if lookups else 0.0
+
+    def summary(self) -> dict:
+        """
+        summary : the counts as a dict, for printing
+        """
+        return dict(vars(self), hit_rate=self.hit_rate())
+
+class DecodeCache(object):
+    """
+    DecodeCache : decode clips of files, through an LRU cache of decoded blocks
+
+        cache = DecodeCache(max_bytes=256 * 1024 * 1024)
+        pcm = cache.read_pcm('song.mp3', start_frame, nframes)
+
+    the PCM is sample for sample what decoding the whole file gives: a block decoded on its
+    own starts warmup_frames early (two granules, for MPEG 1 and 2/2.5 alike), with a primed
+    bit reservoir, like a split batch decode
+
+    Attributes :
+    - max_bytes : memory budget for the PCM
+    - spill_dir : directory for blocks pushed out of memory, or None to drop them
+    - max_spill_bytes : budget for the spill directory
+    - block_frames : frames per block
+    - stats : a CacheStats
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, spill_dir=None, max_spill_bytes=None,
+                 block_frames=BLOCK_FRAMES):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = (max_spill_bytes if max_spill_bytes is not None
+                                else 4 * max_bytes)
+        self.block_frames = block_frames
+        self.stats = CacheStats()
+        # (file key, first frame, end frame) -> (frames, list of array('d') per channel)
+        self._blocks = OrderedDict()
+        # (file key, first frame, end frame) -> (path, frames, channels, bytes)
+        self._spilled = OrderedDict()
+        # file key -> MP3File
+        self._files = OrderedDict()
+        # id of a bytes or file object source -> (source, file key)
+        self._keys = OrderedDict()
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def read_pcm(self, source, start_frame: int, nframes=None, key=None) -> list:
+        """
+        read_pcm : decode nframes frames (or up to the end of the file) starting at frame
+        start_frame of source, a path, bytes or a seekable file object, as for MP3File.
+        returns a list with one array('d') of samples per channel. key identifies the
+        file's contents. by default it's file_key(source), which for bytes and file objects is
+        only worked out the first time a source is seen: they're taken not to change
+        """
+        key = key if key is not None else self._key(source)
+        end_frame = None if nframes is None else start_frame + nframes
+        pcm = []
+        block = start_frame // self.block_frames
+        while end_frame is None or block * self.block_frames < end_frame:
+            first = block * self.block_frames
+            frames, channels = self._block(source, key, block)
+            low = max(start_frame, first) - first
+            high = frames if end_frame is None else min(frames, end_frame - first)
+            if frames and high > low:
+                per_frame = len(channels[0]) // frames
+                if not pcm:
+                    pcm = [array('d') for _ in channels]
+                for out, samples in zip(pcm, channels):
+                    out.extend(samples[low * per_frame:high * per_frame])
+            if frames < self.block_frames:
+                # the end of the file
+                break
+            block += 1
+        return pcm
+
+    def clear(self):
+        """
+        clear : empty the cache, deleting any spilled blocks
+        """
+        for path, _, _, _ in self._spilled.values():
+            _remove(path)
+        self._blocks.clear()
+        self._spilled.clear()
+        self._files.clear()
+        self._keys.clear()
+        self.stats.memory_bytes = 0
+        self.stats.spill_bytes = 0
+
+    def _key(self, source) -> tuple:
+        """
+        _key : file_key(source), hashing the contents of a bytes or file object source only
+        the first time it's seen. remembered sources are held on to, so their ids can't be
+        reused by other objects
+        """
+        if not isinstance(source, (bytes, bytearray, memoryview)) and not hasattr(source,
+                                                                                'read'):
+            # a path: stat is cheap
+            return file_key(source)
+        remembered = self._keys.get(id(source))
+        if remembered is not None and remembered[0] is source:
+            self._keys.move_to_end(id(source))
+            return remembered[1]
+        key = file_key(source)
+        self._keys[id(source)] = (source, key)
+        while len(self._keys) > REMEMBERED_KEYS:
+            self._keys.popitem(last=False)
+        return key
+
+    def _block(self, source, key: tuple, block: int) -> (int, list):
+        """
+        _block : (frames, PCM per channel) of a block, from memory, the spill directory, or
+        by decoding it. a block with fewer than block_frames frames is the last one
+        """
+        first = block * self.block_frames
+        block_key = (key, first, first + self.block_frames)
+        entry = self._blocks.get(block_key)
+        if entry is not None:
+            self._blocks.move_to_end(block_key)
+            self.stats.hits += 1
+            return entry
+        if block_key in self._spilled:
+            self.stats.spill_hits += 1
+            entry = self._unspill(block_key)
+        else:
+            self.stats.misses += 1
+            entry = self._decode(source, key, first)
+        self._store(block_key, entry)
+        return entry
+
+    def _decode(self, source, key: tuple, first: int) -> (int, list):
+        """
+        _decode : decode the frames of the block starting at frame first
+        """
+        mp3 = self._files.get(key)
+        if mp3 is None:
+            mp3 = MP3File(source)
+            self._files[key] = mp3
+            while len(self._files) > OPEN_FILES:
+                self._files.popitem(last=False)
+        self._files.move_to_end(key)
+        index = mp3.frame_index()
+        end = min(first + self.block_frames, len(index))
+        if first >= end:
+            return 0, []
+        warm_start = max(0, first - warmup_frames(index.header(first)))
+        mp3.seek_frame(warm_start)
+        pcm = mp3.read_pcm(end - warm_start)
+        if not pcm:
+            return 0, []
+        warmup = index.samples[first] - index.samples[warm_start]
+        return end - first, [samples[warmup:] for samples in pcm]
+
+    def _store(self, block_key: tuple, entry: (int, list)):
+        """
+        _store : put a block in memory, pushing the least recently used ones out to stay in
+        budget
+        """
+        self._blocks[block_key] = entry
+        self.stats.memory_bytes += _entry_bytes(entry)
+        while self.stats.memory_bytes > self.max_bytes and self._blocks:
+            old_key, old_entry = self._blocks.popitem(last=False)
+            self.stats.memory_bytes -= _entry_bytes(old_entry)
+            self.stats.evictions += 1
+            if self.spill_dir is not None and old_entry[0]:
+                self._spill(old_key, old_entry)
+
+    def _spill(self, block_key: tuple, entry: (int, list)):
+        """
+        _spill : write a block to the spill directory, channel after channel, deleting the
+        least recently used spilled blocks to stay in budget
+        """
+        frames, channels = entry
+        nbytes = _entry_bytes(entry)
+        if nbytes > self.max_spill_bytes:
+            return
+        name = hashlib.blake2b(repr(block_key).encode(), digest_size=16).hexdigest()
+        path = os.path.join(self.spill_dir, 'mp3po-{0}.pcm'.format(name))
+        with open(path, 'wb') as out:
+            for samples in channels:
+                out.write(memoryview(samples).cast('B'))
+        self._spilled[block_key] = (path, frames, len(channels), nbytes)
+        self.stats.spills += 1
+        self.stats.spill_bytes += nbytes
+        while self.stats.spill_bytes > self.max_spill_bytes:
+            _, (old_path, _, _, old_bytes) = self._spilled.popitem(last=False)
+            _remove(old_path)
+            self.stats.spill_bytes -= old_bytes
+            self.stats.spill_evictions += 1
+
+    def _unspill(self, block_key: tuple) -> (int, list):
+        """
+        _unspill : take a block back out of the spill directory, reading each channel
+        straight into its array
+        """
+        path, frames, channel_count, nbytes = self._spilled.pop(block_key)
+        self.stats.spill_bytes -= nbytes
+        channel_size = nbytes // channel_count
+        channels = []
+        with open(path, 'rb') as spilled:
+            for _ in range(0, channel_count):
+                samples = array('d', bytes(channel_size))
+                if spilled.readinto(memoryview(samples).cast('B')) != channel_size:
+                    raise EOFError('spilled block {0} is truncated'.format(path))
+                channels.append(samples)
+        _remove(path)
+        return frames, channels
+
+def _entry_bytes(entry: (int, list)) -> int:
+    """
+    _entry_bytes : bytes of PCM in a block
+    """
+    return sum(len(samples) * samples.itemsize for samples in entry[1])
+
+def _remove(path: str):
+    """
+    _remove : delete a spilled block, if it's still there
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
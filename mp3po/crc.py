@@ -0,0 +1,93 @@
+"""
+crc.py : check the CRC-16 of protected frames
+
+a frame with a protection bit of 0 has a 16-bit CRC right after its header. it covers the
+last two bytes of the header and the side info (not the main data), with polynomial 0x8005
+starting from 0xFFFF, most significant bit first
+"""
+
+from array import array
+
+CRC_POLYNOMIAL = 0x8005
+CRC_INIT = 0xFFFF
+
+# what to do with a frame whose CRC doesn't match
+CRC_SKIP = 'skip'
+CRC_CONCEAL = 'conceal'
+CRC_RAISE = 'raise'
+CRC_POLICIES = (CRC_SKIP, CRC_CONCEAL, CRC_RAISE)
+
+def _build_crc_table() -> array:
+    """
+    _build_crc_table : the CRC of each byte value shifted through the register, so the CRC
+    can be taken a byte at a time
+    """
+    table = array('H')
+    for byte in range(0, 256):
+        crc = byte << 8
+        for _ in range(0, 8):
+            crc = ((crc << 1) ^ CRC_POLYNOMIAL) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xFFFF)
+    return table
+
+CRC_TABLE = _build_crc_table()
+
+def crc16(raw_bytes, crc=CRC_INIT) -> int:
+    """
+    crc16 : the CRC-16 of raw_bytes, carrying on from crc
+    """
+    table = CRC_TABLE
+    for byte in raw_bytes:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+def frame_crc(frame, header) -> int:
+    """
+    frame_crc : the CRC a protected frame (starting at frame[0]) should carry
+    """
+    return crc16(frame[6:6 + header.side_info_length], crc16(frame[2:4]))
+
+class CRCMismatchException(Exception):
+    """
+    CRCMismatchException : a frame's CRC doesn't match its header and side info
+    """
+
+    def __init__(self, offset: int):
+        super().__init__('CRC mismatch in the frame at {0}'.format(offset))
+        self.offset = offset
+
+class CRCCheck(object):
+    """
+    CRCCheck : check the CRC of protected frames and count the ones that fail
+
+    policies, for frames that fail:
+    - skip : leave the frame out
+    - conceal : keep the frame without its main data, so it decodes as the previous frame
+                fading out
+    - raise : raise a CRCMismatchException
+
+    Attributes :
+    - policy : one of CRC_POLICIES
+    - checked : protected frames checked
+    - failed : frames whose CRC didn't match
+    """
+
+    def __init__(self, policy=CRC_SKIP):
+        if policy not in CRC_POLICIES:
+            raise ValueError('CRC policy must be one of {0}, not {1!r}'.format(
+                ', '.join(CRC_POLICIES), policy))
+        self.policy = policy
+        self.checked = 0
+        self.failed = 0
+
+    def check(self, frame, header) -> bool:
+        """
+        check : whether a frame (starting at frame[0]) is intact. unprotected frames always are
+        """
+        if header.error_protection != '0':
+            return True
+        self.checked += 1
+        if frame_crc(frame, header) == (frame[4] << 8) | frame[5]:
+            return True
+        self.failed += 1
+        return False
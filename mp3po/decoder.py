@@ -0,0 +1,340 @@
+"""
+decoder.py : turn decoded frames into PCM
+
+the Layer III stages after huffman decoding, one granule at a time:
+requantize -> stereo processing -> reorder -> alias reduction -> IMDCT -> synthesis
+"""
+
+import math
+from array import array
+from functools import lru_cache
+from itertools import repeat
+from operator import add, mul, sub
+
+from .frame import Frame
+from .header import ChannelEncodings
+from .main_data import MainData
+from .synthesis import ChannelSynthesis
+
+# pretab : extra scale factor amplification for long blocks when preflag is set
+PRETAB = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 3, 3, 3, 2, 0]
+
+# alias reduction butterfly coefficients
+_ALIAS_C = [-0.6, -0.535, -0.33, -0.185, -0.095, -0.041, -0.0142, -0.0037]
+ALIAS_CS = [1.0 / math.sqrt(1.0 + c * c) for c in _ALIAS_C]
+ALIAS_CA = [c / math.sqrt(1.0 + c * c) for c in _ALIAS_C]
+
+# intensity stereo (left, right) ratios for is_pos 0-6. is_pos 7 means "not intensity coded"
+IS_RATIOS = [(math.tan(p * math.pi / 12) / (1 + math.tan(p * math.pi / 12)),
+              1 / (1 + math.tan(p * math.pi / 12))) for p in range(0, 6)] + [(1.0, 0.0)]
+
+def _lsf_is_ratios(scale: float) -> list:
+    """
+    _lsf_is_ratios : MPEG 2/2.5 intensity stereo (left, right) ratios for is_pos 0-31. odd
+    positions turn the left channel down, even ones the right, by powers of scale
+    """
+    return [(scale ** ((p + 1) // 2), 1.0) if p % 2 else (1.0, scale ** (p // 2))
+            for p in range(0, 32)]
+
+# LSF_IS_RATIOS[intensity_scale][is_pos], intensity_scale being the low bit of the right
+# channel's scalefac_compress
+LSF_IS_RATIOS = [_lsf_is_ratios(2 ** -0.25), _lsf_is_ratios(2 ** -0.5)]
+
+SQRT_HALF = math.sqrt(0.5)
+
+_SILENCE = [0.0] * 576
+
+def is_short_block(channel) -> bool:
+    """
+    is_short_block : whether a channel's granule uses short blocks (possibly mixed)
+    """
+    return channel.window_switch_flag == 1 and channel.block_type == 2
+
+# the largest magnitude a huffman decoded line can have: 15 + 13 linbits
+MAX_QUANTIZED = 15 + (1 << 13) - 1
+
+# POW_43[v] is sign(v) * |v|^(4/3) for -MAX_QUANTIZED <= v <= MAX_QUANTIZED.
+# negative values live at the end of the table, so a negative v indexes them directly
+POW_43 = array('d', [i ** (4.0 / 3.0) for i in range(0, MAX_QUANTIZED + 1)] +
+               [-(i ** (4.0 / 3.0)) for i in range(MAX_QUANTIZED, 0, -1)])
+
+# GAIN_POW[q + GAIN_OFFSET] is 2^(q / 4): every gain in the requantization formula is
+# a whole number of quarter steps. global_gain - 210 goes down to -210, subblock gain
+# takes off up to 8 * 7 and scale factors up to 4 * (15 + 3)
+GAIN_OFFSET = 210 + 8 * 7 + 4 * 18
+GAIN_POW = array('d', [2.0 ** ((q - GAIN_OFFSET) / 4.0) for q in range(0, GAIN_OFFSET + 46)])
+
+@lru_cache(maxsize=256)
+def _gain_vector(global_gain, scalefac_scale, preflag, short, mixed, sub_block_gain,
+                 scalefac_l, scalefac_s, long_bands, short_bands, mixed_bands) -> list:
+    """
+    _gain_vector : the gain of each of the 576 lines of a granule, memoized on its inputs
+    """
+    gain = global_gain - 210 + GAIN_OFFSET
+    multiplier = 4 if scalefac_scale else 2
+    gains = []
+    if short:
+        first_short_band = 0
+        if mixed:
+            first_short_band = 3
+            for sfb in range(0, mixed_bands):
+                gains.extend([GAIN_POW[gain - multiplier * scalefac_l[sfb]]] *
+                             (long_bands[sfb + 1] - long_bands[sfb]))
+        for sfb in range(first_short_band, 13):
+            width = short_bands[sfb + 1] - short_bands[sfb]
+            for window in range(0, 3):
+                gains.extend([GAIN_POW[gain - 8 * sub_block_gain[window]
+                                       - multiplier * scalefac_s[3 * sfb + window]]] * width)
+    else:
+        for sfb in range(0, 22):
+            gains.extend([GAIN_POW[gain - multiplier * (scalefac_l[sfb] + preflag * PRETAB[sfb])]] *
+                         (long_bands[sfb + 1] - long_bands[sfb]))
+    return gains
+
+def gain_vector(channel, scalefac_l, scalefac_s, bands) -> list:
+    """
+    gain_vector : the per-line gains for one granule and channel, built from
+    global_gain, sub_block_gain, scalefac_scale, preflag and the scale factor bands
+    2^(0.25 * (global_gain - 210 - 8 * sub_block_gain)) * 2^(-scalefac_multiplier * scalefac)
+    scalefac_s is flat, three windows to a band, as MainData stores it
+    """
+    short = is_short_block(channel)
+    return _gain_vector(channel.global_gain, channel.scalefac_scale,
+                        channel.preflag, short, short and channel.mixed_block_flag,
+                        tuple(channel.sub_block_gain) if short else None,
+                        bytes(scalefac_l), bytes(scalefac_s) if short else None,
+                        tuple(bands['L']), tuple(bands['S']), bands['M'])
+
+def requantize(channel, lines, nonzero: int, scalefac_l, scalefac_s, bands) -> list:
+    """
+    requantize : scale the huffman decoded integers back to frequency line values
+    xr = sign(is) * |is|^(4/3) * gain, with |is|^(4/3) from POW_43 and the gains from gain_vector
+    """
+    gains = gain_vector(channel, scalefac_l, scalefac_s, bands)
+    xr = list(map(mul, map(POW_43.__getitem__, lines[0:nonzero]), gains[0:nonzero]))
+    xr.extend([0.0] * (576 - nonzero))
+    return xr
+
+def _end_of_nonzero_bands(xr, band_edges) -> int:
+    """
+    _end_of_nonzero_bands : index of the band after the last band with a nonzero line
+    """
+    for sfb in range(len(band_edges) - 2, -1, -1):
+        if any(xr[band_edges[sfb]:band_edges[sfb + 1]]):
+            return sfb + 1
+    return 0
+
+def _intensity_runs(channel, right, scalefac_l, scalefac_s, bands, limits=None) -> list:
+    """
+    _intensity_runs : split a granule into (start, end, is_pos) runs of lines.
+    is_pos is None for the lines below the intensity coded part of the spectrum, which
+    starts after the last nonzero band of the right channel (per window for short blocks)
+    MPEG 2/2.5 passes the (long, short) limits from MainData.intensity_limits: bands whose
+    is_pos reaches their limit aren't intensity coded either
+    """
+    long_bands = bands['L']
+    short_bands = bands['S']
+    limits_l, limits_s = limits if limits is not None else (None, None)
+    runs = []
+    if not is_short_block(channel):
+        start_sfb = _end_of_nonzero_bands(right, long_bands)
+        for sfb in range(0, 22):
+            is_pos = scalefac_l[min(sfb, 20)] if sfb >= start_sfb else None
+            if limits_l is not None and is_pos is not None and is_pos >= limits_l[sfb]:
+                is_pos = None
+            runs.append((long_bands[sfb], long_bands[sfb + 1], is_pos))
+        return runs
+    first_short_band = 3 if channel.mixed_block_flag else 0
+    short_part_zero = True
+    for window in range(0, 3):
+        start_sfb = first_short_band
+        for sfb in range(12, first_short_band - 1, -1):
+            width = short_bands[sfb + 1] - short_bands[sfb]
+            start = 3 * short_bands[sfb] + window * width
+            if any(right[start:start + width]):
+                start_sfb = sfb + 1
+                short_part_zero = False
+                break
+        for sfb in range(first_short_band, 13):
+            width = short_bands[sfb + 1] - short_bands[sfb]
+            start = 3 * short_bands[sfb] + window * width
+            is_pos = scalefac_s[3 * min(sfb, 11) + window] if sfb >= start_sfb else None
+            if (limits_s is not None and is_pos is not None
+                    and is_pos >= limits_s[3 * sfb + window]):
+                is_pos = None
+            runs.append((start, start + width, is_pos))
+    if channel.mixed_block_flag:
+        # the long bands of a mixed block are only intensity coded if the whole short part is
+        mixed_bands = bands['M']
+        long_start = mixed_bands
+        if short_part_zero:
+            long_start = _end_of_nonzero_bands(right, long_bands[0:mixed_bands + 1])
+        for sfb in range(0, mixed_bands):
+            is_pos = scalefac_l[sfb] if sfb >= long_start else None
+            if limits_l is not None and is_pos is not None and is_pos >= limits_l[sfb]:
+                is_pos = None
+            runs.append((long_bands[sfb], long_bands[sfb + 1], is_pos))
+    return runs
+
+def stereo(header, channel, xr, scalefac_l, scalefac_s, bands, limits=None):
+    """
+    stereo : undo mid/side and intensity stereo in place on the two channels of a granule
+    xr is [left, right]; channel is the right channel's side info. intensity positions
+    come from the right channel's scale factors, and for MPEG 2/2.5, which positions
+    aren't intensity coded from limits (see _intensity_runs)
+    """
+    if header.channel != ChannelEncodings.JOINT_STEREO:
+        return
+    mid_side = header.mode_extention[0] == '1'
+    intensity = header.mode_extention[1] == '1'
+    left, right = xr
+    if not intensity:
+        if mid_side:
+            _mid_side(left, right, 0, 576)
+        return
+    if header.lsf:
+        ratios = LSF_IS_RATIOS[channel.scalefac_compress & 1]
+        illegal = len(ratios)
+    else:
+        ratios = IS_RATIOS
+        illegal = 7
+    for start, end, is_pos in _intensity_runs(channel, right, scalefac_l, scalefac_s, bands,
+                                              limits):
+        if is_pos is None or is_pos >= illegal:
+            # not intensity coded
+            if mid_side:
+                _mid_side(left, right, start, end)
+            continue
+        ratio_left, ratio_right = ratios[is_pos]
+        source = left[start:end]
+        left[start:end] = map(mul, source, repeat(ratio_left))
+        right[start:end] = map(mul, source, repeat(ratio_right))
+
+def _mid_side(left, right, start: int, end: int):
+    """
+    _mid_side : convert mid/side lines in [start, end) to left/right in place
+    """
+    mid = left[start:end]
+    side = right[start:end]
+    left[start:end] = map(mul, map(add, mid, side), repeat(SQRT_HALF))
+    right[start:end] = map(mul, map(sub, mid, side), repeat(SQRT_HALF))
+
+def reorder(channel, xr, bands):
+    """
+    reorder : short block lines are stored band by band, window by window.
+    interleave the three windows of each band so the IMDCT can read them subband by subband
+    """
+    if not is_short_block(channel):
+        return
+    short_bands = bands['S']
+    first_short_band = 3 if channel.mixed_block_flag else 0
+    for sfb in range(first_short_band, 13):
+        start = 3 * short_bands[sfb]
+        width = short_bands[sfb + 1] - short_bands[sfb]
+        stored = xr[start:start + 3 * width]
+        for window in range(0, 3):
+            xr[start + window:start + 3 * width:3] = stored[window * width:(window + 1) * width]
+
+def antialias(channel, xr, nonzero=576):
+    """
+    antialias : alias reduction butterflies between adjacent subbands of long blocks, in place
+    only the boundary between the two long subbands is processed for mixed blocks.
+    lines from nonzero up are zero, so boundaries above it are left alone.
+    butterfly i of every boundary is done at once, on lines 18 apart
+    """
+    if is_short_block(channel):
+        if not channel.mixed_block_flag:
+            return
+        subbands = 2
+    else:
+        subbands = 32
+    subbands = min(subbands, (nonzero + 17) // 18 + 1)
+    if subbands < 2:
+        return
+    last = 18 * (subbands - 1)
+    for i in range(0, 8):
+        # the lines i below and i above each boundary
+        lows = slice(17 - i, last - i, 18)
+        highs = slice(18 + i, last + i + 1, 18)
+        low = xr[lows]
+        high = xr[highs]
+        cs = repeat(ALIAS_CS[i])
+        ca = repeat(ALIAS_CA[i])
+        xr[lows] = list(map(sub, map(mul, low, cs), map(mul, high, ca)))
+        xr[highs] = list(map(add, map(mul, high, cs), map(mul, low, ca)))
+
+def nonzero_limit(channel, nonzero: int, bands) -> int:
+    """
+    nonzero_limit : where the zero part of the spectrum starts once the lines from 0 to
+    nonzero have been reordered and alias reduced. reordering keeps lines within their
+    short band; alias reduction reaches 8 lines into the next subband
+    """
+    if nonzero == 0:
+        return 0
+    if is_short_block(channel):
+        for edge in bands['S']:
+            if 3 * edge >= nonzero:
+                nonzero = 3 * edge
+                break
+    return min(576, (nonzero + 17) // 18 * 18 + 18)
+
+class Decoder(object):
+    """
+    Decoder : turn a sequence of frames into PCM
+
+    the decoder keeps the IMDCT overlap and polyphase state of each channel,
+    so frames have to be passed in the order they appear in the stream.
+    with reference set, the filterbanks use plain matrix products instead of fast transforms
+    """
+
+    def __init__(self, reference=False):
+        self.channels = [ChannelSynthesis(reference), ChannelSynthesis(reference)]
+
+    def decode(self, frame: Frame) -> list:
+        """
+        decode : decode one frame to PCM
+        returns a list with one array('d') of samples per channel, nominally in [-1.0, 1.0]
+        frames without main data decode to what's left of the previous frame fading out
+        """
+        header = frame.header
+        side_info = frame.side_info
+        main_data = frame.main_data
+        channels = 1 if header.channel == ChannelEncodings.MONO else 2
+        bands = MainData.scale_band_indicies[header.frequency]
+        pcm = [array('d') for _ in range(0, channels)]
+        for gran, granule in enumerate(side_info.granules):
+            xr = []
+            nonzero = []
+            if main_data is None:
+                # the main data is missing: decode silence so the filterbanks stay in step
+                for chan in range(0, channels):
+                    synthesis = self.channels[chan]
+                    samples = synthesis.hybrid(_SILENCE, 0, 0, 0)
+                    synthesis.frequency_inversion(samples)
+                    pcm[chan].extend(synthesis.polyphase(samples))
+                continue
+            for chan in range(0, channels):
+                nonzero.append(main_data.nonzero_lines[gran][chan])
+                xr.append(requantize(granule.channels[chan],
+                                     main_data.frequency_lines[gran][chan],
+                                     nonzero[chan],
+                                     main_data.scalefac_l[gran][chan],
+                                     main_data.scalefac_s[gran][chan],
+                                     bands))
+            if channels == 2 and header.channel == ChannelEncodings.JOINT_STEREO:
+                stereo(header, granule.channels[1], xr, main_data.scalefac_l[gran][1],
+                       main_data.scalefac_s[gran][1], bands,
+                       main_data.intensity_limits[gran][1])
+                # stereo processing mixes the channels, so either can be nonzero up to the max
+                nonzero = [max(nonzero)] * 2
+            for chan in range(0, channels):
+                channel = granule.channels[chan]
+                reorder(channel, xr[chan], bands)
+                antialias(channel, xr[chan], nonzero[chan])
+                synthesis = self.channels[chan]
+                samples = synthesis.hybrid(xr[chan], channel.block_type,
+                                           channel.mixed_block_flag,
+                                           nonzero_limit(channel, nonzero[chan], bands))
+                synthesis.frequency_inversion(samples)
+                pcm[chan].extend(synthesis.polyphase(samples))
+        return pcm
@@ -7,16 +7,34 @@ import json
 from .header import MP3Header
 from .main_data import MainData
 from .sideinfo import SideInfo
+from .util.bits import EndOfBitsException
 
 class Frame(object):
     """
     Frame : container for all frame things
+    main_data is None when the frame's main data couldn't be recovered, or hasn't been
+    parsed yet: then raw_main_data holds its bytes until parse_main_data() is called
     """
 
-    def __init__(self, header: MP3Header, side_info: SideInfo, main_data: MainData):
+    def __init__(self, header: MP3Header, side_info: SideInfo, main_data: MainData,
+                 raw_main_data=None):
         self.header = header
         self.side_info = side_info
         self.main_data = main_data
+        self.raw_main_data = raw_main_data
+
+    def parse_main_data(self):
+        """
+        parse_main_data : parse raw_main_data into main_data, if that was left for later.
+        main_data stays None if the side info claims more data than there is. returns the frame
+        """
+        if self.raw_main_data is not None:
+            try:
+                self.main_data = MainData(self.header, self.side_info, self.raw_main_data)
+            except EndOfBitsException:
+                pass
+            self.raw_main_data = None
+        return self
 
     def __str__(self):
         return json.dumps({
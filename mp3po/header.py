@@ -3,7 +3,6 @@ header.py : all things MP3 headers
 """
 
 from enum import Enum
-from .util.bits import Bits
 
 class ChannelEncodings(Enum):
     """
@@ -70,7 +69,7 @@ class MP3Header(object):
                01 - layer III
                10 - layer II
                11 - layer I
-        error_protection: whether or not a 16-bit CRC follows
+        error_protection: whether or not a 16-bit CRC follows (0 means it does)
         bit_rate: 1111 = bad
         frequency: ever have a hz donut?
         pad_bit: single bit for representing if this frame has had thai recently
@@ -141,6 +140,43 @@ class MP3Header(object):
         },
     }
 
+    # MPEG 2 and 2.5 (low sampling frequencies) have their own bitrates
+    bitrate_table_lsf = {
+        LayerEncodings.ONE : {
+            '0001' : 32000,
+            '0010' : 48000,
+            '0011' : 56000,
+            '0100' : 64000,
+            '0101' : 80000,
+            '0110' : 96000,
+            '0111' : 112000,
+            '1000' : 128000,
+            '1001' : 144000,
+            '1010' : 160000,
+            '1011' : 176000,
+            '1100' : 192000,
+            '1101' : 224000,
+            '1110' : 256000,
+        },
+        LayerEncodings.TWO : {
+            '0001' : 8000,
+            '0010' : 16000,
+            '0011' : 24000,
+            '0100' : 32000,
+            '0101' : 40000,
+            '0110' : 48000,
+            '0111' : 56000,
+            '1000' : 64000,
+            '1001' : 80000,
+            '1010' : 96000,
+            '1011' : 112000,
+            '1100' : 128000,
+            '1101' : 144000,
+            '1110' : 160000,
+        },
+    }
+    bitrate_table_lsf[LayerEncodings.THREE] = bitrate_table_lsf[LayerEncodings.TWO]
+
     frequency_table = {
         MPEGVersionEncodings.MPEG_V1 : {
             '00' : 44100,
@@ -183,43 +219,61 @@ class MP3Header(object):
         },
     }
 
-    def __init__(self, raw_bytes):
-        self._bits = Bits()
-        for i in raw_bytes:
-            self._bits.add_bits(i)
-        self.sync_word = self._bits.read(11)
-
-        mpeg_bits = self._bits.read(2)
-        for i in MPEGVersionEncodings:
-            if i.value == mpeg_bits:
-                self.mpeg_version = i
-
-        layer_bits = self._bits.read(2)
-        for i in LayerEncodings:
-            if i.value == layer_bits:
-                self.layer = i
+    # the enums and tables above keyed by the integer value of their bits, for from_int
+    _versions = {int(i.value, 2) : i for i in MPEGVersionEncodings}
+    _layers = {int(i.value, 2) : i for i in LayerEncodings}
+    _channels = {int(i.value, 2) : i for i in ChannelEncodings}
+    _bit_strings = {width : [format(value, '0{}b'.format(width)) for value in range(0, 1 << width)]
+                    for width in (1, 2, 4, 11)}
 
-        self.error_protection = self._bits.read(1)
-        self._bit_rate_bits = self._bits.read(4)
-        self._frequency_bits = self._bits.read(2)
-        self.pad_bit = self._bits.read(1)
-        self.priv_bit = self._bits.read(1)
+    # parsed headers by header word. headers don't change once parsed, so frames with the
+    # same word can share one: a constant bitrate file only has a couple of distinct words
+    _cache = {}
+    _cache_limit = 4096
 
-        channel_bits = self._bits.read(2)
-        for i in ChannelEncodings:
-            if i.value == channel_bits:
-                self.channel = i
+    def __init__(self, raw_bytes):
+        if len(raw_bytes) < 4:
+            raise InvalidFieldEncodingException('A header is 4 bytes, got {0}'.format(
+                len(raw_bytes)))
+        self._decode(int.from_bytes(bytes(raw_bytes[0:4]), 'big'))
 
-        self.mode_extention = self._bits.read(2)
-        self.copy = self._bits.read(1)
-        self.original = self._bits.read(1)
-        self.emphasis = self._bits.read(2)
+    @classmethod
+    def from_int(cls, word: int, free_frame_size=None):
+        """
+        from_int : the header for a 32-bit header word, parsed once per distinct word
+        raises InvalidFieldEncodingException like the constructor
+        free format frames (bitrate bits 0000) don't say how long they are: pass the frame
+        size, found from where the next frame starts, as free_frame_size
+        """
+        key = word if free_frame_size is None else (word, free_frame_size)
+        header = cls._cache.get(key)
+        if header is None:
+            header = cls.__new__(cls)
+            header._decode(word, free_frame_size)
+            if len(cls._cache) >= cls._cache_limit:
+                # junk that happened to parse, most likely: start over
+                cls._cache.clear()
+            cls._cache[key] = header
+        return header
 
-        self.bitrate = self._check_for_valid_value(self.bitrate_table,
-                                                   'layer',
-                                                   self.layer,
-                                                   'bitrate',
-                                                   self._bit_rate_bits)
+    def _decode(self, word: int, free_frame_size=None):
+        """
+        _decode : pull the fields out of the header word with shifts and masks
+        """
+        bit_strings = self._bit_strings
+        self.sync_word = bit_strings[11][word >> 21]
+        self.mpeg_version = self._versions[(word >> 19) & 0x3]
+        self.layer = self._layers[(word >> 17) & 0x3]
+        self.error_protection = bit_strings[1][(word >> 16) & 0x1]
+        self._bit_rate_bits = bit_strings[4][(word >> 12) & 0xF]
+        self._frequency_bits = bit_strings[2][(word >> 10) & 0x3]
+        self.pad_bit = bit_strings[1][(word >> 9) & 0x1]
+        self.priv_bit = bit_strings[1][(word >> 8) & 0x1]
+        self.channel = self._channels[(word >> 6) & 0x3]
+        self.mode_extention = bit_strings[2][(word >> 4) & 0x3]
+        self.copy = bit_strings[1][(word >> 3) & 0x1]
+        self.original = bit_strings[1][(word >> 2) & 0x1]
+        self.emphasis = bit_strings[2][word & 0x3]
 
         self.frequency = self._check_for_valid_value(self.frequency_table,
                                                      'mpeg_version',
@@ -227,16 +281,38 @@ class MP3Header(object):
                                                      'frequency',
                                                      self._frequency_bits)
 
-        self.padding = self.padding_table[self.layer]
+        self.padding = self.padding_table.get(self.layer, 0)
 
         self.samples_per_frame = self._check_for_valid_value(self.samples_per_frame_table,
                                                              'layer',
                                                              self.layer,
                                                              'mpeg_version',
                                                              self.mpeg_version)
-        # calculate the frame size in bytes
-        self.frame_size = int(144 * (self.bitrate/self.frequency)
-                              + (int(self.pad_bit, 2) * self.padding))
+        # MPEG 2 and 2.5 use the low sampling frequency (LSF) extension: half the samples
+        # per frame, one granule and their own side info and scale factor layouts
+        self.lsf = self.mpeg_version != MPEGVersionEncodings.MPEG_V1
+        # samples per frame / 8 in the frame size formula: 144 for MPEG 1 layer III, 72 for LSF
+        size_factor = self.samples_per_frame // 8
+        if self._bit_rate_bits == '0000' and free_frame_size is not None:
+            # free format: work the bitrate out from the frame size
+            self.frame_size = free_frame_size
+            self.bitrate = ((free_frame_size - int(self.pad_bit, 2) * self.padding)
+                            * self.frequency // size_factor)
+        else:
+            self.bitrate = self._check_for_valid_value(self.bitrate_table_lsf if self.lsf
+                                                       else self.bitrate_table,
+                                                       'layer',
+                                                       self.layer,
+                                                       'bitrate',
+                                                       self._bit_rate_bits)
+            # calculate the frame size in bytes
+            self.frame_size = int(size_factor * (self.bitrate/self.frequency)
+                                  + (int(self.pad_bit, 2) * self.padding))
+        # the side information is 17 bytes for mono, 32 bytes otherwise. LSF: 9 and 17
+        if self.lsf:
+            self.side_info_length = 9 if self.channel == ChannelEncodings.MONO else 17
+        else:
+            self.side_info_length = 17 if self.channel == ChannelEncodings.MONO else 32
 
     def _check_for_valid_value(self, lookup_table, key1, value1, key2, value2):
         if (value1 not in lookup_table or value2 not in lookup_table[value1]):
@@ -5,7 +5,7 @@ pretty much a big ripoff from:
 https://github.com/hajimehoshi/go-mp3/blob/master/internal/maindata/huffman.go
 """
 
-from .util.bits import Bits
+from .util.bits import BitReader, EndOfBitsException
 
 HUFFMAN_TABLE = [
     # 1
@@ -333,55 +333,240 @@ BIG_VALUE_MAX = [
     16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16,
 ]
 
-def decode_big_values(bits: Bits, table_num: int) -> (int, int):
+# number of bits peeked for the first lookup. longer codes continue in a sub-table
+LOOKUP_BITS = 8
+
+# lazily built flat lookup tables, indexed by table number
+_LOOKUP_TABLES = {}
+
+def tree_codes(table) -> list:
+    """
+    tree_codes : walk a go-mp3 style huffman tree and return every codeword in it
+    as a list of (code, code length, value) tuples, where value is (x << 4) | y.
+    children are found exactly the way traverse_table finds them
+    """
+    codes = []
+    stack = [(0, 0, 0)]
+    while stack:
+        point, code, length = stack.pop()
+        if (table[point] & 0xff00) == 0:
+            codes.append((code, length, table[point] & 0xff))
+            continue
+        if length == 32:
+            continue
+        left = point
+        while (table[left] >> 8) >= 250:
+            left += table[left] >> 8
+        left += table[left] >> 8
+        right = point
+        while (table[right] & 0xff) >= 250:
+            right += table[right] & 0xff
+        right += table[right] & 0xff
+        stack.append((right, (code << 1) | 1, length + 1))
+        stack.append((left, code << 1, length + 1))
+    return codes
+
+def build_lookup_table(table) -> list:
+    """
+    build_lookup_table : turn a huffman tree into a flat lookup table
+
+    the first 2**LOOKUP_BITS entries are indexed by the next LOOKUP_BITS bits of the stream.
+    a non-negative entry is a leaf: (code length << 8) | (x << 4) | y
+    a negative entry points at a sub-table for longer codes: -((offset << 5) | sub_bits),
+    which is indexed by the sub_bits bits following the first LOOKUP_BITS
+    """
+    lookup = [0] * (1 << LOOKUP_BITS)
+    long_codes = {}
+    for code, length, value in tree_codes(table):
+        if length <= LOOKUP_BITS:
+            start = code << (LOOKUP_BITS - length)
+            lookup[start:start + (1 << (LOOKUP_BITS - length))] = \
+                [(length << 8) | value] * (1 << (LOOKUP_BITS - length))
+        else:
+            prefix = code >> (length - LOOKUP_BITS)
+            long_codes.setdefault(prefix, []).append((code, length, value))
+    for prefix, codes in sorted(long_codes.items()):
+        sub_bits = max(length for _, length, _ in codes) - LOOKUP_BITS
+        offset = len(lookup)
+        lookup.extend([0] * (1 << sub_bits))
+        for code, length, value in codes:
+            rest = length - LOOKUP_BITS
+            start = offset + ((code & ((1 << rest) - 1)) << (sub_bits - rest))
+            lookup[start:start + (1 << (sub_bits - rest))] = \
+                [(length << 8) | value] * (1 << (sub_bits - rest))
+        lookup[prefix] = -((offset << 5) | sub_bits)
+    return lookup
+
+def get_lookup_table(table_num: int) -> list:
+    """
+    get_lookup_table : return the flat lookup table for a table number, building it on first use
+    returns None for tables that have no codes (0, 4 and 14)
+    """
+    try:
+        return _LOOKUP_TABLES[table_num]
+    except KeyError:
+        pass
+    table, tree_length, _ = HUFFMAN_TABLE_INFO[table_num]
+    lookup = None
+    if tree_length != 0:
+        lookup = build_lookup_table(table)
+    _LOOKUP_TABLES[table_num] = lookup
+    return lookup
+
+def lookup_codeword(bits: BitReader, lookup: list) -> (int, int, int):
+    """
+    lookup_codeword : decode one codeword with at most two table lookups
+    returns x, y and the code length, leaving bits positioned after the codeword
+    """
+    entry = lookup[bits.peek_bits_as_int(LOOKUP_BITS)]
+    if entry < 0:
+        entry = -entry
+        bits.skip(LOOKUP_BITS)
+        entry = lookup[(entry >> 5) + bits.peek_bits_as_int(entry & 0x1f)]
+        bits.skip((entry >> 8) - LOOKUP_BITS)
+    else:
+        bits.skip(entry >> 8)
+    return (entry >> 4) & 0xf, entry & 0xf, entry >> 8
+
+def decode_big_values(bits: BitReader, table_num: int) -> (int, int):
     """
     decode_big_values : decode the bytes in the big values regions
     """
-    # print('decode big values', table_num)
-    table, tree_length, linbits = HUFFMAN_TABLE_INFO[table_num]
-    if tree_length == 0:
+    lookup = get_lookup_table(table_num)
+    if lookup is None:
         return 0, 0
-    x, y = traverse_table(table, bits)
-    # table_max = BIG_VALUE_MAX[table_num]
-    # x, y = traverse_two(table, bits, table_max)
+    linbits = HUFFMAN_TABLE_INFO[table_num][2]
+    x, y, _ = lookup_codeword(bits, lookup)
     if linbits != 0 and x == 15:
         # It looks like we don't actually need to append linbits bits
         # instead we just add the two integer values together
         x += bits.read_bits_as_int(linbits)
-    if x != 0 and bits.read(1) == '1':
+    if x != 0 and bits.read_bit():
         x = -x
     if linbits != 0 and y == 15:
         y += bits.read_bits_as_int(linbits)
-    if y != 0 and bits.read(1) == '1':
+    if y != 0 and bits.read_bit():
         y = -y
     return x, y
 
-def decode_quadruples(bits: Bits, table_num: int) -> (int, int, int, int):
+def decode_quadruples(bits: BitReader, table_num: int) -> (int, int, int, int):
     """
     decode_quadruples : decode the bytes in the big values regions
     """
-    # print('decode quadruples', table_num)
-    table, tree_length, _ = HUFFMAN_TABLE_INFO[table_num]
-    if tree_length == 0:
-        return 0, 0, 0 ,0
-    x, y = traverse_table(table, bits)
-    # table_max = BIG_VALUE_MAX[table_num]
-    # x, y = traverse_two(table, bits, table_max)
+    lookup = get_lookup_table(table_num)
+    if lookup is None:
+        return 0, 0, 0, 0
+    _, y, _ = lookup_codeword(bits, lookup)
     v = (y >> 3) & 1
     w = (y >> 2) & 1
     x = (y >> 1) & 1
     y = y & 1
-    if v != 0 and bits.read(1) == '1':
+    if v != 0 and bits.read_bit():
         v = -v
-    if w != 0 and bits.read(1) == '1':
+    if w != 0 and bits.read_bit():
         w = -w
-    if x != 0 and bits.read(1) == '1':
+    if x != 0 and bits.read_bit():
         x = -x
-    if y != 0 and bits.read(1) == '1':
+    if y != 0 and bits.read_bit():
         y = -y
     return v, w, x, y
 
-def traverse_two(table: map, bits: Bits, table_max: int) -> (int, int):
+def decode_region(bits: BitReader, table_num: int, start: int, end: int, out, end_bit: int) -> int:
+    """
+    decode_region : decode the big values pairs for lines [start, end) straight into out,
+    which is any mutable sequence of ints (usually an array('i') of 576 lines).
+    decoding stops early if the reader reaches end_bit, the part2_3_length boundary;
+    lines that weren't decoded are set to 0. returns the line index decoding stopped at
+    """
+    lookup = get_lookup_table(table_num)
+    if lookup is None:
+        for i in range(start, end):
+            out[i] = 0
+        return end
+    linbits = HUFFMAN_TABLE_INFO[table_num][2]
+    peek = bits.peek_bits_as_int
+    skip = bits.skip
+    tell = bits.tell
+    read_bit = bits.read_bit
+    read_bits_as_int = bits.read_bits_as_int
+    i = start
+    try:
+        while i < end and tell() < end_bit:
+            entry = lookup[peek(LOOKUP_BITS)]
+            if entry < 0:
+                entry = -entry
+                skip(LOOKUP_BITS)
+                entry = lookup[(entry >> 5) + peek(entry & 0x1f)]
+                skip((entry >> 8) - LOOKUP_BITS)
+            else:
+                skip(entry >> 8)
+            x = (entry >> 4) & 0xf
+            y = entry & 0xf
+            if x:
+                if linbits and x == 15:
+                    x += read_bits_as_int(linbits)
+                if read_bit():
+                    x = -x
+            if y:
+                if linbits and y == 15:
+                    y += read_bits_as_int(linbits)
+                if read_bit():
+                    y = -y
+            out[i] = x
+            out[i + 1] = y
+            i += 2
+    except EndOfBitsException:
+        # the main data ended in the middle of a pair
+        pass
+    for j in range(i, end):
+        out[j] = 0
+    return i
+
+def decode_count1(bits: BitReader, table_num: int, start: int, out, end_bit: int) -> int:
+    """
+    decode_count1 : decode quadruples from line start until the reader reaches end_bit or the
+    granule is full, using table 32 + table_num (count1_table_select). a quadruple that runs
+    past end_bit is discarded. every line after the count1 region is set to 0.
+    returns the line index where the count1 region ends
+    """
+    lookup = get_lookup_table(32 + table_num)
+    lines = len(out)
+    peek = bits.peek_bits_as_int
+    skip = bits.skip
+    tell = bits.tell
+    read_bit = bits.read_bit
+    i = start
+    try:
+        while i + 4 <= lines and tell() < end_bit:
+            entry = lookup[peek(LOOKUP_BITS)]
+            skip(entry >> 8)
+            v = (entry >> 3) & 1
+            w = (entry >> 2) & 1
+            x = (entry >> 1) & 1
+            y = entry & 1
+            if v and read_bit():
+                v = -v
+            if w and read_bit():
+                w = -w
+            if x and read_bit():
+                x = -x
+            if y and read_bit():
+                y = -y
+            if tell() > end_bit:
+                break
+            out[i] = v
+            out[i + 1] = w
+            out[i + 2] = x
+            out[i + 3] = y
+            i += 4
+    except EndOfBitsException:
+        # the last quadruple ran off the end of the main data
+        pass
+    for j in range(i, lines):
+        out[j] = 0
+    return i
+
+def traverse_two(table: map, bits: BitReader, table_max: int) -> (int, int):
     """
     traverse_two : let's try going off the c++ code now
     """
@@ -391,8 +576,6 @@ def traverse_two(table: map, bits: Bits, table_max: int) -> (int, int):
             i = 2 * table_max * row + 2 * column
             value = table[i]
             size = table[i + 1]
-            if size > 32:
-                print('size: {}, row: {}, column: {}, table: {}'.format(size, row, column, table))
             if value >> (32 - size) == bitnum >> (32 - size):
                 bits.seek(bits.tell() - (32 - size))
                 return (row, column)
@@ -408,7 +591,7 @@ def traverse_table(table, bits):
             x = int((table[point] >> 4) & 0xf)
             y = int(table[point] & 0xf)
             return x, y
-        if bits.read(1) == '1':
+        if bits.read_bit():
             # go right
             while (table[point] & 0xff) >= 250:
                 point += int(table[point]) & 0xff
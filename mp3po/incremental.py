@@ -0,0 +1,264 @@
+"""
+incremental.py : a push style decoder: feed it bytes in whatever pieces they come in and
+pull out frames or PCM
+
+this is the core that files, memory maps, pipes and network streams all go through
+"""
+
+from collections import deque
+
+from . import trace
+from .crc import CRC_CONCEAL, CRC_RAISE, CRCCheck, CRCMismatchException
+from .decoder import Decoder
+from .frame import Frame
+from .reservoir import BitReservoir
+from .sideinfo import SideInfo
+from .sync import FrameScanner, MAX_FREE_FORMAT_SIZE
+from .tags import ID3V2_HEADER_SIZE, id3v2_size
+
+# how much of the next chunk to copy after the leftover end of the last one, to finish the
+# frame that straddles them and confirm the one after it
+BRIDGE_SIZE = 2 * MAX_FREE_FORMAT_SIZE + 8
+
+class IncrementalDecoder(object):
+    """
+    IncrementalDecoder : turn chunks of an MP3 stream into frames as they complete
+
+    a frame that lies entirely inside one chunk is handed out as memoryview slices of that
+    chunk, with no copying, so chunks shouldn't be changed after they're fed. only the
+    frames straddling two chunks are copied. the chunks can be anything with find() and
+    slicing: bytes, bytearrays, memory maps
+
+        decoder = IncrementalDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+            for pcm in decoder.pcm():
+                ...
+        decoder.feed_eof()
+        for pcm in decoder.pcm():
+            ...
+
+    Attributes :
+    - scanner : the FrameScanner keeping sync
+    - reservoir : the BitReservoir frames take their main data from
+    - decoder : the Decoder that turns frames into PCM
+    - position : offset in the stream just past the last frame handed out. the stream starts
+                 at offset, so for a file fed from some way in, these are file offsets
+    - crc : the CRCCheck protected frames go through, or None to not check them. crc can be
+            passed in as a CRCCheck (to share its counts) or a policy name
+    - parse_main_data : whether frames come out with their main data parsed. if not, they
+                        carry a copy of its bytes, for Frame.parse_main_data() to parse
+                        later, e.g. in another thread
+    """
+
+    def __init__(self, reservoir=None, decoder=None, skip_id3v2=False, offset=0, crc=None,
+                 parse_main_data=True):
+        self.scanner = FrameScanner()
+        self.reservoir = reservoir if reservoir is not None else BitReservoir()
+        self.decoder = decoder if decoder is not None else Decoder()
+        self.position = offset
+        self.crc = CRCCheck(crc) if isinstance(crc, str) else crc
+        self.parse_main_data = parse_main_data
+        # (chunk, start, end, offset in the stream) waiting to be searched
+        self._pending = deque()
+        self._fed = offset
+        self._eof = False
+        # the data being searched: data[start:end] is the stream from offset _offset + start
+        self._data = b''
+        self._view = memoryview(b'')
+        self._start = 0
+        self._end = 0
+        self._offset = offset
+        # while the data is a copy bridging two chunks: (where the chunk starts in it,
+        # the chunk as it was queued)
+        self._bridge = None
+        # whether leading ID3v2 tags have been dealt with, and how much of one is left
+        self._started = not skip_id3v2
+        self._skip = 0
+
+    def feed(self, data, start=0, end=None):
+        """
+        feed : add data[start:end] to the stream
+        """
+        end = len(data) if end is None else end
+        if end > start:
+            self._pending.append((data, start, end, self._fed))
+            self._fed += end - start
+
+    def feed_eof(self):
+        """
+        feed_eof : there's no more data, so the last frames don't have to wait for more
+        """
+        self._eof = True
+
+    def buffered(self) -> int:
+        """
+        buffered : bytes fed that haven't been searched through yet
+        """
+        return self._fed - (self._offset + self._start)
+
+    def next_frame(self):
+        """
+        next_frame : the next complete frame, or None if more data is needed first (or the
+        stream is over). frames failing their CRC check are left out or raise, as the crc
+        policy says
+        """
+        if not self._started and not self._skip_id3v2():
+            return None
+        while True:
+            final = self._eof and not self._pending and self._bridge is None
+            position, header = self.scanner.next_frame(self._data, self._start, self._end,
+                                                       final)
+            if header is None:
+                if not self._pull(position):
+                    return None
+                continue
+            frame_end = position + header.frame_size
+            view = self._view
+            offset = self._offset + position
+            # move past the frame first, so a CRC exception leaves the stream after it
+            self._start = frame_end
+            self.position = self._offset + frame_end
+            if self._bridge is not None and frame_end >= self._bridge[0]:
+                # past the copied bit: go on in the chunk itself
+                split, (chunk, start, end, chunk_offset) = self._bridge
+                self._bridge = None
+                self._set_data(chunk, start + frame_end - split, end, chunk_offset - start)
+            frame = self._make_frame(header, view[position:frame_end], offset)
+            if frame is not None:
+                return frame
+
+    def frames(self):
+        """
+        frames : generate the frames that are complete so far
+        """
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def pcm(self):
+        """
+        pcm : generate the PCM of the frames that are complete so far: a list with one
+        array('d') per channel for each frame
+        """
+        for frame in self.frames():
+            yield self.decoder.decode(frame.parse_main_data())
+
+    def iter_frames(self, stream, chunk_size=64 * 1024):
+        """
+        iter_frames : feed everything read from a binary stream (a pipe, sys.stdin.buffer, a
+        socket file) and generate the frames as they complete
+        """
+        while True:
+            chunk = stream.read(chunk_size)
+            if chunk:
+                self.feed(chunk)
+            else:
+                self.feed_eof()
+            yield from self.frames()
+            if not chunk:
+                return
+
+    def _make_frame(self, header, view, offset: int) -> Frame:
+        """
+        _make_frame : split the frame in view (at offset in the stream) into side info and
+        main data. None if it fails its CRC check and is to be skipped
+        """
+        main_data_start = 4 + header.side_info_length
+        if header.error_protection == '0':
+            # a protection bit of 0 means a 16-bit crc follows the header
+            main_data_start += 2
+        side_info = SideInfo(header, view[main_data_start - header.side_info_length:
+                                          main_data_start])
+        if self.crc is not None and not self.crc.check(view, header):
+            # the side info can't be trusted, but the slot (which the CRC doesn't cover)
+            # still goes in the reservoir for the frames after this one to reach back into
+            self.reservoir.append(view[main_data_start:])
+            if trace.hook is not None:
+                trace.hook('crc', {'offset' : offset, 'policy' : self.crc.policy})
+            if self.crc.policy == CRC_RAISE:
+                raise CRCMismatchException(offset)
+            if self.crc.policy == CRC_CONCEAL:
+                return Frame(header, side_info, None)
+            return None
+        raw_bytes = self.reservoir.frame_main_data(side_info.main_data_begin,
+                                                   view[main_data_start:])
+        if trace.hook is not None:
+            trace.hook('frame', trace.frame_fields(offset, header, side_info,
+                                                   None if raw_bytes is None else len(raw_bytes)))
+        if raw_bytes is None:
+            return Frame(header, side_info, None)
+        if not self.parse_main_data:
+            # the reservoir's buffer gets reused by the frames after this one
+            return Frame(header, side_info, None, bytes(raw_bytes))
+        return Frame(header, side_info, None, raw_bytes).parse_main_data()
+
+    def _set_data(self, data, start: int, end: int, offset: int):
+        """
+        _set_data : search data[start:end] next, which is the stream from offset + start
+        """
+        self._data = data
+        self._view = memoryview(data)
+        self._start = start
+        self._end = end
+        self._offset = offset
+
+    def _pull(self, position: int) -> bool:
+        """
+        _pull : bring in the next chunk after data[position:], where the search stopped.
+        returns False, leaving the search at position, if there's nothing more to bring in
+        """
+        if self._bridge is not None:
+            split, (chunk, start, end, offset) = self._bridge
+            self._bridge = None
+            if position >= split:
+                self._set_data(chunk, start + position - split, end, offset - start)
+            else:
+                # the straddling frame didn't fit in the bridge after all: use the whole chunk
+                data = bytes(self._data[position:split]) + bytes(chunk[start:end])
+                self._set_data(data, 0, len(data), self._offset + position)
+            return True
+        if not self._pending:
+            self._start = position
+            return False
+        chunk, start, end, offset = self._pending.popleft()
+        if position >= self._end:
+            # nothing left over: search the chunk where it is
+            self._set_data(chunk, start, end, offset - start)
+            return True
+        leftover = bytes(self._data[position:self._end])
+        window = min(end, start + BRIDGE_SIZE)
+        data = leftover + bytes(chunk[start:window])
+        self._set_data(data, 0, len(data), self._offset + position)
+        if window < end:
+            self._bridge = (len(leftover), (chunk, start, end, offset))
+        return True
+
+    def _skip_id3v2(self) -> bool:
+        """
+        _skip_id3v2 : step over any ID3v2 tags at the start of the stream, as much of them as
+        has arrived. returns whether the audio has started
+        """
+        while True:
+            available = self._end - self._start
+            if self._skip:
+                skipped = min(self._skip, available)
+                self._skip -= skipped
+                self._start += skipped
+                if self._skip and not self._pull(self._end):
+                    return False
+                continue
+            more = self._pending or self._bridge is not None or not self._eof
+            if available < ID3V2_HEADER_SIZE and more:
+                head = bytes(self._data[self._start:self._end])
+                if head == b'ID3'[0:len(head)]:
+                    # could be the start of a tag
+                    if not self._pull(self._start):
+                        return False
+                    continue
+            self._skip = id3v2_size(self._data[self._start:self._start + ID3V2_HEADER_SIZE])
+            if not self._skip:
+                self._started = True
+                return True
@@ -0,0 +1,108 @@
+"""
+index.py : a seek table of where each frame starts, in bytes and in samples
+"""
+
+import bisect
+from array import array
+
+from .header import MP3Header
+from .sideinfo import SideInfo
+
+# side info is kept 32 bytes a frame, the stereo size, so frames can be found by index
+SIDE_INFO_STRIDE = 32
+
+class FrameIndex(object):
+    """
+    FrameIndex : the byte offset, first sample, header and side info of every frame in
+    a file, built without parsing any side info or main data. that's 4 + 8 + 8 + 32 bytes
+    a frame; the header and side info objects are made again on demand
+
+    Attributes :
+    - offsets : array('Q') of frame byte offsets in the file
+    - samples : array('Q') of how many samples come before each frame
+    - headers : array('L') of header words
+    - free_frame_sizes : {frame : size} of the free format frames, whose header words don't
+                         give their size
+    - side_info_bytes : bytearray of the raw side info, SIDE_INFO_STRIDE bytes a frame
+    - total_samples : samples in the whole file
+    - frequency : sampling rate of the first frame
+    - end : byte offset just past the last frame
+    """
+
+    def __init__(self):
+        self.offsets = array('Q')
+        self.samples = array('Q')
+        self.headers = array('L')
+        self.free_frame_sizes = {}
+        self.side_info_bytes = bytearray()
+        self.total_samples = 0
+        self.frequency = 0
+        self.end = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, offset: int, word: int, header: MP3Header, side_info):
+        """
+        add : append a frame that starts at offset, with header word word (parsed as header)
+        and the side info bytes side_info
+        """
+        if not self.frequency:
+            self.frequency = header.frequency
+        self.offsets.append(offset)
+        self.samples.append(self.total_samples)
+        if not (word >> 12) & 0xF:
+            # free format: the size is only known from where the next frame starts
+            self.free_frame_sizes[len(self.headers)] = header.frame_size
+        self.headers.append(word)
+        self.side_info_bytes += side_info
+        self.side_info_bytes += bytes(SIDE_INFO_STRIDE - len(side_info))
+        self.total_samples += header.samples_per_frame
+
+    def header(self, frame: int) -> MP3Header:
+        """
+        header : the header of a frame
+        """
+        return MP3Header.from_int(self.headers[frame], self.free_frame_sizes.get(frame))
+
+    def side_info(self, frame: int) -> SideInfo:
+        """
+        side_info : the side info of a frame, parsed again from the stored bytes
+        """
+        start = frame * SIDE_INFO_STRIDE
+        return SideInfo(self.header(frame),
+                        memoryview(self.side_info_bytes)[start:start + SIDE_INFO_STRIDE])
+
+    def main_data_begin(self, frame: int) -> int:
+        """
+        main_data_begin : how far back into earlier frames a frame's main data starts,
+        without parsing its side info
+        """
+        start = frame * SIDE_INFO_STRIDE
+        if not self.headers[frame] & 0x80000:
+            # MPEG 2/2.5 (the low version bit is clear): 8 bits
+            return self.side_info_bytes[start]
+        return (self.side_info_bytes[start] << 1) | (self.side_info_bytes[start + 1] >> 7)
+
+    def duration(self) -> float:
+        """
+        duration : length of the file in seconds
+        """
+        if not self.frequency:
+            return 0.0
+        return self.total_samples / self.frequency
+
+    def frame_for_sample(self, sample: int) -> int:
+        """
+        frame_for_sample : index of the frame holding the given sample. samples past the end
+        give len(self)
+        """
+        if sample >= self.total_samples:
+            return len(self.offsets)
+        return max(0, bisect.bisect_right(self.samples, sample) - 1)
+
+    def frame_for_time(self, seconds: float) -> int:
+        """
+        frame_for_time : index of the frame playing at the given time
+        """
+        return self.frame_for_sample(int(seconds * self.frequency))
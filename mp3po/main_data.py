@@ -2,10 +2,97 @@
 main_data.py : a place for all things main data
 """
 
+from array import array
+
 from .header import MP3Header, ChannelEncodings
-from .huffman import decode_big_values, decode_quadruples
+from .huffman import decode_count1, decode_region
 from .sideinfo import SideInfo
-from .util.bits import Bits
+from .util.bits import BitReader
+
+# MPEG 2/2.5 scale factors come in four parts, each with its own bit width. these are the
+# number of scale factors in each part for the six ways of working out the widths
+# (by scalefac_compress and intensity stereo), for long, short and mixed blocks.
+# short and mixed counts are in scale factors, three per short band
+LSF_PART_SIZES = [
+    [[6, 5, 5, 5], [9, 9, 9, 9], [6, 9, 9, 9]],
+    [[6, 5, 7, 3], [9, 9, 12, 6], [6, 9, 12, 6]],
+    [[11, 10, 0, 0], [18, 18, 0, 0], [15, 18, 0, 0]],
+    [[7, 7, 7, 0], [12, 12, 12, 0], [6, 15, 12, 0]],
+    [[6, 6, 6, 3], [12, 9, 9, 6], [6, 12, 9, 6]],
+    [[8, 8, 5, 0], [15, 12, 9, 0], [6, 18, 9, 0]],
+]
+
+def lsf_scalefac_widths(scalefac_compress: int, intensity_right: bool) -> (list, int):
+    """
+    lsf_scalefac_widths : the bit widths of the four parts of an MPEG 2/2.5 channel's scale
+    factors and the row of LSF_PART_SIZES they go with. the right channel of an intensity
+    stereo frame uses half of scalefac_compress, the low bit being the intensity scale
+    """
+    if intensity_right:
+        compress = scalefac_compress >> 1
+        if compress < 180:
+            return [compress // 36, compress % 36 // 6, compress % 6, 0], 3
+        if compress < 244:
+            compress -= 180
+            return [compress % 64 >> 4, compress % 16 >> 2, compress % 4, 0], 4
+        compress -= 244
+        return [compress // 3, compress % 3, 0, 0], 5
+    if scalefac_compress < 400:
+        return [(scalefac_compress >> 4) // 5, (scalefac_compress >> 4) % 5,
+                scalefac_compress % 16 >> 2, scalefac_compress % 4], 0
+    if scalefac_compress < 500:
+        compress = scalefac_compress - 400
+        return [(compress >> 2) // 5, (compress >> 2) % 5, compress % 4, 0], 1
+    compress = scalefac_compress - 500
+    return [compress // 3, compress % 3, 0, 0], 2
+
+def _scalefac_plan(sizes: list, widths: list, short=False, mixed_bands=0) -> tuple:
+    """
+    _scalefac_plan : how to read one channel's scale factors, as (runs, limits_l, limits_s).
+    each run is (target, start, count, width): count scale factors of width bits going to
+    the long (target 0) or short (target 1) scale factors from start on. the short scale
+    factors are flat, three windows to a band, which is the order they're stored in. in a
+    mixed block, mixed_bands long bands come first and the short bands start at band 3.
+    the limits are the largest value each scale factor can take, for MPEG 2/2.5
+    intensity stereo
+    """
+    runs = []
+    limits = (bytearray(22), bytearray(39))
+    position = 0
+    for count, width in zip(sizes, widths):
+        while count:
+            if not short or position < mixed_bands:
+                target, start = 0, position
+                take = min(count, mixed_bands - position) if short else count
+            else:
+                target, start = 1, position - mixed_bands + (9 if mixed_bands else 0)
+                take = count
+            runs.append((target, start, take, width))
+            limits[target][start:start + take] = bytes([(1 << width) - 1]) * take
+            position += take
+            count -= take
+    return tuple(runs), bytes(limits[0]), bytes(limits[1])
+
+def _mpeg1_scalefac_plans(scalefac_compress: int) -> tuple:
+    """
+    _mpeg1_scalefac_plans : the (long, short, mixed) plans for an MPEG 1 scalefac_compress.
+    the long runs line up with the four scfsi bands
+    """
+    slen1, slen2 = MainData.scalefac_sizes[scalefac_compress]
+    return (_scalefac_plan([6, 5, 5, 5], [slen1, slen1, slen2, slen2]),
+            _scalefac_plan([18, 18], [slen1, slen2], short=True),
+            _scalefac_plan([8 + 9, 18], [slen1, slen2], short=True, mixed_bands=8))
+
+def _lsf_scalefac_plans(scalefac_compress: int, intensity_right: bool) -> tuple:
+    """
+    _lsf_scalefac_plans : the (long, short, mixed) plans for an MPEG 2/2.5
+    scalefac_compress, for the right channel of an intensity stereo frame or not
+    """
+    widths, row = lsf_scalefac_widths(scalefac_compress, intensity_right)
+    sizes = LSF_PART_SIZES[row]
+    return (_scalefac_plan(sizes[0], widths),
+            _scalefac_plan(sizes[1], widths, short=True),
+            _scalefac_plan(sizes[2], widths, short=True, mixed_bands=6))
 
 class MainData(object):
     """
@@ -17,107 +104,167 @@ class MainData(object):
         (2, 1), (2, 2), (2, 3), (3, 1), (3, 2), (3, 3), (4, 2), (4, 3),
     ]
 
+    # 'L' and 'S' are the long and short scale factor band edges, 'M' the number of long
+    # bands at the start of a mixed block
     scale_band_indicies = {
         44100: {
             'L': [0, 4, 8, 12, 16, 20, 24, 30, 36, 44, 52, 62, 74, 90, 110,
                   134, 162, 196, 238, 288, 342, 418, 576],
     		'S': [0, 4, 8, 12, 16, 22, 30, 40, 52, 66, 84, 106, 136, 192],
+            'M': 8,
         },
         48000: {
             'L': [0, 4, 8, 12, 16, 20, 24, 30, 36, 42, 50, 60, 72, 88, 106,
                   128, 156, 190, 230, 276, 330, 384, 576],
             'S': [0, 4, 8, 12, 16, 22, 28, 38, 50, 64, 80, 100, 126, 192],
+            'M': 8,
         },
         32000: {
             'L': [0, 4, 8, 12, 16, 20, 24, 30, 36, 44, 54, 66, 82, 102, 126,
                   156, 194, 240, 296, 364, 448, 550, 576],
             'S': [0, 4, 8, 12, 16, 22, 30, 42, 58, 78, 104, 138, 180, 192],
+            'M': 8,
+        },
+        # MPEG 2
+        22050: {
+            'L': [0, 6, 12, 18, 24, 30, 36, 44, 54, 66, 80, 96, 116, 140, 168,
+                  200, 238, 284, 336, 396, 464, 522, 576],
+            'S': [0, 4, 8, 12, 18, 24, 32, 42, 56, 74, 100, 132, 174, 192],
+            'M': 6,
+        },
+        24000: {
+            'L': [0, 6, 12, 18, 24, 30, 36, 44, 54, 66, 80, 96, 114, 136, 162,
+                  194, 232, 278, 332, 394, 464, 540, 576],
+            'S': [0, 4, 8, 12, 18, 26, 36, 48, 62, 80, 104, 136, 180, 192],
+            'M': 6,
+        },
+        16000: {
+            'L': [0, 6, 12, 18, 24, 30, 36, 44, 54, 66, 80, 96, 116, 140, 168,
+                  200, 238, 284, 336, 396, 464, 522, 576],
+            'S': [0, 4, 8, 12, 18, 26, 36, 48, 62, 80, 104, 134, 174, 192],
+            'M': 6,
+        },
+        # MPEG 2.5
+        11025: {
+            'L': [0, 6, 12, 18, 24, 30, 36, 44, 54, 66, 80, 96, 116, 140, 168,
+                  200, 238, 284, 336, 396, 464, 522, 576],
+            'S': [0, 4, 8, 12, 18, 26, 36, 48, 62, 80, 104, 134, 174, 192],
+            'M': 6,
+        },
+        12000: {
+            'L': [0, 6, 12, 18, 24, 30, 36, 44, 54, 66, 80, 96, 116, 140, 168,
+                  200, 238, 284, 336, 396, 464, 522, 576],
+            'S': [0, 4, 8, 12, 18, 26, 36, 48, 62, 80, 104, 134, 174, 192],
+            'M': 6,
+        },
+        8000: {
+            'L': [0, 12, 24, 36, 48, 60, 72, 88, 108, 132, 160, 192, 232, 280, 336,
+                  400, 476, 566, 568, 570, 572, 574, 576],
+            'S': [0, 8, 16, 24, 36, 52, 72, 96, 124, 160, 162, 164, 166, 192],
+            'M': 6,
         },
     }
 
     def __init__(self, header: MP3Header, side_info: SideInfo, raw_bytes):
-        self._bits = Bits()
+        self._bits = BitReader(raw_bytes)
         self.header = header
         self.side_info = side_info
-        # print(len(raw_bytes))
-        for i in raw_bytes:
-            self._bits.add_bits(i)
         channels = 1
         if header.channel != ChannelEncodings.MONO:
             channels = 2
 
-        self.unpack_scale_factors(channels)
-        self.unpack_huffman(channels)
+        self.scalefac_l = [[None] * 2 for _ in range(0, 2)]
+        self.scalefac_s = [[None] * 2 for _ in range(0, 2)]
+        self.frequency_lines = [[None] * 2 for _ in range(0, 2)]
+        # index of the first line after the count1 region: everything from here up is zero
+        self.nonzero_lines = [[0] * 2 for _ in range(0, 2)]
+        # MPEG 2/2.5 intensity stereo: for the right channel, the (long, short) scale factor
+        # values at or above which a band isn't intensity coded. None otherwise
+        self.intensity_limits = [[None] * 2 for _ in range(0, 2)]
+        # scale factors and huffman data are stored one granule and channel at a time,
+        # and each pair takes up exactly part2_3_length bits
+        for gran in range(0, len(self.side_info.granules)):
+            for chan in range(0, channels):
+                part2_start = self._bits.tell()
+                part2_3_end = (part2_start +
+                               self.side_info.granules[gran].channels[chan].part2_3_length)
+                if header.lsf:
+                    self.unpack_lsf_scale_factors(gran, chan)
+                else:
+                    self.unpack_scale_factors(gran, chan)
+                self.unpack_huffman(gran, chan, part2_3_end)
+                self._bits.seek(part2_3_end)
+
+    def _block_kind(self, channel) -> int:
+        """
+        _block_kind : 0 for long, 1 for short and 2 for mixed blocks
+        """
+        if channel.window_switch_flag == 1 and channel.block_type == 2:
+            return 2 if channel.mixed_block_flag != 0 else 1
+        return 0
 
+    def _read_runs(self, runs, scalefac_l, scalefac_s):
+        """
+        _read_runs : read the runs of a scale factor plan into the long and short scale factors
+        """
+        read_ints = self._bits.read_ints
+        targets = (scalefac_l, scalefac_s)
+        for target, start, count, width in runs:
+            read_ints(count, width, targets[target], start)
 
-    def unpack_scale_factors(self, channels):
+    def unpack_scale_factors(self, gran, chan):
         """
         unpack_scale_factors : use the side information to determine how many bits
         to read for each scale factor band. the side information will also tell us
         whether or not scale factors are shared between granules for any bands
+
+        scalefac_l is an array('B') of the 22 long bands (the last always 0), and
+        scalefac_s an array('B') of the 13 short bands times 3 windows, window by window
+        within each band (the last band always 0)
         """
-        self.scalefac_l = [0] * 2
-        self.scalefac_s = [0] * 2
-        # i: granule; j: channel
-        for gran in range(0, 2):
-            granule = self.side_info.granules[gran]
-            self.scalefac_l[gran] = [0] * 2
-            self.scalefac_s[gran] = [0] * 2
-            for chan in range(0, channels):
-                channel = granule.channels[chan]
-                slen1 = self.scalefac_sizes[channel.scalefac_compress][0]
-                slen2 = self.scalefac_sizes[channel.scalefac_compress][1]
-                self.scalefac_l[gran][chan] = [0] * 22
-                self.scalefac_s[gran][chan] = [0] * 13
-                if channel.window_switch_flag == 1 and channel.block_type == 2:
-                    if channel.mixed_block_flag != 0:
-                        # mixed blocks
-                        for k in range(0, 8):
-                            self.scalefac_l[gran][chan][k] = self._bits.read(slen1)
-                        for k in range(3, 6):
-                            self.scalefac_s[gran][chan][k] = [0] * 3
-                            for sfb in range(0, 3):
-                                self.scalefac_s[gran][chan][k][sfb] = self._bits.read(slen1)
-                        for k in range(6, 12):
-                            self.scalefac_s[gran][chan][k] = [0] * 3
-                            for sfb in range(0, 3):
-                                self.scalefac_s[gran][chan][k][sfb] = self._bits.read(slen2)
-                    else:
-                        for k in range(3, 6):
-                            self.scalefac_s[gran][chan][k] = [0] * 3
-                            for sfb in range(0, 3):
-                                self.scalefac_s[gran][chan][k][sfb] = self._bits.read(slen1)
-                        for k in range(6, 12):
-                            self.scalefac_s[gran][chan][k] = [0] * 3
-                            for sfb in range(0, 3):
-                                self.scalefac_s[gran][chan][k][sfb] = self._bits.read(slen2)
+        channel = self.side_info.granules[gran].channels[chan]
+        kind = self._block_kind(channel)
+        runs = SCALEFAC_PLANS[channel.scalefac_compress][kind][0]
+        scalefac_l = _NO_SCALEFAC_L[:]
+        scalefac_s = _NO_SCALEFAC_S[:]
+        if gran == 0 or kind != 0:
+            self._read_runs(runs, scalefac_l, scalefac_s)
+        else:
+            # reuse the scale factors from the first granule (maybe), one scfsi band per run
+            previous = self.scalefac_l[gran - 1][chan]
+            scfsi = self.side_info.scfsi_band[chan]
+            read_ints = self._bits.read_ints
+            for band, (_, start, count, width) in enumerate(runs):
+                if scfsi[band] == 1:
+                    scalefac_l[start:start + count] = previous[start:start + count]
                 else:
-                    # scale factors for long blocks
-                    if gran == 0:
-                        for sfb in range(0, 11):
-                            self.scalefac_l[gran][chan][sfb] = self._bits.read(slen1)
-                        for sfb in range(11, 21):
-                            self.scalefac_l[gran][chan][sfb] = self._bits.read(slen2)
-                    else:
-                        # reuse the scale factors from the first granule (maybe)
-                        indices = [(0, 6), (6, 11), (11, 16), (16, 21)]
-                        for k in range(0, 2):
-                            start, end = indices[k]
-                            for sfb in range(start, end):
-                                if self.side_info.scfsi_band[chan][k] == 1:
-                                    self.scalefac_l[gran][chan][sfb] = self.scalefac_l[gran-1][chan][sfb]
-                                else:
-                                    self.scalefac_l[gran][chan][sfb] = self._bits.read(slen1)
-                        for k in range(2, 4):
-                            start, end = indices[k]
-                            for sfb in range(start, end):
-                                if self.side_info.scfsi_band[chan][k] == 1:
-                                    self.scalefac_l[gran][chan][sfb] = self.scalefac_l[gran-1][chan][sfb]
-                                else:
-                                    self.scalefac_l[gran][chan][sfb] = self._bits.read(slen2)
-                    self.scalefac_l[gran][chan][21] = 0
-
-    def unpack_huffman(self, channels):
+                    read_ints(count, width, scalefac_l, start)
+        self.scalefac_l[gran][chan] = scalefac_l
+        self.scalefac_s[gran][chan] = scalefac_s
+
+    def unpack_lsf_scale_factors(self, gran, chan):
+        """
+        unpack_lsf_scale_factors : MPEG 2/2.5 scale factors. scalefac_compress picks the bit
+        widths of four runs of scale factors (see lsf_scalefac_widths), read one after the
+        other: long bands in order, short bands window by window within each band. stored
+        as for MPEG 1
+        """
+        channel = self.side_info.granules[gran].channels[chan]
+        header = self.header
+        intensity_right = (chan == 1 and header.channel == ChannelEncodings.JOINT_STEREO
+                           and header.mode_extention[1] == '1')
+        runs, limits_l, limits_s = LSF_SCALEFAC_PLANS[intensity_right][
+            channel.scalefac_compress][self._block_kind(channel)]
+        scalefac_l = _NO_SCALEFAC_L[:]
+        scalefac_s = _NO_SCALEFAC_S[:]
+        self._read_runs(runs, scalefac_l, scalefac_s)
+        self.scalefac_l[gran][chan] = scalefac_l
+        self.scalefac_s[gran][chan] = scalefac_s
+        if intensity_right:
+            # bands past the ones sent have a limit of 0, so they aren't intensity coded
+            self.intensity_limits[gran][chan] = (limits_l, limits_s)
+
+    def unpack_huffman(self, gran, chan, part2_3_end):
         """
         unpack_huffman : unpack the huffman samples contained in ye olde maine data
         5 regions:
@@ -128,67 +275,49 @@ class MainData(object):
         - zero
 
         we're assuming here that self.bits() has been put at the right location
-        for us to just start reading
+        for us to just start reading. decoding stops at part2_3_end
         """
 
         samples_per_granule = 576
-        self.frequency_lines = [0] * 2
-        for gran in range(0, 2):
-            self.frequency_lines[gran] = [0] * 2
-            granule = self.side_info.granules[gran]
-            for chan in range(0, channels):
-                channel = granule.channels[chan]
-                self.frequency_lines[gran][chan] = [0] * 576
-                # print(chan, granule)
-                if channel.window_switch_flag == 1 and channel.block_type == 2:
-                    region_1_start = 36
-                    region_2_start = samples_per_granule
-                else:
-                    sampling_freq = self.header.frequency
-                    long_bands = self.scale_band_indicies[sampling_freq]['L']
-                    # print('gran chan region0: {}'.format(granule['region0_count']))
-                    # print('window_switch_flag: {}'.format(granule['window_switch_flag']))
-                    region_1_start = long_bands[channel.region0_count + 1]
-
-                    region_2_idx = (channel.region0_count +
-                                    channel.region1_count + 2)
-                    print('region_2_idx: {}'.format(region_2_idx))
-                    region_2_start = long_bands[region_2_idx]
-                # print(channel.big_values * 2)
-                for i in range(0, channel.big_values * 2, 2):
-                    if self._bits.peek(1) == b'':
-                        break
-                    elif i >= len(self.frequency_lines[gran][chan]):
-                        # if we have enough samples, then I think the rest of the bit
-                        # are just stuffing
-                        return
-                    table_num = 0
-                    if i < region_1_start:
-                        table_num = channel.table_select[0]
-                    elif i < region_2_start:
-                        table_num = channel.table_select[1]
-                    else:
-                        table_num = channel.table_select[2]
-                    if table_num == 0:
-                        self.frequency_lines[gran][chan][i] = 0.0
-                    x, y = decode_big_values(self._bits, table_num)
-                    self.frequency_lines[gran][chan][i] = float(x)
-                    self.frequency_lines[gran][chan][i+1] = float(y)
-
-                # we're done with the big values regions
-                # now, bring on the quadruples!
-                table_num = channel.count1_table_select
-                # iterate until we're either out of bits or we have 576 samples
-                for i in range(channel.big_values * 2, 576, 4):
-                    # If we're out of bits, break out!
-                    if self._bits.peek(1) == b'' or i >= len(self.frequency_lines[gran][chan]) - 4:
-                        break
-                    v, w, x, y = decode_quadruples(self._bits, table_num)
-                    self.frequency_lines[gran][chan][i] = float(v)
-                    self.frequency_lines[gran][chan][i+1] = float(w)
-                    self.frequency_lines[gran][chan][i+2] = float(x)
-                    self.frequency_lines[gran][chan][i+3] = float(y)
-                i += 1
-                while i < 576:
-                    self.frequency_lines[gran][chan][i] = 0
-                    i += 1
+        channel = self.side_info.granules[gran].channels[chan]
+        lines = array('i', [0]) * samples_per_granule
+        self.frequency_lines[gran][chan] = lines
+        if channel.window_switch_flag == 1 and channel.block_type == 2:
+            # the first three short bands, or the long bands of a mixed block: 36 lines,
+            # except at 8kHz where the bands are twice as wide
+            region_1_start = 72 if self.header.frequency == 8000 else 36
+            region_2_start = samples_per_granule
+        else:
+            sampling_freq = self.header.frequency
+            long_bands = self.scale_band_indicies[sampling_freq]['L']
+            region_1_start = long_bands[min(channel.region0_count + 1, 22)]
+
+            region_2_idx = min(channel.region0_count + channel.region1_count + 2, 22)
+            region_2_start = long_bands[region_2_idx]
+
+        big_values_end = min(channel.big_values * 2, samples_per_granule)
+        region_1_start = min(region_1_start, big_values_end)
+        region_2_start = min(max(region_2_start, region_1_start), big_values_end)
+        i = decode_region(self._bits, channel.table_select[0], 0, region_1_start,
+                          lines, part2_3_end)
+        if i == region_1_start:
+            i = decode_region(self._bits, channel.table_select[1], region_1_start,
+                              region_2_start, lines, part2_3_end)
+        if i == region_2_start:
+            i = decode_region(self._bits, channel.table_select[2], region_2_start,
+                              big_values_end, lines, part2_3_end)
+
+        # we're done with the big values regions
+        # now, bring on the quadruples!
+        self.nonzero_lines[gran][chan] = decode_count1(self._bits, channel.count1_table_select,
+                                                       i, lines, part2_3_end)
+
+# the plans for every scalefac_compress: SCALEFAC_PLANS[scalefac_compress][kind] and
+# LSF_SCALEFAC_PLANS[intensity_right][scalefac_compress][kind], kind being 0 for long,
+# 1 for short and 2 for mixed blocks
+SCALEFAC_PLANS = [_mpeg1_scalefac_plans(compress) for compress in range(0, 16)]
+LSF_SCALEFAC_PLANS = [[_lsf_scalefac_plans(compress, intensity_right)
+                       for compress in range(0, 512)] for intensity_right in (False, True)]
+
+_NO_SCALEFAC_L = array('B', [0]) * 22
+_NO_SCALEFAC_S = array('B', [0]) * 39
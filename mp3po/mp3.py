@@ -2,10 +2,21 @@
 mp3.py : do mp3 things
 """
 
-from .frame import Frame
-from .header import MP3Header, ChannelEncodings
-from .main_data import MainData
-from .sideinfo import SideInfo
+import contextlib
+import io
+import itertools
+import mmap
+import os
+
+from .crc import CRCCheck
+from .decoder import Decoder
+from .incremental import IncrementalDecoder
+from .index import FrameIndex
+from .reservoir import BitReservoir
+from .sync import FrameScanner
+from .tags import Tags, id3v2_size, parse_ape, parse_id3v1, parse_id3v2, skip_id3v2
+from .tags import trailing_tags
+from .vbr import parse_vbr_header
 
 class MP3File(object):
     """
@@ -15,99 +26,407 @@ class MP3File(object):
     support reading data chunks and getting other kinds of information as well
 
     The side information is 17 bytes for mono, 32 bytes otherwise.
+
+    mp3_file is a path, a bytes-like object holding the whole file, or a seekable binary
+    file object (left open). for pipes and other streams, see IncrementalDecoder
+
+    with a crc policy ('skip', 'conceal' or 'raise'), protected frames have their CRC checked
+    as they're read, and self.crc counts how many were checked and how many failed
     """
 
-    def __init__(self, mp3_file):
+    # how much to read at a time when the file can't be memory mapped
+    chunk_size = 256 * 1024
+
+    def __init__(self, mp3_file, crc=None):
         self.filename = mp3_file
+        self.crc = CRCCheck(crc) if crc is not None else None
         self.position = 0
-        # open file, read data into header and data frame objects
-        with open(mp3_file, 'rb') as audio:
-            # read audio data into a buffer. stop once we've reached the first mp3 frame
-            buf = audio.read(2)
-            while self._is_not_frame_start(buf[-2], buf[-1]):
-                buf += audio.read(1)
+        # open file, find the first mp3 frame
+        with self._open() as audio:
             # should we save the start location of the mp3 data? Yes
-            self.position = audio.tell() - 2
-        print(self.position)
-        self.previous_frame_size = 0
-        # keep a buffer of main data from previous frames. when we need to read main data
-        # we will follow one of the following:
-        #   - read all of the main data from the buffer
-        #   - read the rest of the buffer, then some of the main data in the current physical frame
-        #   - read the main data from immediately after the side information
-        self.main_data_buffer = b''
-
-    def read_frames(self, nframes: int) -> (list, list):
-        """
-        read_frames
-        return two equal-length arrays:
-          - headers for the number of frames read
-          - data of each frame
-        """
-        frames = []
-        if nframes == 0:
-            return frames
-        with open(self.filename, 'rb') as audio:
-            still_reading = True
-            audio.seek(self.position)
-            while still_reading:
-                if len(frames) == nframes:
-                    break
-                print('reading header starting at byte offset {}'.format(audio.tell()))
-                # Read the 4 header bytes
-                buf = audio.read(4)
-                header = MP3Header(buf)
-                non_main_data_len = 4
-
-                if header.error_protection == '1':
-                    # who cares about the 16-bit crc? let's get to the freakin MUSIC!
-                    audio.read(2)
-                    non_main_data_len += 2
-
-                # if mono: side info is 17 bytes; else: 32
-                side_info_length = 17
-                if header.channel != ChannelEncodings.MONO:
-                    side_info_length = 32
-                print("reading side info at: {}".format(audio.tell()))
-                side_info_bytes = audio.read(side_info_length)
-                side_info = SideInfo(header, side_info_bytes)
-                print("side info granules: {}".format(side_info.granules))
-                print("side info main_data_begin: {}".format(side_info.main_data_begin))
-                print("side info scfsi_band: {}".format(side_info.scfsi_band))
-                non_main_data_len += side_info_length
-
-                main_data_length = header.frame_size - non_main_data_len
-
-                # read until the next header so we have all the main data we could possibly want
+            self.file_size = audio.seek(0, os.SEEK_END)
+            audio.seek(0)
+            # tags before and after the audio are stepped over by their sizes, not scanned
+            self.audio_start = skip_id3v2(audio)
+            self.trailing_tags = trailing_tags(audio, self.file_size)
+            self.audio_end = max(self.audio_start, self.trailing_tags['audio_end'])
+            audio.seek(self.audio_start)
+            self.position, self.first_header, self.vbr_header = self._find_first_frame(audio)
+        # a Xing/Info/VBRI tag's frame holds no audio
+        self.tag_frame = self.position
+        if self.vbr_header is not None:
+            self.position += self.first_header.frame_size
+        self.first_frame = self.position
+        # the seek table, built the first time it's needed
+        self.index = None
+        # the tags, read the first time they're needed
+        self._tags = None
+        # main data from earlier frames, for frames whose main data starts before them
+        self.reservoir = BitReservoir()
+        # the decoder keeps filterbank state between calls to read_pcm
+        self.decoder = Decoder()
+
+    def _find_first_frame(self, audio):
+        """
+        _find_first_frame : offset and header of the first frame in the file and the
+        Xing/Info/VBRI tag in it. the header and tag can be None, with the offset at the
+        end of the file if there are no frames
+        """
+        scanner = FrameScanner()
+        base = audio.tell()
+        data = b''
+        while True:
+            chunk = self._read_chunk(audio)
+            data = data + chunk
+            position, header = scanner.next_frame(data, 0, len(data), final=not chunk)
+            if header is not None:
+                frame = data[position:position + header.frame_size]
+                return base + position, header, parse_vbr_header(header, frame)
+            if not chunk:
+                return self.audio_end, None, None
+            base += position
+            data = data[position:]
+
+    def _open(self):
+        """
+        _open : the file as a binary file object, for a with statement
+        """
+        source = self.filename
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return io.BytesIO(source)
+        if hasattr(source, 'read'):
+            return contextlib.nullcontext(source)
+        return open(source, 'rb')
+
+    def _map(self, audio):
+        """
+        _map : the whole file as something with find() and slicing: the bytes passed in, or
+        a memory map of the open file. None if neither is possible
+        """
+        if isinstance(self.filename, (bytes, bytearray)):
+            return self.filename
+        return self._map_file(audio)
+
+    def _read_chunk(self, audio) -> bytes:
+        """
+        _read_chunk : read up to chunk_size bytes, stopping at the end of the audio
+        """
+        return audio.read(max(0, min(self.chunk_size, self.audio_end - audio.tell())))
+
+    @staticmethod
+    def _map_file(audio):
+        """
+        _map_file : memory map an open file, or None if it can't be mapped
+        """
+        try:
+            return mmap.mmap(audio.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty files and things like pipes can't be mapped
+            return None
+
+    @staticmethod
+    def _main_data_start(header, position: int) -> int:
+        """
+        _main_data_start : where the main data slot of the frame at position starts
+        """
+        if header.error_protection == '0':
+            # a protection bit of 0 means a 16-bit crc follows the header
+            position += 2
+        return position + 4 + header.side_info_length
+
+    def iter_frames(self, use_mmap=True):
+        """
+        iter_frames : generate the frames from the current position to the end of the file
+        the file is memory mapped when possible and read in large chunks otherwise. headers,
+        side info and main data are memoryview slices of the file data, not copies.
+        self.position is kept pointing at the frame after the last one generated
+        """
+        stream = IncrementalDecoder(self.reservoir, self.decoder, offset=self.position,
+                                    crc=self.crc)
+        try:
+            with self._open() as audio:
+                data = self._map(audio) if use_mmap else None
+                if data is None:
+                    audio.seek(self.position)
+                    while True:
+                        chunk = self._read_chunk(audio)
+                        if chunk:
+                            stream.feed(chunk)
+                        else:
+                            stream.feed_eof()
+                        for frame in stream.frames():
+                            self.position = stream.position
+                            yield frame
+                        if not chunk:
+                            return
+            # the map outlives the file and stays alive as long as a frame has a view of it
+            stream.feed(data, self.position, max(self.position, self.audio_end))
+            stream.feed_eof()
+            for frame in stream.frames():
+                self.position = stream.position
+                yield frame
+        finally:
+            # including past a frame that raised a CRCMismatchException
+            self.position = stream.position
+
+    def iter_headers(self):
+        """
+        iter_headers : generate (offset, header) for every frame from the first one on,
+        jumping from header to header by frame size. nothing else in the frames is parsed
+        """
+        scanner = FrameScanner()
+        with self._open() as audio:
+            data = self._map(audio)
+            if data is not None:
+                try:
+                    position = self.first_frame
+                    while True:
+                        position, header = scanner.next_frame(data, position, self.audio_end)
+                        if header is None:
+                            return
+                        yield position, header
+                        position += header.frame_size
+                finally:
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+            audio.seek(self.first_frame)
+            base = self.first_frame
+            data = b''
+            position = 0
+            while True:
+                chunk = self._read_chunk(audio)
+                data = data[position:] + chunk
+                base += position
+                position = 0
                 while True:
-                    new_byte = audio.peek(1)
-                    if new_byte == b'':
-                        still_reading = False
+                    position, header = scanner.next_frame(data, position, len(data),
+                                                          final=not chunk)
+                    if header is None:
                         break
-                    if self.main_data_buffer == b'':
-                        self.main_data_buffer += audio.read(2)
-                    else:
-                        self.main_data_buffer += audio.read(1)
-
-                    if len(self.main_data_buffer) >= main_data_length and not self._is_not_frame_start(self.main_data_buffer[-2], self.main_data_buffer[-1]):
-                        # we've stumbled upon a new frame. return the file back to the start
-                        # of the header and remove the last two bytes from the main data buffer
-                        audio.seek(audio.tell() - 2)
-                        self.main_data_buffer = self.main_data_buffer[:-2]
+                    yield base + position, header
+                    position += header.frame_size
+                if not chunk:
+                    return
+
+    def frame_index(self) -> FrameIndex:
+        """
+        frame_index : the seek table for the file, built on first use by hopping from header
+        to header without parsing side info or main data
+        """
+        if self.index is not None:
+            return self.index
+        index = FrameIndex()
+        with self._open() as audio:
+            data = self._map(audio)
+            scanner = FrameScanner()
+            if data is not None:
+                index.end = self._index_buffer(index, data, 0, self.first_frame, scanner)
+                if isinstance(data, mmap.mmap):
+                    data.close()
+            else:
+                audio.seek(self.first_frame)
+                base = self.first_frame
+                data = b''
+                while True:
+                    chunk = self._read_chunk(audio)
+                    data = data + chunk
+                    consumed = self._index_buffer(index, data, base, 0, scanner,
+                                                  final=not chunk)
+                    base += consumed
+                    if not chunk:
                         break
-                # At this point, we now have all the main data up until the start of the next frame
-
-                # calculate the position at which to start reading the main data
-                # then read the main data into a buffer and send that buffer somewhere
-                # so that we might one day hope to know the scaling factors
-                print(header.frame_size, main_data_length, len(self.main_data_buffer))
-                main_data_bytes = self.main_data_buffer[:main_data_length]
-                self.main_data_buffer = self.main_data_buffer[main_data_length:]
-                main_data = MainData(header, side_info, main_data_bytes)
-                frame = Frame(header, side_info, main_data)
-                frames.append(frame)
-            self.position = audio.tell()
-        return frames
-
-    def _is_not_frame_start(self, byte1, byte2):
-        return (byte1 != 255 or (byte2 & 0xF0 != 240 and byte2 & 0xE0 != 224))
+                    data = data[consumed:]
+                index.end = base
+        self.index = index
+        return index
+
+    def _index_buffer(self, index: FrameIndex, data, base: int, position: int,
+                      scanner: FrameScanner, final=True) -> int:
+        """
+        _index_buffer : add the frames that fit entirely in data to index, starting at
+        data[position]. returns where to carry on from: the offset in data of the first
+        incomplete frame or, with final, just past the last frame added
+        """
+        end = min(len(data), self.audio_end - base)
+        last_end = position
+        while True:
+            position, header = scanner.next_frame(data, position, end, final)
+            if header is None:
+                return last_end if final else position
+            main_data_start = self._main_data_start(header, position)
+            index.add(base + position, int.from_bytes(data[position:position + 4], 'big'),
+                      header, data[main_data_start - header.side_info_length:main_data_start])
+            position += header.frame_size
+            last_end = position
+
+    def duration(self) -> float:
+        """
+        duration : length of the file in seconds. exact if there's a Xing/Info/VBRI frame count
+        or the frame index has been built, otherwise estimated from the file size as if
+        the file had a constant bitrate
+        """
+        header = self.first_header
+        if header is None:
+            return 0.0
+        if self.vbr_header is not None and self.vbr_header.frames:
+            return self.vbr_header.frames * header.samples_per_frame / header.frequency
+        if self.index is not None:
+            return self.index.duration()
+        return (self.audio_end - self.first_frame) * 8 / header.bitrate
+
+    def bitrate(self) -> float:
+        """
+        bitrate : average bitrate of the file in bits per second
+        """
+        header = self.first_header
+        if header is None:
+            return 0.0
+        duration = self.duration()
+        if self.vbr_header is not None and self.vbr_header.bytes and duration:
+            return self.vbr_header.bytes * 8 / duration
+        if self.index is not None and duration:
+            return (self.index.end - self.first_frame) * 8 / duration
+        return float(header.bitrate)
+
+    def seek(self, seconds: float, exact=True) -> float:
+        """
+        seek : move to the frame playing at the given time and return the time that frame
+        starts at. the bit reservoir is primed with the main data of the frames before it,
+        so the frame decodes fully. the filterbanks start over, so the first
+        frame's first granule fades in
+
+        with exact=False, the position is estimated from the Xing/VBRI table of contents
+        (or the bitrate, without one) instead of building the frame index. that takes
+        constant time, but the reservoir starts out empty, so the first frame or two
+        after the seek decode as silence, and the time returned is the estimate
+        """
+        if not exact:
+            return self._approximate_seek(seconds)
+        index = self.frame_index()
+        target = index.frame_for_time(max(0.0, seconds))
+        self.seek_frame(target)
+        if target >= len(index):
+            return index.duration()
+        return index.samples[target] / index.frequency
+
+    def seek_frame(self, target: int):
+        """
+        seek_frame : move to the frame with the given number in the frame index, priming the
+        bit reservoir and starting the filterbanks over like seek
+        """
+        index = self.frame_index()
+        self.reservoir.reset()
+        self.decoder = Decoder()
+        if target >= len(index):
+            self.position = index.end
+            return
+        self._prime_reservoir(index, target)
+        self.position = index.offsets[target]
+
+    def _approximate_seek(self, seconds: float) -> float:
+        """
+        _approximate_seek : seek(seconds, exact=False)
+        """
+        self.reservoir.reset()
+        self.decoder = Decoder()
+        duration = self.duration()
+        seconds = min(max(seconds, 0.0), duration)
+        if seconds >= duration:
+            self.position = self.audio_end
+            return duration
+        offset = None
+        if self.vbr_header is not None:
+            offset = self.vbr_header.seek_offset(seconds / duration)
+        if offset is not None:
+            position = self.tag_frame + offset
+        else:
+            position = self.first_frame + int(seconds * self.bitrate() / 8)
+        position = max(position, self.first_frame)
+        # land on the next frame header
+        size = max(0, min(4 * BitReservoir.max_frame_size, self.audio_end - position))
+        with self._open() as audio:
+            audio.seek(position)
+            data = audio.read(size)
+        final = position + len(data) >= self.audio_end
+        found, header = FrameScanner().next_frame(data, 0, len(data), final)
+        self.position = position + found if header is not None else self.audio_end
+        return seconds
+
+    def _prime_reservoir(self, index: FrameIndex, target: int):
+        """
+        _prime_reservoir : feed the reservoir the main data slots of as many frames before
+        the target frame as its main_data_begin reaches back into
+        """
+        main_data_begin = index.main_data_begin(target)
+        with self._open() as audio:
+            # walk back until the slots seen cover main_data_begin bytes
+            first = target
+            covered = 0
+            slots = []
+            while first > 0 and covered < main_data_begin:
+                first -= 1
+                header = index.header(first)
+                audio.seek(index.offsets[first])
+                frame = audio.read(header.frame_size)
+                slot = frame[self._main_data_start(header, 0):header.frame_size]
+                slots.append(slot)
+                covered += len(slot)
+        for slot in reversed(slots):
+            self.reservoir.append(slot)
+
+    @property
+    def tags(self) -> Tags:
+        """
+        tags : the ID3v2, ID3v1 and APEv2 tags, read and parsed on first use
+        """
+        if self._tags is None:
+            self._tags = self._read_tags()
+        return self._tags
+
+    def _read_tags(self) -> Tags:
+        """
+        _read_tags : read the tags found when the file was opened
+        """
+        tags = Tags()
+        with self._open() as audio:
+            audio.seek(0)
+            raw_bytes = audio.read(self.audio_start)
+            position = 0
+            while position < len(raw_bytes):
+                size = id3v2_size(raw_bytes[position:])
+                if not size:
+                    break
+                for frame_id, bodies in parse_id3v2(raw_bytes[position:position + size]).items():
+                    tags.id3v2.setdefault(frame_id, []).extend(bodies)
+                position += size
+            if 'id3v1' in self.trailing_tags:
+                audio.seek(self.trailing_tags['id3v1'])
+                tags.id3v1 = parse_id3v1(audio.read(128))
+            if 'ape' in self.trailing_tags:
+                offset, size = self.trailing_tags['ape']
+                audio.seek(offset)
+                tags.ape = parse_ape(audio.read(size))
+        return tags
+
+    def read_frames(self, nframes: int) -> list:
+        """
+        read_frames : return the next nframes frames (or fewer at the end of the file)
+        """
+        if nframes == 0:
+            return []
+        return list(itertools.islice(self.iter_frames(), nframes))
+
+    def read_pcm(self, nframes: int) -> list:
+        """
+        read_pcm : read the next nframes frames and decode them
+        returns a list with one array('d') of samples per channel
+        """
+        pcm = []
+        for frame in self.read_frames(nframes):
+            decoded = self.decoder.decode(frame)
+            if not pcm:
+                pcm = decoded
+            else:
+                for chan, samples in enumerate(decoded):
+                    pcm[chan].extend(samples)
+        return pcm
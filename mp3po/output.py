@@ -0,0 +1,236 @@
+"""
+output.py : write decoded PCM out as WAV files or raw samples
+
+PCM comes in a block at a time, as the decoder makes it: one buffer of float samples per
+channel (array('d'), a NumPy array, anything iterable, ideally with the buffer protocol).
+conversion and interleaving run through map() and array slice assignment, so the work per
+sample stays in C, and the result goes to the file as one buffer without being copied
+
+formats:
+- s16le : 16-bit signed integers, clipped to [-32768, 32767]
+- f32le : 32-bit floats, as decoded
+"""
+
+import contextlib
+import itertools
+import struct
+import sys
+from array import array
+from itertools import repeat
+from operator import mul
+
+S16LE = 's16le'
+F32LE = 'f32le'
+SAMPLE_FORMATS = (S16LE, F32LE)
+
+# array type code for each format
+_TYPECODES = {S16LE : 'h', F32LE : 'f'}
+
+# WAV format tags
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+def to_s16(samples) -> array:
+    """
+    to_s16 : float samples nominally in [-1.0, 1.0] as an array('h'), clipped and rounded
+    """
+    scaled = map(mul, samples, repeat(32768.0))
+    clipped = map(max, repeat(-32768.0), map(min, repeat(32767.0), scaled))
+    return array('h', map(round, clipped))
+
+def to_f32(samples) -> array:
+    """
+    to_f32 : float samples as an array('f')
+    """
+    return array('f', samples)
+
+def interleave(pcm: list, sample_format=S16LE) -> array:
+    """
+    interleave : a block of PCM (one buffer per channel) as one array of interleaved samples
+    in the given format, little endian whatever the machine
+    """
+    convert = to_s16 if sample_format == S16LE else to_f32
+    channels = [convert(_samples(samples)) for samples in pcm]
+    if len(channels) == 1:
+        out = channels[0]
+    else:
+        count = min(len(samples) for samples in channels)
+        out = array(_TYPECODES[sample_format],
+                    bytes(sample_size(sample_format) * count * len(channels)))
+        for chan, samples in enumerate(channels):
+            out[chan::len(channels)] = samples[0:count]
+    if sys.byteorder == 'big':
+        out.byteswap()
+    return out
+
+def sample_size(sample_format: str) -> int:
+    """
+    sample_size : bytes per sample of a format
+    """
+    return 2 if sample_format == S16LE else 4
+
+def _samples(samples):
+    """
+    _samples : a channel's samples as something map() can go through without making Python
+    objects up front: a memoryview for anything with the buffer protocol
+    """
+    try:
+        return memoryview(samples)
+    except TypeError:
+        return samples
+
+class RawWriter(object):
+    """
+    RawWriter : write PCM as bare interleaved samples, with no header
+
+    out is a path or a binary file object (left open, like MP3File)
+
+    Attributes :
+    - channels : number of channels
+    - sample_format : one of SAMPLE_FORMATS
+    - frames : sample frames (one sample per channel) written so far
+    """
+
+    def __init__(self, out, channels: int, sample_format=S16LE):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError('sample format must be one of {0}, not {1!r}'.format(
+                ', '.join(SAMPLE_FORMATS), sample_format))
+        self.channels = channels
+        self.sample_format = sample_format
+        self.frames = 0
+        if hasattr(out, 'write'):
+            self._file = out
+            self._close_file = False
+        else:
+            self._file = open(out, 'wb')
+            self._close_file = True
+        self._start()
+
+    def _start(self):
+        """
+        _start : write whatever comes before the samples
+        """
+
+    def write(self, pcm: list):
+        """
+        write : add a block of PCM, one buffer of float samples per channel
+        """
+        if not pcm:
+            return
+        if len(pcm) != self.channels:
+            raise ValueError('expected {0} channels, got {1}'.format(self.channels, len(pcm)))
+        out = interleave(pcm, self.sample_format)
+        self._file.write(memoryview(out).cast('B'))
+        self.frames += len(out) // self.channels
+
+    def close(self):
+        """
+        close : finish the output, closing the file if it was opened here
+        """
+        if self._file is None:
+            return
+        try:
+            self._finish()
+        finally:
+            if self._close_file:
+                self._file.close()
+            self._file = None
+
+    def _finish(self):
+        """
+        _finish : write whatever comes after the samples
+        """
+        self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class WavWriter(RawWriter):
+    """
+    WavWriter : write PCM as a WAV file, as it's decoded
+
+    the sizes in the header aren't known until the end: they're written as placeholders and
+    patched by close(). when the output can't seek back (a pipe), they're left at their
+    largest, which readers take to mean "until the end of the stream"
+
+    Attributes :
+    - frequency : sampling rate
+    """
+
+    # offsets of the fields patched at the end
+    _RIFF_SIZE = 4
+    _PCM_DATA_SIZE = 40
+    _FLOAT_FACT_FRAMES = 46
+    _FLOAT_DATA_SIZE = 54
+
+    def __init__(self, out, channels: int, frequency: int, sample_format=S16LE):
+        self.frequency = frequency
+        self._base = 0
+        super().__init__(out, channels, sample_format)
+
+    def _start(self):
+        """
+        _start : the RIFF header, with placeholder sizes
+        """
+        itemsize = sample_size(self.sample_format)
+        block_align = itemsize * self.channels
+        fmt = struct.pack('<HHIIHH',
+                          WAVE_FORMAT_PCM if self.sample_format == S16LE
+                          else WAVE_FORMAT_IEEE_FLOAT,
+                          self.channels, self.frequency, self.frequency * block_align,
+                          block_align, 8 * itemsize)
+        header = b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+        if self.sample_format == S16LE:
+            header += b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        else:
+            # formats other than integer PCM have an extension size and a fact chunk
+            fmt += struct.pack('<H', 0)
+            header += (b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+                       + b'fact' + struct.pack('<II', 4, 0xFFFFFFFF))
+        header += b'data' + struct.pack('<I', 0xFFFFFFFF)
+        try:
+            self._base = self._file.tell()
+        except (OSError, ValueError):
+            self._base = None
+        self._file.write(header)
+
+    def _finish(self):
+        """
+        _finish : patch in the sizes, if the output can seek
+        """
+        data_size = self.frames * self.channels * sample_size(self.sample_format)
+        if self._base is not None:
+            with contextlib.suppress(OSError, ValueError):
+                end = self._file.tell()
+                if self.sample_format == S16LE:
+                    data_offset = self._PCM_DATA_SIZE
+                else:
+                    data_offset = self._FLOAT_DATA_SIZE
+                    self._patch(self._FLOAT_FACT_FRAMES, self.frames)
+                self._patch(self._RIFF_SIZE, end - self._base - 8)
+                self._patch(data_offset, data_size)
+                self._file.seek(end)
+        self._file.flush()
+
+    def _patch(self, offset: int, value: int):
+        """
+        _patch : overwrite a 32-bit size at offset in the header
+        """
+        self._file.seek(self._base + offset)
+        self._file.write(struct.pack('<I', min(value, 0xFFFFFFFF)))
+
+def decode_to(mp3, writer: RawWriter, max_frames=None) -> int:
+    """
+    decode_to : decode an MP3File from its current position into a writer, frame by frame.
+    returns the number of frames decoded
+    """
+    decode = mp3.decoder.decode
+    write = writer.write
+    count = 0
+    for frame in itertools.islice(mp3.iter_frames(), max_frames):
+        write(decode(frame))
+        count += 1
+    return count
@@ -0,0 +1,120 @@
+"""
+probe.py : what's in an MP3 file, from its frame headers alone
+
+only the 4 byte header of each frame is read, jumping from one to the next by frame size,
+so a file is probed in a fraction of the time it takes to decode it
+"""
+
+from .header import ChannelEncodings
+from .mp3 import MP3File
+
+class ProbeResult(object):
+    """
+    ProbeResult : the format and length of a file
+
+    Attributes :
+    - path : the file
+    - mpeg_version : MPEGVersionEncodings of the first frame, or None without frames
+    - layer : LayerEncodings of the first frame
+    - channel_mode : ChannelEncodings of the first frame
+    - channels : number of channels
+    - frequency : sampling rate
+    - bitrate : average bitrate in bits per second
+    - vbr : whether the bitrate varies from frame to frame
+    - vbr_header : the file's Xing/Info/VBRI tag, or None
+    - frames : number of audio frames
+    - samples : samples per channel
+    - duration : length in seconds
+    - exact : whether every frame was counted, rather than extrapolated from the first ones
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mpeg_version = None
+        self.layer = None
+        self.channel_mode = None
+        self.channels = 0
+        self.frequency = 0
+        self.bitrate = 0.0
+        self.vbr = False
+        self.vbr_header = None
+        self.frames = 0
+        self.samples = 0
+        self.duration = 0.0
+        self.exact = True
+
+    def summary(self) -> dict:
+        """
+        summary : the fields as plain values, for printing
+        """
+        return {
+            'path' : self.path if isinstance(self.path, str) else None,
+            'mpeg_version' : self.mpeg_version.name if self.mpeg_version else None,
+            'layer' : self.layer.name if self.layer else None,
+            'channel_mode' : self.channel_mode.name if self.channel_mode else None,
+            'channels' : self.channels,
+            'frequency' : self.frequency,
+            'bitrate' : self.bitrate,
+            'vbr' : self.vbr,
+            'vbr_header' : self.vbr_header.kind if self.vbr_header else None,
+            'frames' : self.frames,
+            'samples' : self.samples,
+            'duration' : self.duration,
+            'exact' : self.exact,
+        }
+
+def probe(path, max_frames=None) -> ProbeResult:
+    """
+    probe : the format, bitrate and exact length of a file (anything MP3File takes) from its
+    frame headers. with max_frames, stop after that many frames and extrapolate the rest
+    from their average size, which is exact for a constant bitrate file. a variable bitrate
+    file's Xing/VBRI frame count is used when there is one
+    """
+    result = ProbeResult(path)
+    mp3 = MP3File(path)
+    first = mp3.first_header
+    if first is None:
+        return result
+    result.mpeg_version = first.mpeg_version
+    result.layer = first.layer
+    result.channel_mode = first.channel
+    result.channels = 1 if first.channel == ChannelEncodings.MONO else 2
+    result.frequency = first.frequency
+    result.vbr_header = mp3.vbr_header
+
+    frames = 0
+    samples = 0
+    nbytes = 0
+    bitrates = set()
+    end = mp3.first_frame
+    for offset, header in mp3.iter_headers():
+        frames += 1
+        samples += header.samples_per_frame
+        nbytes += header.frame_size
+        bitrates.add(header.bitrate)
+        end = offset + header.frame_size
+        if max_frames is not None and frames >= max_frames:
+            break
+    result.vbr = len(bitrates) > 1 or (mp3.vbr_header is not None
+                                       and mp3.vbr_header.kind != 'Info')
+    result.exact = max_frames is None or frames < max_frames or end >= mp3.audio_end
+    if not result.exact and frames:
+        tag = mp3.vbr_header
+        if result.vbr and tag is not None and tag.frames:
+            result.frames = tag.frames
+        else:
+            # the rest of the audio is frames of the same average size
+            result.frames = frames + round((mp3.audio_end - end) * frames / nbytes)
+        samples = result.frames * first.samples_per_frame
+        if result.vbr and tag is not None and tag.bytes:
+            # the tag counts its own frame
+            nbytes = tag.bytes - (mp3.first_frame - mp3.tag_frame)
+        else:
+            nbytes = mp3.audio_end - mp3.first_frame
+    else:
+        result.frames = frames
+    result.samples = samples
+    result.duration = samples / first.frequency
+    if result.duration:
+        result.bitrate = nbytes * 8 / result.duration
+    return result
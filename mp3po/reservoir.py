@@ -0,0 +1,73 @@
+"""
+reservoir.py : the bit reservoir
+
+a frame's main data doesn't have to start right after its side information: it starts
+main_data_begin bytes before that, in the main data slots of earlier frames
+"""
+
+class BitReservoir(object):
+    """
+    BitReservoir : keep the tail of the main data seen so far in a fixed bytearray so
+    each frame's main data can be handed out as one contiguous memoryview
+
+    the buffer holds at most max_begin bytes from earlier frames plus the current slot.
+    when a new slot doesn't fit, the last max_begin bytes are moved to the front,
+    so every byte is copied in once and moved at most once
+    """
+
+    # main_data_begin is 9 bits
+    max_begin = 511
+    # the largest layer III frame is 320kbps at 32kHz, or 160kbps at 8kHz: 1441 bytes
+    max_frame_size = 1441
+
+    def __init__(self, frames_per_move=8):
+        self._buffer = bytearray(self.max_begin + frames_per_move * self.max_frame_size)
+        self._view = memoryview(self._buffer)
+        # the valid data is self._buffer[self._end - self._available:self._end]
+        self._end = 0
+        self._available = 0
+
+    def reset(self):
+        """
+        reset : forget everything, e.g. after seeking
+        """
+        self._end = 0
+        self._available = 0
+
+    def frame_main_data(self, main_data_begin: int, slot):
+        """
+        frame_main_data : add the main data slot of the current frame and return the frame's
+        main data: main_data_begin bytes from earlier slots followed by this slot.
+        returns None if the reservoir doesn't go back that far (the start of the stream,
+        or right after a seek), in which case the frame can't be decoded
+        """
+        available = self._available
+        start = self.append(slot)
+        if main_data_begin > available:
+            return None
+        return self._view[start - main_data_begin:self._end]
+
+    def append(self, slot) -> int:
+        """
+        append : add a main data slot without taking any main data out, e.g. to prime the
+        reservoir with the frames before a seek target. returns where the slot starts
+        """
+        length = len(slot)
+        if self._end + length > len(self._buffer):
+            keep = min(self._available, self.max_begin)
+            if keep + length > len(self._buffer):
+                # bigger than any legal frame (free format?): switch to a bigger buffer.
+                # views handed out earlier keep the old one alive
+                buffer = bytearray(self.max_begin + 2 * length)
+                buffer[0:keep] = self._buffer[self._end - keep:self._end]
+                self._buffer = buffer
+                self._view = memoryview(buffer)
+            else:
+                self._buffer[0:keep] = self._buffer[self._end - keep:self._end]
+            self._end = keep
+            self._available = keep
+        start = self._end
+        self._buffer[start:start + length] = slot
+        self._end = start + length
+        self._available += length
+        return start
@@ -4,8 +4,7 @@ sideinfo.py : get the side information for an MP3 frame
 
 import json
 
-from collections import defaultdict
-from .util.bits import Bits
+from .util.bits import BitReader
 from .header import ChannelEncodings, MP3Header
 
 class ChannelSideInfo(object):
@@ -16,7 +15,7 @@ class ChannelSideInfo(object):
     - part2_3_length : 1 value
     - big_values : 1 value
     - global_gain : 1 value
-    - scalefac_compress : 1 value
+    - scalefac_compress : 1 value (4 bits, or 9 for LSF)
     - window_switching_flag : 1 value
     - block_type : 1 value
     - mixed_block_flag : 1 value
@@ -24,19 +23,26 @@ class ChannelSideInfo(object):
     - region0_count : 1 value
     - region0_count : 1 value
     - sub_block_gain : 3 values
-    - preflag : 1 value
+    - preflag : 1 value (not sent for LSF: it comes from scalefac_compress)
     - scalefac_scale : 1 value
     - count1_table_select : 1 value
+
+    there are up to four of these per frame, so they have __slots__ instead of a __dict__
     """
 
-    def __init__(self, index: int, bits: Bits):
+    __slots__ = ('index', 'part2_3_length', 'big_values', 'global_gain', 'scalefac_compress',
+                 'window_switch_flag', 'block_type', 'mixed_block_flag', 'table_select',
+                 'sub_block_gain', 'region0_count', 'region1_count', 'preflag',
+                 'scalefac_scale', 'count1_table_select')
+
+    def __init__(self, index: int, bits: BitReader, lsf=False):
         self.index = index
         # self.bits = bits # do we actually want to keep a copy of the bitstring here?
 
         self.part2_3_length = bits.read_bits_as_int(12)
         self.big_values = bits.read_bits_as_int(9)
         self.global_gain = bits.read_bits_as_int(8)
-        self.scalefac_compress = bits.read_bits_as_int(4)
+        self.scalefac_compress = bits.read_bits_as_int(9 if lsf else 4)
         self.window_switch_flag = bits.read_bits_as_int(1)
         self.table_select = [0] * 3
         self.sub_block_gain = [0] * 3
@@ -69,7 +75,7 @@ class ChannelSideInfo(object):
             self.mixed_block_flag = 0
             for _ in range(0, 3):
                 self.sub_block_gain[i] = 0
-        self.preflag = bits.read_bits_as_int(1)
+        self.preflag = 0 if lsf else bits.read_bits_as_int(1)
         self.scalefac_scale = bits.read_bits_as_int(1)
         self.count1_table_select = bits.read_bits_as_int(1)
 
@@ -96,15 +102,15 @@ class ChannelSideInfo(object):
 
 class Granule(object):
     """
-    Granule : basically just a container for a two-tuple of Channels
+    Granule : basically just a container for a list of Channels, one for mono and
+    two otherwise
     """
 
-    def __init__(self, index, bits):
+    __slots__ = ('index', 'channels')
+
+    def __init__(self, index, bits, channels=2, lsf=False):
         self.index = index
-        self.bits = bits
-        self.channels = []
-        self.channels.append(ChannelSideInfo(0, self.bits))
-        self.channels.append(ChannelSideInfo(1, self.bits))
+        self.channels = [ChannelSideInfo(chan, bits, lsf) for chan in range(0, channels)]
 
     def collect_channel_values(self, key):
         """
@@ -129,9 +135,9 @@ class SideInfo(object):
     SideInfo : parse the side information for an MP3 frame
 
     Attributes:
-        main_data_begin - 9 bits
-        private_bits - 5 bites for mono; 3 bits for stereo
-        scfsi
+        main_data_begin - 9 bits (8 for LSF)
+        private_bits - 5 bites for mono; 3 bits for stereo (LSF: 1 and 2)
+        scfsi (all 0 for LSF, which doesn't share scale factors)
         granule_one:
         - part2_3_length
         - big_values
@@ -140,8 +146,11 @@ class SideInfo(object):
         - window_switching_flag
         - block_type
         side_info for gr2 (granule 2)
+        granules - a list of the two Granules, or the one granule of an MPEG 2/2.5 frame
     """
 
+    __slots__ = ('main_data_begin', 'private_bits', 'scfsi_band', 'granules')
+
     def __init__(self, header: MP3Header, raw_bytes):
         """
         __init__ : read the given mp3_file and parse the side information
@@ -152,35 +161,43 @@ class SideInfo(object):
         channels = 1
         if header.channel != ChannelEncodings.MONO:
             channels = 2
-        bits = Bits()
-        for i in raw_bytes:
-            bits.add_bits(i)
-        self._bitstring = bits
-        # each entry into the two granules object will be an array with each index
-        # corresponding to the channel - 1
-        self.granules = {
-            0 : defaultdict(list),
-            1 : defaultdict(list),
-        }
-        self.main_data_begin = self._bitstring.read_bits_as_int(9)
+        bits = BitReader(raw_bytes)
+        if header.lsf:
+            self._read_lsf(header, bits, channels)
+            return
+        self.main_data_begin = bits.read_bits_as_int(9)
         if header.channel == ChannelEncodings.MONO:
-            self.private_bits = self._bitstring.read_bits_as_int(5)
+            self.private_bits = bits.read_bits_as_int(5)
         else:
-            self.private_bits = self._bitstring.read_bits_as_int(3)
+            self.private_bits = bits.read_bits_as_int(3)
         self.scfsi_band = [0] * channels
         for i in range(0, channels):
             self.scfsi_band[i] = [0] * 4
             for j in range(0, 4):
-                self.scfsi_band[i][j] = self._bitstring.read_bits_as_int(1)
-        for i in range(0, 2):
-            self.granules[i] = Granule(i, self._bitstring)
+                self.scfsi_band[i][j] = bits.read_bits_as_int(1)
+        self.granules = [Granule(i, bits, channels) for i in range(0, 2)]
+
+    def _read_lsf(self, header: MP3Header, bits: BitReader, channels: int):
+        """
+        _read_lsf : the MPEG 2/2.5 side info: one granule and no scfsi. preflag isn't sent,
+        it's on when scalefac_compress is 500 or more (outside intensity stereo)
+        """
+        self.main_data_begin = bits.read_bits_as_int(8)
+        self.private_bits = bits.read_bits_as_int(1 if channels == 1 else 2)
+        self.scfsi_band = [[0] * 4 for _ in range(0, channels)]
+        self.granules = [Granule(0, bits, channels, lsf=True)]
+        intensity = (header.channel == ChannelEncodings.JOINT_STEREO
+                     and header.mode_extention[1] == '1')
+        for channel in self.granules[0].channels:
+            if channel.scalefac_compress >= 500 and not (intensity and channel.index == 1):
+                channel.preflag = 1
 
     def __str__(self):
         """
         __str__ : string representation of each thing
         """
         return json.dumps({
-            'granules' : [str(self.granules[g]) for g in self.granules],
+            'granules' : [str(g) for g in self.granules],
             'main_data_begin' : self.main_data_begin,
             'private_bits' : self.private_bits,
             'scfsi_band' : self.scfsi_band,
@@ -0,0 +1,128 @@
+"""
+stream.py : decode MP3 data as it arrives, for sockets and HTTP bodies instead of files
+"""
+
+import asyncio
+
+from .incremental import IncrementalDecoder
+from .reservoir import BitReservoir
+
+class AsyncMP3Decoder(object):
+    """
+    AsyncMP3Decoder : take MP3 data in chunks and hand out each frame (or its PCM) as soon
+    as the frame and the reservoir data it needs have arrived
+
+    data comes in through feed() or read_from() an asyncio.StreamReader. at most
+    max_buffer bytes wait to be decoded: feed() blocks until the consumer catches up, so a
+    fast sender can't make the buffer grow without bound
+
+        decoder = AsyncMP3Decoder()
+        asyncio.ensure_future(decoder.read_from(reader))
+        async for pcm in decoder:
+            ...
+
+    decoding is CPU bound: with an executor, it runs there instead of in the event loop. only
+    syncing, the side info and the reservoir stay in the loop: the main data (huffman
+    decoding and scale factors) is parsed in the same executor call as the synthesis.
+    crc is a CRC policy for protected frames, as for MP3File
+    """
+
+    def __init__(self, max_buffer=64 * 1024, executor=None, crc=None):
+        # always room for a couple of whole frames
+        self.max_buffer = max(max_buffer, 4 * BitReservoir.max_frame_size)
+        self.executor = executor
+        # the same sync, reservoir and decoding core MP3File reads through
+        self.incremental = IncrementalDecoder(skip_id3v2=True, crc=crc, parse_main_data=False)
+        self.scanner = self.incremental.scanner
+        self.reservoir = self.incremental.reservoir
+        self.decoder = self.incremental.decoder
+        self.crc = self.incremental.crc
+        self._eof = False
+        self._data_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
+
+    def buffered(self) -> int:
+        """
+        buffered : bytes fed but not yet made into frames
+        """
+        return self.incremental.buffered()
+
+    async def feed(self, data: bytes):
+        """
+        feed : add the next chunk of the stream, waiting first while the buffer is full
+        """
+        while self.buffered() >= self.max_buffer:
+            self._space_ready.clear()
+            await self._space_ready.wait()
+        # chunks are decoded in place, so hold on to an unchanging copy
+        self.incremental.feed(data if isinstance(data, bytes) else bytes(data))
+        self._data_ready.set()
+
+    def feed_eof(self):
+        """
+        feed_eof : there's no more data. frames left in the buffer can still be read
+        """
+        self.incremental.feed_eof()
+        self._eof = True
+        self._data_ready.set()
+
+    async def read_from(self, reader: asyncio.StreamReader, chunk_size=16 * 1024):
+        """
+        read_from : feed everything from a stream reader, then feed_eof
+        """
+        try:
+            while True:
+                data = await reader.read(chunk_size)
+                if not data:
+                    break
+                await self.feed(data)
+        finally:
+            self.feed_eof()
+
+    async def frames(self):
+        """
+        frames : generate the frames of the stream as they become complete
+        """
+        loop = asyncio.get_running_loop()
+        async for frame in self._unparsed_frames():
+            if self.executor is None:
+                yield frame.parse_main_data()
+            else:
+                yield await loop.run_in_executor(self.executor, frame.parse_main_data)
+
+    async def _unparsed_frames(self):
+        """
+        _unparsed_frames : generate the frames as they become complete, their main data not
+        parsed yet
+        """
+        while True:
+            frame = self.incremental.next_frame()
+            self._space_ready.set()
+            if frame is not None:
+                yield frame
+                continue
+            if self._eof:
+                return
+            self._data_ready.clear()
+            await self._data_ready.wait()
+
+    def __aiter__(self):
+        return self._pcm_blocks()
+
+    async def _pcm_blocks(self):
+        """
+        _pcm_blocks : generate each frame's PCM: a list with one array('d') per channel
+        """
+        loop = asyncio.get_running_loop()
+        async for frame in self._unparsed_frames():
+            if self.executor is None:
+                yield self._decode(frame)
+            else:
+                # frames go to the executor one at a time, so the decoder state stays in order
+                yield await loop.run_in_executor(self.executor, self._decode, frame)
+
+    def _decode(self, frame) -> list:
+        """
+        _decode : parse a frame's main data and decode it to PCM
+        """
+        return self.decoder.decode(frame.parse_main_data())
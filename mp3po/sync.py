@@ -0,0 +1,128 @@
+"""
+sync.py : find frames in a byte stream
+
+any 0xFFE pattern looks like a frame sync, and album art, tags and corrupt data are full of
+them. a header only counts as the start of the stream if it's valid and another header
+with the same fixed fields sits exactly frame_size bytes later. once locked on, frames that
+follow each other back to back are taken as they come
+"""
+
+from .header import MP3Header, InvalidFieldEncodingException
+
+# the fields that stay the same from frame to frame: sync word, version, layer, frequency
+STREAM_MASK = 0xFFFE0C00
+# the same plus the bitrate bits, to find the next free format frame
+FREE_FORMAT_MASK = 0xFFFEFC00
+# free format frames can be up to 640kbps: 2880 bytes at 32kHz for layer III
+MAX_FREE_FORMAT_SIZE = 2880
+
+def is_valid_header_word(word: int) -> bool:
+    """
+    is_valid_header_word : check the sync word and reject the reserved version, layer,
+    bitrate and frequency codes, without building a header. only layer III passes
+    """
+    return ((word & 0xFFE00000) == 0xFFE00000
+            and (word & 0x00180000) != 0x00080000
+            and (word & 0x00060000) == 0x00020000
+            and (word & 0x0000F000) != 0x0000F000
+            and (word & 0x00000C00) != 0x00000C00)
+
+class FrameScanner(object):
+    """
+    FrameScanner : hop from frame to frame in a buffer, checking each header, and
+    resynchronize when the stream is corrupt. a frame found anywhere other than where the
+    scan started, or that doesn't match the stream locked on to, has to be confirmed by
+    the header after it
+
+    Attributes :
+    - locked : the STREAM_MASK bits of the stream's headers, or None before the first
+               frame and after losing sync
+    - resyncs : how many times sync was lost after being found
+    - skipped : how many bytes were skipped looking for frames
+    """
+
+    def __init__(self):
+        self.locked = None
+        self.resyncs = 0
+        self.skipped = 0
+
+    def next_frame(self, data, position: int, end: int, final=True):
+        """
+        next_frame : find the next frame that starts at or after data[position] and ends by
+        data[end]. returns (position, header). when there's no complete frame, header is None
+        and position is where to pick up once there's more data after data[end]. with final,
+        data[end] is the end of the stream, so a stream that ends after a single frame or
+        partway through a frame doesn't leave the scanner waiting for more
+        """
+        find = data.find
+        start = position
+        while True:
+            if position + 4 > end:
+                break
+            if data[position] != 0xFF:
+                position = find(b'\xff', position, end)
+                if position < 0 or position + 4 > end:
+                    position = end if position < 0 else position
+                    break
+            word = int.from_bytes(data[position:position + 4], 'big')
+            if not is_valid_header_word(word):
+                position += 1
+                continue
+            frame_size = None
+            if word & 0xF000 == 0:
+                frame_size = self._free_format_size(data, position, end, word, final)
+                if frame_size is None:
+                    break
+                if frame_size < 0:
+                    position += 1
+                    continue
+            try:
+                header = MP3Header.from_int(word, frame_size)
+            except InvalidFieldEncodingException:
+                position += 1
+                continue
+            next_frame = position + header.frame_size
+            if next_frame > end:
+                if not final:
+                    break
+                # the stream ends partway through this frame, if it is one
+                position += 1
+                continue
+            if position != start or self.locked != word & STREAM_MASK:
+                # not where the last frame said the next one would be, or a header that
+                # doesn't match the stream: believe it if the next frame agrees with it
+                if next_frame + 4 <= end:
+                    following = int.from_bytes(data[next_frame:next_frame + 4], 'big')
+                    if (not is_valid_header_word(following)
+                            or following & STREAM_MASK != word & STREAM_MASK):
+                        position += 1
+                        continue
+                elif not final:
+                    break
+                if self.locked is not None:
+                    self.resyncs += 1
+                self.locked = word & STREAM_MASK
+            self.skipped += position - start
+            return position, header
+        self.skipped += position - start
+        return position, None
+
+    @staticmethod
+    def _free_format_size(data, position: int, end: int, word: int, final: bool):
+        """
+        _free_format_size : the size of a free format frame is how far it is to the next
+        header with the same fields. None if that's past data[end], -1 if there isn't one
+        """
+        find = data.find
+        limit = min(end - 3, position + MAX_FREE_FORMAT_SIZE + 1)
+        wanted = word & FREE_FORMAT_MASK
+        candidate = find(b'\xff', position + 4, limit)
+        while candidate >= 0:
+            following = int.from_bytes(data[candidate:candidate + 4], 'big')
+            if following & FREE_FORMAT_MASK == wanted:
+                return candidate - position
+            candidate = find(b'\xff', candidate + 1, limit)
+        if limit < position + MAX_FREE_FORMAT_SIZE + 1:
+            # ran into the end of the data
+            return end - position if final and end > position + 4 else None
+        return -1
@@ -0,0 +1,301 @@
+"""
+synthesis.py : the hybrid filterbank (IMDCT + overlap-add) and the polyphase synthesis
+filterbank that turn frequency lines into PCM
+
+see ISO/IEC 11172-3 2.4.3.4.10 and annex A.2 (the synthesis window)
+"""
+
+import math
+from itertools import chain, repeat
+from operator import add, mul, neg, sub
+
+# the synthesis window D[0:257] in units of 2**-16. the rest of the window is
+# D[512 - i] = -D[i], except for i a multiple of 64 where D[512 - i] = D[i]
+_SYNTH_WINDOW_HALF = [
+    0, -1, -1, -1, -1, -1, -1, -2, -2, -2, -2, -3, -3, -4, -4, -5,
+    -5, -6, -7, -7, -8, -9, -10, -11, -13, -14, -16, -17, -19, -21, -24, -26,
+    -29, -31, -35, -38, -41, -45, -49, -53, -58, -63, -68, -73, -79, -85, -91, -97,
+    -104, -111, -117, -125, -132, -139, -147, -154, -161, -169, -176, -183, -190, -196, -202, -208,
+    213, 218, 222, 225, 227, 228, 228, 227, 224, 221, 215, 208, 200, 189, 177, 163,
+    146, 127, 106, 83, 57, 29, -2, -36, -72, -111, -153, -197, -244, -294, -347, -401,
+    -459, -519, -581, -645, -711, -779, -848, -919, -991, -1064, -1137, -1210, -1283, -1356, -1428, -1498,
+    -1567, -1634, -1698, -1759, -1817, -1870, -1919, -1962, -2001, -2032, -2057, -2075, -2085, -2087, -2080, -2063,
+    2037, 2000, 1952, 1893, 1822, 1739, 1644, 1535, 1414, 1280, 1131, 970, 794, 605, 402, 185,
+    -45, -288, -545, -814, -1095, -1388, -1692, -2006, -2330, -2663, -3004, -3351, -3705, -4063, -4425, -4788,
+    -5153, -5517, -5879, -6237, -6589, -6935, -7271, -7597, -7910, -8209, -8491, -8755, -8998, -9219, -9416, -9585,
+    -9727, -9838, -9916, -9959, -9966, -9935, -9863, -9750, -9592, -9389, -9139, -8840, -8492, -8092, -7640, -7134,
+    6574, 5959, 5288, 4561, 3776, 2935, 2037, 1082, 70, -998, -2122, -3300, -4533, -5818, -7154, -8540,
+    -9975, -11455, -12980, -14548, -16155, -17799, -19478, -21189, -22929, -24694, -26482, -28289, -30112, -31947, -33791, -35640,
+    -37489, -39336, -41176, -43006, -44821, -46617, -48390, -50137, -51853, -53534, -55178, -56778, -58333, -59838, -61289, -62684,
+    -64019, -65290, -66494, -67629, -68692, -69679, -70590, -71420, -72169, -72835, -73415, -73908, -74313, -74630, -74856, -74992,
+    75038,
+]
+
+def _build_synth_window():
+    window = [0.0] * 512
+    for i, value in enumerate(_SYNTH_WINDOW_HALF):
+        window[i] = value / 65536.0
+        if i != 0:
+            window[512 - i] = window[i] if i % 64 == 0 else -window[i]
+    return window
+
+SYNTH_WINDOW = _build_synth_window()
+
+# the window's 16 slices of 32 coefficients in reverse order, to go with U vectors laid out
+# oldest V first
+_SYNTH_WINDOW_REVERSED = [c for i in range(15, -1, -1) for c in SYNTH_WINDOW[32 * i:32 * i + 32]]
+
+# N[i][k] : the polyphase matrixing coefficients
+SYNTH_MATRIX = [[math.cos((16 + i) * (2 * k + 1) * math.pi / 64) for k in range(0, 32)]
+                for i in range(0, 64)]
+
+def _build_imdct_windows():
+    """
+    _build_imdct_windows : the 36-point windows for block types 0, 1 and 3.
+    block type 2 (short blocks) uses the 12-point window in IMDCT_SHORT_WINDOW
+    """
+    normal = [math.sin(math.pi / 36 * (i + 0.5)) for i in range(0, 36)]
+    start = (normal[0:18] + [1.0] * 6 +
+             [math.sin(math.pi / 12 * (i - 18 + 0.5)) for i in range(24, 30)] + [0.0] * 6)
+    stop = start[::-1]
+    return {0 : normal, 1 : start, 3 : stop}
+
+IMDCT_WINDOWS = _build_imdct_windows()
+IMDCT_SHORT_WINDOW = [math.sin(math.pi / 12 * (i + 0.5)) for i in range(0, 12)]
+
+# IMDCT matrices: x[i] = sum(X[k] * cos(pi / 2n * (2i + 1 + n / 2) * (2k + 1)))
+IMDCT_LONG_MATRIX = [[math.cos(math.pi / 72 * (2 * i + 19) * (2 * k + 1)) for k in range(0, 18)]
+                     for i in range(0, 36)]
+IMDCT_SHORT_MATRIX = [[math.cos(math.pi / 24 * (2 * i + 7) * (2 * k + 1)) for k in range(0, 6)]
+                      for i in range(0, 12)]
+
+def imdct36(lines) -> list:
+    """
+    imdct36 : 36-point IMDCT of 18 frequency lines
+    """
+    return [sum(map(mul, row, lines)) for row in IMDCT_LONG_MATRIX]
+
+def imdct12(lines) -> list:
+    """
+    imdct12 : 12-point IMDCT of 6 frequency lines
+    """
+    return [sum(map(mul, row, lines)) for row in IMDCT_SHORT_MATRIX]
+
+def polyphase_matrix(subband_samples) -> list:
+    """
+    polyphase_matrix : V[i] = sum(N[i][k] * S[k]), the 64 x 32 polyphase matrixing
+    """
+    return [sum(map(mul, row, subband_samples)) for row in SYNTH_MATRIX]
+
+# fast transforms. the reference functions above are the plain matrix products they replace
+
+# DCT-II and DCT-IV kernels for the two 9-point halves of the 18-point DCT-IV
+_DCT2_9 = [[math.cos(math.pi * (2 * n + 1) * k / 18) for n in range(0, 9)] for k in range(0, 9)]
+_DCT4_9 = [[math.cos(math.pi * (2 * n + 1) * (2 * k + 1) / 36) for n in range(0, 9)]
+           for k in range(0, 9)]
+_DCT4_18_TWIDDLE = [2 * math.cos(math.pi * (2 * n + 1) / 72) for n in range(0, 18)]
+_DCT4_6 = [[math.cos(math.pi * (2 * n + 1) * (2 * k + 1) / 24) for n in range(0, 6)]
+           for k in range(0, 6)]
+
+def dct4_18(lines) -> list:
+    """
+    dct4_18 : 18-point DCT-IV, y[k] = sum(x[n] * cos(pi / 18 * (n + 0.5) * (k + 0.5)))
+    the input is twiddled into an 18-point DCT-II, which splits into a 9-point DCT-II of
+    the mirrored sums and a 9-point DCT-IV of the mirrored differences. the DCT-II
+    outputs v give the DCT-IV as y[0] = v[0] / 2, y[k] = v[k] - y[k - 1]
+    """
+    twiddled = list(map(mul, lines, _DCT4_18_TWIDDLE))
+    mirrored = twiddled[17:8:-1]
+    sums = list(map(add, twiddled[0:9], mirrored))
+    differences = list(map(sub, twiddled[0:9], mirrored))
+    dct2 = [0.0] * 18
+    dct2[0::2] = [sum(map(mul, row, sums)) for row in _DCT2_9]
+    dct2[1::2] = [sum(map(mul, row, differences)) for row in _DCT4_9]
+    out = [0.0] * 18
+    previous = 0.5 * dct2[0]
+    out[0] = previous
+    for k in range(1, 18):
+        previous = dct2[k] - previous
+        out[k] = previous
+    return out
+
+def fast_imdct36(lines) -> list:
+    """
+    fast_imdct36 : 36-point IMDCT through an 18-point DCT-IV. the IMDCT output is the
+    DCT-IV output y extended by its symmetries: y[35 - j] = -y[j] and y[j + 36] = -y[j]
+    """
+    y = dct4_18(lines)
+    return y[9:18] + [-v for v in y[::-1]] + [-v for v in y[0:9]]
+
+def fast_imdct12(lines) -> list:
+    """
+    fast_imdct12 : 12-point IMDCT through a 6-point DCT-IV, extended the same way as fast_imdct36
+    """
+    y = [sum(map(mul, row, lines)) for row in _DCT4_6]
+    return y[3:6] + [-v for v in y[::-1]] + [-v for v in y[0:3]]
+
+# 1 / (2 * cos(pi * (2i + 1) / 2n)) for each stage of the fast DCT-II
+_LEE_COEFFICIENTS = {n : [0.5 / math.cos(math.pi * (2 * i + 1) / (2 * n)) for i in range(0, n // 2)]
+                     for n in (2, 4, 8, 16, 32)}
+
+def fast_dct2(samples) -> list:
+    """
+    fast_dct2 : unnormalized DCT-II, X[k] = sum(x[n] * cos(pi * (2n + 1) * k / 2N)), for N a
+    power of two, using Lee's recursive split into a DCT-II of the mirrored sums (even outputs)
+    and a DCT-II of the scaled mirrored differences (odd outputs, as B[k] + B[k + 1])
+    """
+    size = len(samples)
+    if size == 2:
+        return [samples[0] + samples[1], (samples[0] - samples[1]) * _LEE_COEFFICIENTS[2][0]]
+    half = size // 2
+    mirrored = samples[:half - 1:-1]
+    even = fast_dct2(list(map(add, samples[0:half], mirrored)))
+    odd = fast_dct2(list(map(mul, map(sub, samples[0:half], mirrored), _LEE_COEFFICIENTS[size])))
+    out = [0.0] * size
+    out[0::2] = even
+    out[1:size - 1:2] = map(add, odd[:-1], odd[1:])
+    out[size - 1] = odd[-1]
+    return out
+
+def fast_dct2_columns(columns) -> list:
+    """
+    fast_dct2_columns : fast_dct2 of many inputs at once. columns[n] holds sample n of every
+    input, and each add, subtract or scale of Lee's split is one map() over all of them
+    """
+    size = len(columns)
+    if size == 2:
+        first, second = columns
+        return [list(map(add, first, second)),
+                list(map(mul, map(sub, first, second), repeat(_LEE_COEFFICIENTS[2][0])))]
+    half = size // 2
+    mirrored = columns[:half - 1:-1]
+    even = fast_dct2_columns([list(map(add, a, b)) for a, b in zip(columns[0:half], mirrored)])
+    odd = fast_dct2_columns([list(map(mul, map(sub, a, b), repeat(c)))
+                             for a, b, c in zip(columns[0:half], mirrored,
+                                                _LEE_COEFFICIENTS[size])])
+    out = [None] * size
+    out[0::2] = even
+    out[1:size - 1:2] = [list(map(add, a, b)) for a, b in zip(odd[:-1], odd[1:])]
+    out[size - 1] = odd[-1]
+    return out
+
+def polyphase_matrices(samples) -> list:
+    """
+    polyphase_matrices : the V vectors of the 18 time slots of a granule of subband samples
+    ordered [subband][time], through polyphase_matrix
+    """
+    return [polyphase_matrix(samples[slot::18]) for slot in range(0, 18)]
+
+def fast_polyphase_matrices(samples) -> list:
+    """
+    fast_polyphase_matrices : the same as polyphase_matrices, through fast_polyphase_matrix
+    done for all 18 time slots at once: a subband's 18 samples are one column of
+    fast_dct2_columns
+    """
+    x = fast_dct2_columns([samples[start:start + 18] for start in range(0, 576, 18)])
+    return [slot[16:32] + (0.0,) + tuple(map(neg, slot[31:0:-1])) + tuple(map(neg, slot[0:16]))
+            for slot in zip(*x)]
+
+def fast_polyphase_matrix(subband_samples) -> list:
+    """
+    fast_polyphase_matrix : the polyphase matrixing through a 32-point DCT-II X, using
+    V[i] = X[i + 16] for i < 16, V[16] = 0, V[i] = -X[80 - i] for 16 < i < 48 and
+    V[i] = -X[i - 48] for i >= 48
+    """
+    x = fast_dct2(subband_samples)
+    return x[16:32] + [0.0] + [-v for v in x[31:0:-1]] + [-v for v in x[0:16]]
+
+_ZEROS_18 = [0.0] * 18
+
+class ChannelSynthesis(object):
+    """
+    ChannelSynthesis : the filterbank state for one channel
+
+    Attributes:
+        overlap: the second half of the last IMDCT output for each subband, 32 lists of 18
+        v_blocks: the last 16 V vectors of the polyphase filterbank, newest first
+
+    with reference set, the IMDCT and polyphase matrixing are plain matrix products
+    instead of the fast factorized transforms
+    """
+
+    def __init__(self, reference=False):
+        self.overlap = [[0.0] * 18 for _ in range(0, 32)]
+        self.v_blocks = [[0.0] * 64 for _ in range(0, 16)]
+        if reference:
+            self._imdct36 = imdct36
+            self._imdct12 = imdct12
+            self._polyphase_matrices = polyphase_matrices
+        else:
+            self._imdct36 = fast_imdct36
+            self._imdct12 = fast_imdct12
+            self._polyphase_matrices = fast_polyphase_matrices
+
+    def hybrid(self, lines, block_type: int, mixed_block_flag: int, nonzero=576) -> list:
+        """
+        hybrid : run the IMDCT on each subband of a granule, window it and overlap-add it
+        with the previous granule. returns 576 time samples ordered [subband][time]
+        the first two subbands of a mixed block are long blocks
+        lines from nonzero up must be zero: the IMDCT is skipped for subbands that are
+        entirely above it and only the overlap from the previous granule is output
+        """
+        samples = [0.0] * 576
+        overlap = self.overlap
+        imdct36_function = self._imdct36
+        imdct12_function = self._imdct12
+        for subband in range(0, 32):
+            start = 18 * subband
+            if start >= nonzero:
+                samples[start:start + 18] = overlap[subband]
+                overlap[subband] = _ZEROS_18
+                continue
+            sub_block_type = block_type
+            if mixed_block_flag and subband < 2:
+                sub_block_type = 0
+            if sub_block_type == 2:
+                raw = [0.0] * 36
+                for window in range(0, 3):
+                    short = imdct12_function(lines[start + window:start + 18:3])
+                    offset = 6 + 6 * window
+                    raw[offset:offset + 12] = map(add, raw[offset:offset + 12],
+                                                  map(mul, short, IMDCT_SHORT_WINDOW))
+            else:
+                raw = list(map(mul, imdct36_function(lines[start:start + 18]),
+                               IMDCT_WINDOWS[sub_block_type]))
+            samples[start:start + 18] = map(add, raw[0:18], overlap[subband])
+            overlap[subband] = raw[18:36]
+        return samples
+
+    @staticmethod
+    def frequency_inversion(samples):
+        """
+        frequency_inversion : negate every odd time sample of every odd subband, in place
+        """
+        for subband in range(1, 32, 2):
+            start = 18 * subband
+            samples[start + 1:start + 18:2] = list(map(neg, samples[start + 1:start + 18:2]))
+
+    def polyphase(self, samples) -> list:
+        """
+        polyphase : run the 32-band synthesis filterbank over 18 time slots of subband samples
+        ordered [subband][time], returning 576 PCM samples. the matrixing is done for all 18
+        slots at once, and each slot's windowing is one map() over its U vector
+        """
+        # the 15 V vectors before this granule and its 18, oldest first
+        v_vectors = self.v_blocks[14::-1] + self._polyphase_matrices(samples)
+        self.v_blocks = v_vectors[:-17:-1]
+        # U is made of the first half of the newest V vector, the second half of the one
+        # before, and so on. laid out oldest first, the halves alternate the same way for
+        # every slot of the same parity (a granule has an even number of slots), so each U
+        # is one slice of one of these
+        halves = [(v[0:32], v[32:64]) for v in v_vectors]
+        even_u = list(chain.from_iterable(h[(i + 1) % 2] for i, h in enumerate(halves)))
+        odd_u = list(chain.from_iterable(h[i % 2] for i, h in enumerate(halves)))
+        pcm = []
+        for slot in range(0, 18):
+            u = (odd_u if slot % 2 else even_u)[32 * slot:32 * slot + 512]
+            products = list(zip(*[iter(map(mul, u, _SYNTH_WINDOW_REVERSED))] * 32))
+            # sum newest V first
+            products.reverse()
+            pcm.extend(map(sum, zip(*products)))
+        return pcm
@@ -0,0 +1,256 @@
+"""
+tags.py : find and read ID3v2, ID3v1 and APEv2 tags
+
+ID3v2 tags come before the audio, ID3v1 and APEv2 tags after it. finding them only takes
+their fixed size headers and footers, so the audio can be located without reading the tags
+"""
+
+ID3V2_HEADER_SIZE = 10
+ID3V1_SIZE = 128
+APE_FOOTER_SIZE = 32
+
+ID3V1_GENRES_COUNT = 192
+
+# names for the usual text fields in each kind of tag
+COMMON_FIELDS = {
+    'title' : ('TIT2', 'TT2', 'Title'),
+    'artist' : ('TPE1', 'TP1', 'Artist'),
+    'album' : ('TALB', 'TAL', 'Album'),
+    'year' : ('TDRC', 'TYER', 'TYE', 'Year'),
+    'track' : ('TRCK', 'TRK', 'Track'),
+    'genre' : ('TCON', 'TCO', 'Genre'),
+    'comment' : ('COMM', 'COM', 'Comment'),
+}
+
+# ID3v2 text encodings by their encoding byte
+ID3V2_ENCODINGS = ['latin-1', 'utf-16', 'utf-16-be', 'utf-8']
+
+def synchsafe(raw_bytes) -> int:
+    """
+    synchsafe : decode an ID3v2 synchsafe integer: 7 bits per byte, so it never has a sync
+    """
+    value = 0
+    for byte in raw_bytes:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+def id3v2_size(raw_bytes) -> int:
+    """
+    id3v2_size : size of the ID3v2 tag starting raw_bytes (at least ID3V2_HEADER_SIZE bytes),
+    including its header and footer, or 0 if it doesn't start with one
+    """
+    if len(raw_bytes) < ID3V2_HEADER_SIZE or bytes(raw_bytes[0:3]) != b'ID3':
+        return 0
+    major, flags = raw_bytes[3], raw_bytes[5]
+    if major == 0xFF or raw_bytes[4] == 0xFF or any(b & 0x80 for b in raw_bytes[6:10]):
+        return 0
+    size = ID3V2_HEADER_SIZE + synchsafe(raw_bytes[6:10])
+    if flags & 0x10:
+        # footer present
+        size += ID3V2_HEADER_SIZE
+    return size
+
+def skip_id3v2(audio) -> int:
+    """
+    skip_id3v2 : offset of the first byte after any ID3v2 tags at the current position of
+    the open file, which is left there. one read and one seek per tag
+    """
+    position = audio.tell()
+    while True:
+        size = id3v2_size(audio.read(ID3V2_HEADER_SIZE))
+        if not size:
+            audio.seek(position)
+            return position
+        position += size
+        audio.seek(position)
+
+def trailing_tags(audio, end: int) -> dict:
+    """
+    trailing_tags : look for an ID3v1 tag and an APEv2 tag (either side of the ID3v1 tag)
+    ending at end in the open file. returns {'id3v1' : offset, 'ape' : (offset, size)} with
+    the tags found, and 'audio_end' : where the audio stops
+    """
+    found = {}
+    # an APEv2 tag at the very end, after the ID3v1 tag if there is one
+    ape = _ape_tag_before(audio, end)
+    if ape is not None:
+        found['ape'] = ape
+        end = ape[0]
+    if end >= ID3V1_SIZE:
+        audio.seek(end - ID3V1_SIZE)
+        if audio.read(3) == b'TAG':
+            found['id3v1'] = end - ID3V1_SIZE
+            end -= ID3V1_SIZE
+    if ape is None:
+        # or the usual place, before the ID3v1 tag
+        ape = _ape_tag_before(audio, end)
+        if ape is not None:
+            found['ape'] = ape
+            end = ape[0]
+    found['audio_end'] = end
+    return found
+
+def _ape_tag_before(audio, end: int):
+    """
+    _ape_tag_before : (offset, size) of an APEv2 tag ending at end in the open file, or None
+    """
+    if end < APE_FOOTER_SIZE:
+        return None
+    audio.seek(end - APE_FOOTER_SIZE)
+    footer = audio.read(APE_FOOTER_SIZE)
+    if footer[0:8] != b'APETAGEX':
+        return None
+    size = int.from_bytes(footer[12:16], 'little')
+    flags = int.from_bytes(footer[20:24], 'little')
+    if flags & 0x80000000:
+        # header present, on top of the size
+        size += APE_FOOTER_SIZE
+    if not APE_FOOTER_SIZE <= size <= end:
+        return None
+    return (end - size, size)
+
+class Tags(object):
+    """
+    Tags : the contents of a file's tags. only read when asked for
+
+    Attributes :
+    - id3v2 : {frame id : [frame bodies]}
+    - id3v1 : {field : value} of the ID3v1 fields
+    - ape : {key : value} of the APEv2 items
+    """
+
+    def __init__(self, id3v2=None, id3v1=None, ape=None):
+        self.id3v2 = id3v2 or {}
+        self.id3v1 = id3v1 or {}
+        self.ape = ape or {}
+
+    def get(self, name: str):
+        """
+        get : a common field ('title', 'artist', 'album', 'year', 'track', 'genre',
+        'comment') from whichever tag has it, ID3v2 first, or None
+        """
+        for key in COMMON_FIELDS.get(name, (name,)):
+            if key in self.id3v2:
+                return id3v2_text(key, self.id3v2[key][0])
+            if key in self.ape:
+                return self.ape[key]
+        return self.id3v1.get(name)
+
+    def __getitem__(self, name):
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+def id3v2_text(frame_id: str, body) -> str:
+    """
+    id3v2_text : the text in the body of a text (T***) or comment (COMM) frame
+    """
+    if not body:
+        return ''
+    encoding = ID3V2_ENCODINGS[body[0]] if body[0] < 4 else 'latin-1'
+    text = bytes(body[1:])
+    if frame_id in ('COMM', 'COM'):
+        # language, then a description and the comment, separated by a null
+        text = text[3:]
+        separator = b'\x00\x00' if encoding in ('utf-16', 'utf-16-be') else b'\x00'
+        split = _find_terminator(text, separator)
+        text = text[split + len(separator):] if split >= 0 else text
+    return text.decode(encoding, errors='replace').rstrip('\x00')
+
+def _find_terminator(text: bytes, separator: bytes) -> int:
+    """
+    _find_terminator : offset of the separator in text, aligned to its width
+    """
+    position = text.find(separator)
+    while position >= 0 and position % len(separator):
+        position = text.find(separator, position + 1)
+    return position
+
+def parse_id3v2(raw_bytes) -> dict:
+    """
+    parse_id3v2 : the frames of a whole ID3v2.2, 2.3 or 2.4 tag, as {frame id : [bodies]}
+    """
+    major, flags = raw_bytes[3], raw_bytes[5]
+    size = synchsafe(raw_bytes[6:10])
+    body = bytes(raw_bytes[ID3V2_HEADER_SIZE:ID3V2_HEADER_SIZE + size])
+    if flags & 0x80 and major < 4:
+        # the whole tag is unsynchronized: 0xFF 0x00 stands for 0xFF
+        body = body.replace(b'\xff\x00', b'\xff')
+    position = 0
+    if flags & 0x40 and major >= 3:
+        # skip the extended header
+        extended = body[0:4]
+        position = synchsafe(extended) if major == 4 else int.from_bytes(extended, 'big') + 4
+    id_size, size_size, header_size = (3, 3, 6) if major == 2 else (4, 4, 10)
+    frames = {}
+    while position + header_size <= len(body):
+        frame_id = body[position:position + id_size]
+        if not frame_id.strip(b'\x00') or not frame_id.isalnum():
+            # padding
+            break
+        size_bytes = body[position + id_size:position + id_size + size_size]
+        frame_size = synchsafe(size_bytes) if major == 4 else int.from_bytes(size_bytes, 'big')
+        start = position + header_size
+        frame_body = body[start:start + frame_size]
+        if major == 4:
+            format_flags = body[position + 9]
+            # bytes added in front of the frame data: a group id, an encryption method and
+            # a 4 byte data length indicator, in that order
+            added = ((1 if format_flags & 0x40 else 0) + (1 if format_flags & 0x04 else 0)
+                     + (4 if format_flags & 0x01 else 0))
+            frame_body = frame_body[added:]
+            if format_flags & 0x02:
+                # unsynchronized frame
+                frame_body = frame_body.replace(b'\xff\x00', b'\xff')
+        frames.setdefault(frame_id.decode('ascii'), []).append(frame_body)
+        position = start + frame_size
+    return frames
+
+def parse_id3v1(raw_bytes) -> dict:
+    """
+    parse_id3v1 : the fields of a 128 byte ID3v1 or ID3v1.1 tag
+    """
+    def text(start, size):
+        return bytes(raw_bytes[start:start + size]).split(b'\x00')[0].decode(
+            'latin-1').rstrip()
+    fields = {
+        'title' : text(3, 30),
+        'artist' : text(33, 30),
+        'album' : text(63, 30),
+        'year' : text(93, 4),
+        'comment' : text(97, 30),
+        'genre' : str(raw_bytes[127]) if raw_bytes[127] < ID3V1_GENRES_COUNT else None,
+    }
+    if raw_bytes[125] == 0 and raw_bytes[126] != 0:
+        # ID3v1.1: the last byte of the comment is the track number
+        fields['comment'] = text(97, 28)
+        fields['track'] = str(raw_bytes[126])
+    return fields
+
+def parse_ape(raw_bytes) -> dict:
+    """
+    parse_ape : the items of a whole APEv2 tag (header, if any, items and footer)
+    text items are decoded, binary ones are left as bytes
+    """
+    footer = raw_bytes[len(raw_bytes) - APE_FOOTER_SIZE:]
+    count = int.from_bytes(footer[16:20], 'little')
+    flags = int.from_bytes(footer[20:24], 'little')
+    position = APE_FOOTER_SIZE if flags & 0x80000000 else 0
+    end = len(raw_bytes) - APE_FOOTER_SIZE
+    items = {}
+    for _ in range(0, count):
+        if position + 8 > end:
+            break
+        size = int.from_bytes(raw_bytes[position:position + 4], 'little')
+        item_flags = int.from_bytes(raw_bytes[position + 4:position + 8], 'little')
+        key_end = raw_bytes.find(b'\x00', position + 8, end)
+        if key_end < 0:
+            break
+        key = bytes(raw_bytes[position + 8:key_end]).decode('ascii', errors='replace')
+        value = bytes(raw_bytes[key_end + 1:key_end + 1 + size])
+        if item_flags & 0x6 == 0:
+            value = value.decode('utf-8', errors='replace')
+        items[key] = value
+        position = key_end + 1 + size
+    return items
@@ -0,0 +1,52 @@
+"""
+trace.py : opt-in instrumentation of the decoder
+
+with a hook set, every frame found reports what's in it as an event. with no hook set,
+which is the default, the decoder only checks hook against None once per frame
+"""
+
+import logging
+
+logger = logging.getLogger('mp3po')
+
+# called as hook(event, fields) for each event, or None when tracing is off. events:
+# - 'frame' : offset, frame_size, bitrate, main_data_begin, main_data_bytes (None when the
+#             reservoir couldn't supply them), and per granule and channel part2_3_length,
+#             big_values, block_type and table_select
+# - 'crc' : offset and policy, for a frame that failed its CRC check
+hook = None
+
+def set_hook(callback):
+    """
+    set_hook : send events to callback(event, fields), or stop tracing with None
+    """
+    global hook
+    hook = callback
+
+def log_events(level=logging.DEBUG, to_logger=None):
+    """
+    log_events : send events to a logger (the 'mp3po' logger by default) at the given level
+    """
+    to_logger = to_logger or logger
+    def log(event, fields):
+        if to_logger.isEnabledFor(level):
+            to_logger.log(level, '%s %r', event, fields)
+    set_hook(log)
+
+def frame_fields(offset: int, header, side_info, main_data_bytes) -> dict:
+    """
+    frame_fields : the fields of a 'frame' event
+    """
+    return {
+        'offset' : offset,
+        'frame_size' : header.frame_size,
+        'bitrate' : header.bitrate,
+        'main_data_begin' : side_info.main_data_begin,
+        'main_data_bytes' : main_data_bytes,
+        'granules' : [[{
+            'part2_3_length' : channel.part2_3_length,
+            'big_values' : channel.big_values,
+            'block_type' : channel.block_type,
+            'table_select' : list(channel.table_select),
+        } for channel in granule.channels] for granule in side_info.granules],
+    }
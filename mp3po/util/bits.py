@@ -16,7 +16,7 @@ class Bits(object):
         update the position in the object to the end of the string just read
         """
         if self._position >= len(self._bits):
-            raise Exception('no more bits to read!')
+            raise EndOfBitsException('no more bits to read!')
         result = self._bits[self._position:self._position+num_bits]
         self._position += num_bits
         return result
@@ -28,6 +28,12 @@ class Bits(object):
         """
         return int(self.read(num_bits), 2)
 
+    def read_bit(self) -> int:
+        """
+        read_bit : read a single bit and return it as 0 or 1
+        """
+        return int(self.read(1), 2)
+
     def seek(self, position):
         """
         seek : change the position from which we start reading the bitstring
@@ -54,3 +60,151 @@ class Bits(object):
         tell : return the current position in the bitstream buffer thing
         """
         return self._position
+
+class EndOfBitsException(Exception):
+    """
+    EndOfBitsException : raised when reading starts past the end of the bitstream
+    """
+    pass
+
+class BitReader(object):
+    """
+    utility for reading bits straight out of a bytes-like object
+
+    the position is an integer bit offset into the buffer. reads are served from a
+    64-bit cache word so that most calls are a shift and a mask instead of a slice.
+    bits past the end of the buffer read as zeros (handy for table lookups near the end),
+    but starting a read at or past the end raises EndOfBitsException
+    """
+    def __init__(self, data=b''):
+        self._data = memoryview(data).cast('B')
+        self._length = len(self._data) * 8
+        self._position = 0
+        # _cache holds the 64 bits starting at bit offset _cache_start
+        self._cache = 0
+        self._cache_start = 0
+        self._cache_end = 0
+
+    def __len__(self):
+        return self._length
+
+    def _fill(self, position):
+        """
+        _fill : load the cache word with the 8 bytes containing the given bit position
+        """
+        start = position >> 3
+        chunk = self._data[start:start+8]
+        self._cache = int.from_bytes(chunk, 'big') << (64 - 8 * len(chunk))
+        self._cache_start = start << 3
+        self._cache_end = self._cache_start + 64
+
+    def peek_bits_as_int(self, num_bits) -> int:
+        """
+        peek_bits_as_int : return the next num_bits as an unsigned integer
+        without updating the current position
+        """
+        end = self._position + num_bits
+        if end > self._cache_end or self._position < self._cache_start:
+            if num_bits > 57:
+                return self._peek_long(num_bits)
+            self._fill(self._position)
+        return (self._cache >> (self._cache_end - end)) & ((1 << num_bits) - 1)
+
+    def _peek_long(self, num_bits) -> int:
+        """
+        _peek_long : peek for reads too wide to fit in the cache word
+        """
+        start = self._position >> 3
+        stop = (self._position + num_bits + 7) >> 3
+        chunk = self._data[start:stop]
+        value = int.from_bytes(chunk, 'big') << (8 * (stop - start - len(chunk)))
+        value >>= (stop << 3) - self._position - num_bits
+        return value & ((1 << num_bits) - 1)
+
+    def read_bits_as_int(self, num_bits) -> int:
+        """
+        read_bits_as_int : read the number of bits requested and then return those in integer form
+        the bits are interpreted as an unsigned integer
+        """
+        if num_bits == 0:
+            return 0
+        if self._position >= self._length:
+            raise EndOfBitsException('no more bits to read!')
+        value = self.peek_bits_as_int(num_bits)
+        self._position += num_bits
+        return value
+
+    def read_ints(self, count: int, width: int, out, start: int):
+        """
+        read_ints : read count unsigned integers of width bits each into out[start:start+count]
+        in one go. with a width of 0 nothing is read and out is left as it is
+        """
+        if width == 0 or count == 0:
+            return
+        total = count * width
+        if self._position + total - width >= self._length:
+            # the last integer would start at or past the end
+            raise EndOfBitsException('no more bits to read!')
+        value = self.peek_bits_as_int(total)
+        self._position += total
+        mask = (1 << width) - 1
+        for i in range(start + count - 1, start - 1, -1):
+            out[i] = value & mask
+            value >>= width
+
+    def read_bit(self) -> int:
+        """
+        read_bit : read a single bit and return it as 0 or 1
+        """
+        position = self._position
+        if position >= self._length:
+            raise EndOfBitsException('no more bits to read!')
+        if position >= self._cache_end or position < self._cache_start:
+            self._fill(position)
+        self._position = position + 1
+        return (self._cache >> (self._cache_end - position - 1)) & 1
+
+    def read(self, num_bits) -> str:
+        """
+        read : return the number of bits starting at the current position as a bit string
+        update the position in the object to the end of the string just read
+        """
+        if self._position >= self._length:
+            raise EndOfBitsException('no more bits to read!')
+        num_bits = min(num_bits, self._length - self._position)
+        if num_bits == 0:
+            return ''
+        return format(self.read_bits_as_int(num_bits), '0{}b'.format(num_bits))
+
+    def peek(self, num: int) -> str:
+        """
+        peek : return num bits as a bit string without updating the current position
+        """
+        num = max(0, min(num, self._length - self._position))
+        if num == 0:
+            return ''
+        return format(self.peek_bits_as_int(num), '0{}b'.format(num))
+
+    def skip(self, num_bits):
+        """
+        skip : move the position forward without reading anything
+        """
+        self._position += num_bits
+
+    def seek(self, position):
+        """
+        seek : change the position from which we start reading the bitstream
+        """
+        self._position = position
+
+    def tell(self):
+        """
+        tell : return the current position in the bitstream buffer thing
+        """
+        return self._position
+
+    def bits_left(self):
+        """
+        bits_left : return the number of bits between the current position and the end
+        """
+        return self._length - self._position
@@ -0,0 +1,122 @@
+"""
+vbr.py : Xing/Info and VBRI tags
+
+encoders put these in the main data of an otherwise silent first frame, so players can
+know the length of a variable bitrate file and seek in it without reading every frame
+"""
+
+from .header import ChannelEncodings, MPEGVersionEncodings
+
+# Xing flags: which of the optional fields follow
+XING_FRAMES = 0x1
+XING_BYTES = 0x2
+XING_TOC = 0x4
+XING_QUALITY = 0x8
+
+# the Xing tag comes right after the side info, which depends on the version and channels
+XING_OFFSETS = {
+    MPEGVersionEncodings.MPEG_V1 : {True : 4 + 17, False : 4 + 32},
+    MPEGVersionEncodings.MPEG_V2 : {True : 4 + 9, False : 4 + 17},
+    MPEGVersionEncodings.MPEG_V2_5 : {True : 4 + 9, False : 4 + 17},
+}
+
+# the VBRI tag is always 32 bytes after the header
+VBRI_OFFSET = 4 + 32
+
+class VBRHeader(object):
+    """
+    VBRHeader : what a Xing, Info or VBRI tag says about the file
+
+    Attributes :
+    - kind : 'Xing', 'Info' (the same thing, written for constant bitrate files) or 'VBRI'
+    - frames : number of audio frames, not counting the tag's frame, or None
+    - bytes : size of the audio data in bytes, including the tag's frame, or None
+    - toc : Xing: 100 entries, entry i is the byte position of i% of the playing time in
+            256ths of bytes. VBRI: byte sizes of every frames_per_entry frames. None if absent
+    - quality : encoder quality, or None
+    - frames_per_entry : frames covered by one VBRI toc entry
+    """
+
+    def __init__(self, kind: str, frames=None, nbytes=None, toc=None, quality=None,
+                 frames_per_entry=0):
+        self.kind = kind
+        self.frames = frames
+        self.bytes = nbytes
+        self.toc = toc
+        self.quality = quality
+        self.frames_per_entry = frames_per_entry
+
+    def seek_offset(self, fraction: float) -> int:
+        """
+        seek_offset : estimate the byte offset from the start of the tag's frame of the
+        point fraction (0.0 to 1.0) of the way through the file. None if the tag has no
+        table of contents to go by
+        """
+        if not self.toc or not self.bytes:
+            return None
+        if self.kind == 'VBRI' and not (self.frames and self.frames_per_entry):
+            return None
+        fraction = min(max(fraction, 0.0), 1.0)
+        if self.kind == 'VBRI':
+            position = fraction * self.frames / self.frames_per_entry
+            entry = min(int(position), len(self.toc))
+            offset = sum(self.toc[0:entry])
+            if entry < len(self.toc):
+                offset += (position - entry) * self.toc[entry]
+            return int(offset)
+        percent = fraction * 100
+        entry = min(int(percent), 99)
+        start = self.toc[entry]
+        end = self.toc[entry + 1] if entry < 99 else 256
+        return int((start + (end - start) * (percent - entry)) * self.bytes / 256)
+
+def parse_vbr_header(header, frame) -> VBRHeader:
+    """
+    parse_vbr_header : look for a Xing/Info or VBRI tag in a whole frame (header included)
+    returns a VBRHeader, or None if there isn't one
+    """
+    mono = header.channel == ChannelEncodings.MONO
+    offset = XING_OFFSETS[header.mpeg_version][mono]
+    kind = bytes(frame[offset:offset + 4])
+    if kind in (b'Xing', b'Info'):
+        return _parse_xing(kind.decode('ascii'), frame, offset + 4)
+    if bytes(frame[VBRI_OFFSET:VBRI_OFFSET + 4]) == b'VBRI':
+        return _parse_vbri(frame, VBRI_OFFSET + 4)
+    return None
+
+def _parse_xing(kind: str, frame, position: int) -> VBRHeader:
+    """
+    _parse_xing : the fields after 'Xing' or 'Info'
+    """
+    flags = int.from_bytes(frame[position:position + 4], 'big')
+    position += 4
+    tag = VBRHeader(kind)
+    if flags & XING_FRAMES:
+        tag.frames = int.from_bytes(frame[position:position + 4], 'big')
+        position += 4
+    if flags & XING_BYTES:
+        tag.bytes = int.from_bytes(frame[position:position + 4], 'big')
+        position += 4
+    if flags & XING_TOC:
+        tag.toc = list(frame[position:position + 100])
+        position += 100
+    if flags & XING_QUALITY:
+        tag.quality = int.from_bytes(frame[position:position + 4], 'big')
+    return tag
+
+def _parse_vbri(frame, position: int) -> VBRHeader:
+    """
+    _parse_vbri : the fields after 'VBRI'. version, delay and quality are 2 bytes each,
+    then the byte and frame counts, then the table of contents
+    """
+    def field(start, size):
+        return int.from_bytes(frame[position + start:position + start + size], 'big')
+    quality = field(4, 2)
+    nbytes = field(6, 4)
+    frames = field(10, 4)
+    entries = field(14, 2)
+    scale = field(16, 2)
+    entry_size = field(18, 2)
+    frames_per_entry = field(20, 2)
+    toc = [field(22 + i * entry_size, entry_size) * scale for i in range(0, entries)]
+    return VBRHeader('VBRI', frames, nbytes, toc, quality, frames_per_entry)
@@ -0,0 +1,248 @@
+"""
+mp3_fixtures.py : build synthetic MP3 streams for the tests
+
+the frames have valid headers and side information and random main data. every bit
+sequence is a valid huffman code, so the frames decode to (noisy) audio
+"""
+
+import random
+
+# tables a random granule may pick from: everything but the empty tables 4 and 14
+BIG_VALUE_TABLES = [t for t in range(0, 32) if t not in (4, 14)]
+
+# the most bits MPEG 1 scale factors can take: 18 short bands of 4 bits and 18 of 3 bits
+MAX_PART2_LENGTH = 18 * 4 + 18 * 3
+# MPEG 2/2.5: 36 short scale factors of up to 5 bits (intensity stereo)
+MAX_LSF_PART2_LENGTH = 36 * 5
+
+# sampling frequencies by version (3 MPEG 1, 2 MPEG 2, 0 MPEG 2.5) and frequency index
+FREQUENCIES = {3 : [44100, 48000, 32000], 2 : [22050, 24000, 16000], 0 : [11025, 12000, 8000]}
+BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+LSF_BITRATES = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+class BitWriter(object):
+    """
+    BitWriter : collect integers of given widths into bytes
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def write(self, value: int, width: int):
+        """
+        write : append value as a width-bit unsigned integer
+        """
+        self.value = (self.value << width) | (value & ((1 << width) - 1))
+        self.length += width
+
+    def to_bytes(self) -> bytes:
+        """
+        to_bytes : the bits written so far, zero padded to a whole number of bytes
+        """
+        pad = (8 - self.length % 8) % 8
+        return (self.value << pad).to_bytes((self.length + pad) // 8, 'big')
+
+def header_bytes(bitrate_index=9, frequency_index=0, pad_bit=0, mode=0, mode_extention=0,
+                 protected=False, version=3) -> bytes:
+    """
+    header_bytes : a layer III frame header. version 3 is MPEG 1, 2 is MPEG 2, 0 is MPEG 2.5
+    """
+    writer = BitWriter()
+    writer.write(0x7ff, 11)
+    writer.write(version, 2)
+    writer.write(1, 2)
+    writer.write(0 if protected else 1, 1)
+    writer.write(bitrate_index, 4)
+    writer.write(frequency_index, 2)
+    writer.write(pad_bit, 1)
+    writer.write(0, 1)
+    writer.write(mode, 2)
+    writer.write(mode_extention, 2)
+    writer.write(0, 4)
+    return writer.to_bytes()
+
+def random_channel_side_info(rand: random.Random, part2_3_length: int, silent=False,
+                             lsf=False) -> dict:
+    """
+    random_channel_side_info : side info fields for one granule and channel
+    """
+    fields = {
+        'part2_3_length' : part2_3_length,
+        'big_values' : 0 if silent else rand.randint(0, 288),
+        'global_gain' : rand.randint(120, 160),
+        'scalefac_compress' : 0 if silent else rand.randint(0, 511 if lsf else 15),
+        'window_switch_flag' : 0 if silent else rand.randint(0, 1),
+        'block_type' : rand.choice([1, 2, 3]),
+        'mixed_block_flag' : rand.randint(0, 1),
+        'table_select' : [rand.choice(BIG_VALUE_TABLES) for _ in range(0, 3)],
+        'sub_block_gain' : [rand.randint(0, 7) for _ in range(0, 3)],
+        'region0_count' : rand.randint(0, 15),
+        'region1_count' : rand.randint(0, 7),
+        'preflag' : rand.randint(0, 1),
+        'scalefac_scale' : rand.randint(0, 1),
+        'count1_table_select' : rand.randint(0, 1),
+    }
+    return fields
+
+def side_info_bytes(main_data_begin: int, channels: list, scfsi: list, lsf=False) -> bytes:
+    """
+    side_info_bytes : pack MPEG 1 side information, or with lsf, MPEG 2/2.5 side
+    information (one granule, no scfsi). channels is [granule][channel] of dicts from
+    random_channel_side_info
+    """
+    writer = BitWriter()
+    mono = len(channels[0]) == 1
+    if lsf:
+        writer.write(main_data_begin, 8)
+        writer.write(0, 1 if mono else 2)
+    else:
+        writer.write(main_data_begin, 9)
+        writer.write(0, 5 if mono else 3)
+        for chan in range(0, len(channels[0])):
+            for band in range(0, 4):
+                writer.write(scfsi[chan][band], 1)
+    for granule in channels:
+        for fields in granule:
+            writer.write(fields['part2_3_length'], 12)
+            writer.write(fields['big_values'], 9)
+            writer.write(fields['global_gain'], 8)
+            writer.write(fields['scalefac_compress'], 9 if lsf else 4)
+            writer.write(fields['window_switch_flag'], 1)
+            if fields['window_switch_flag']:
+                writer.write(fields['block_type'], 2)
+                writer.write(fields['mixed_block_flag'], 1)
+                for i in range(0, 2):
+                    writer.write(fields['table_select'][i], 5)
+                for i in range(0, 3):
+                    writer.write(fields['sub_block_gain'][i], 3)
+            else:
+                for i in range(0, 3):
+                    writer.write(fields['table_select'][i], 5)
+                writer.write(fields['region0_count'], 4)
+                writer.write(fields['region1_count'], 3)
+            if not lsf:
+                writer.write(fields['preflag'], 1)
+            writer.write(fields['scalefac_scale'], 1)
+            writer.write(fields['count1_table_select'], 1)
+    return writer.to_bytes()
+
+def frame_crc(header: bytes, side_info: bytes) -> int:
+    """
+    frame_crc : the CRC-16 of a protected frame, a bit at a time straight from the standard:
+    polynomial 0x8005 from 0xFFFF over the last two header bytes and the side info
+    """
+    crc = 0xFFFF
+    for byte in header[2:4] + side_info:
+        for shift in range(7, -1, -1):
+            bit = (byte >> shift) & 1
+            crc <<= 1
+            if ((crc >> 16) & 1) ^ bit:
+                crc ^= 0x8005
+            crc &= 0xFFFF
+    return crc
+
+def make_mp3(nframes: int, seed=0, mode=1, mode_extention=3, use_reservoir=True,
+             silent=False, bitrate_index=9, main_data=None, version=3,
+             frequency_index=0, protected=False) -> bytes:
+    """
+    make_mp3 : build nframes of layer III, 44.1kHz MPEG 1 by default. mode is the channel
+    mode (0 stereo, 1 joint stereo, 2 dual channel, 3 mono). with use_reservoir, frames
+    leave some of their main data slot unused and the next frame starts its main data
+    in the previous frame's slot. if main_data is a list, each frame's main data
+    (from main_data_begin to the end of its slot) is appended to it. version and
+    frequency_index are as in header_bytes: versions 2 and 0 make one granule MPEG 2/2.5.
+    with protected, each header is followed by the frame's CRC
+    """
+    rand = random.Random(seed)
+    lsf = version != 3
+    channel_count = 1 if mode == 3 else 2
+    granule_count = 1 if lsf else 2
+    if lsf:
+        side_info_length = 9 if channel_count == 1 else 17
+        bitrate = LSF_BITRATES[bitrate_index]
+    else:
+        side_info_length = 17 if channel_count == 1 else 32
+        bitrate = BITRATES[bitrate_index]
+    max_part2_length = MAX_LSF_PART2_LENGTH if lsf else MAX_PART2_LENGTH
+    max_begin = 255 if lsf else 511
+    frame_size = (72 if lsf else 144) * bitrate * 1000 // FREQUENCIES[version][frequency_index]
+    slot_size = frame_size - 4 - side_info_length - (2 if protected else 0)
+    # the main data of all frames laid out back to back, as the reservoir sees it
+    main_data_stream = bytearray()
+    frames = []
+    data_starts = []
+    data_end = 0
+    for index in range(0, nframes):
+        slot_start = index * slot_size
+        slot_end = slot_start + slot_size
+        data_start = max(data_end, slot_start - max_begin) if use_reservoir else slot_start
+        if use_reservoir:
+            data_length = rand.randint((slot_end - data_start) // 2, slot_end - data_start)
+        else:
+            data_length = slot_size
+        data_end = data_start + data_length
+        data_starts.append(data_start)
+        # split the main data bits between the granules and channels
+        bits_left = data_length * 8
+        channels = []
+        for _ in range(0, granule_count):
+            granule = []
+            for _ in range(0, channel_count):
+                # always leave room for the largest possible set of scale factors
+                length = min(bits_left, rand.randint(
+                    max_part2_length, data_length * 8 // (granule_count * channel_count)))
+                if silent:
+                    length = 0
+                bits_left -= length
+                granule.append(random_channel_side_info(rand, length, silent, lsf))
+            channels.append(granule)
+        scfsi = [[rand.randint(0, 1) for _ in range(0, 4)] for _ in range(0, channel_count)]
+        side_info = side_info_bytes(slot_start - data_start, channels, scfsi, lsf)
+        frames.append((header_bytes(bitrate_index, frequency_index, mode=mode,
+                                    mode_extention=mode_extention, protected=protected,
+                                    version=version),
+                       side_info))
+        main_data_stream.extend(bytes(rand.getrandbits(8) if not silent else 0
+                                      for _ in range(len(main_data_stream), slot_end)))
+    if main_data is not None:
+        for index, start in enumerate(data_starts):
+            main_data.append(bytes(main_data_stream[start:(index + 1) * slot_size]))
+    out = bytearray()
+    for index, (header, side_info) in enumerate(frames):
+        if protected:
+            header += frame_crc(header, side_info).to_bytes(2, 'big')
+        out += header + side_info + main_data_stream[index * slot_size:(index + 1) * slot_size]
+    return bytes(out)
+
+def xing_frame(frames=None, nbytes=None, toc=None, quality=None, kind=b'Xing', mode=1,
+               bitrate_index=9) -> bytes:
+    """
+    xing_frame : a silent 44.1kHz MPEG 1 frame holding a Xing/Info tag with the given fields
+    """
+    header = header_bytes(bitrate_index, mode=mode)
+    frame_size = 144 * [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256,
+                        320][bitrate_index] * 1000 // 44100
+    flags = 0
+    fields = b''
+    for flag, value, width in [(1, frames, 4), (2, nbytes, 4), (4, toc, 100), (8, quality, 4)]:
+        if value is not None:
+            flags |= flag
+            fields += bytes(value) if width == 100 else value.to_bytes(width, 'big')
+    side_info = bytes(17 if mode == 3 else 32)
+    tag = kind + flags.to_bytes(4, 'big') + fields
+    frame = header + side_info + tag
+    return frame + bytes(frame_size - len(frame))
+
+def vbri_frame(frames: int, nbytes: int, toc: list, frames_per_entry: int, scale=1,
+               entry_size=2) -> bytes:
+    """
+    vbri_frame : a silent 44.1kHz MPEG 1 joint stereo frame at 128kbps holding a VBRI tag
+    """
+    tag = b'VBRI' + (1).to_bytes(2, 'big') + (0).to_bytes(2, 'big') + (75).to_bytes(2, 'big')
+    tag += nbytes.to_bytes(4, 'big') + frames.to_bytes(4, 'big')
+    tag += len(toc).to_bytes(2, 'big') + scale.to_bytes(2, 'big')
+    tag += entry_size.to_bytes(2, 'big') + frames_per_entry.to_bytes(2, 'big')
+    tag += b''.join((size // scale).to_bytes(entry_size, 'big') for size in toc)
+    frame = header_bytes(9, mode=1) + bytes(32) + tag
+    return frame + bytes(417 - len(frame))
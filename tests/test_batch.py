@@ -0,0 +1,148 @@
+"""
+test_batch.py : test decoding files over a process pool
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+sys.path.append('../mp3po')
+
+from mp3_fixtures import make_mp3
+from test_mp3 import write_temp_file
+from mp3po.batch import decode_file, decode_file_parallel, decode_files, iter_paths
+from mp3po.batch import split_points, warmup_frames
+from mp3po.batch import main as batch_main
+from mp3po.mp3 import MP3File
+
+def make_library() -> str:
+    """
+    make_library : a directory of a few small files, one of them not an mp3
+    """
+    directory = tempfile.mkdtemp()
+    os.mkdir(os.path.join(directory, 'b'))
+    for name, seed, mode in [('a.mp3', 1, 1), ('b/c.mp3', 2, 3), ('b/d.MP3', 3, 0)]:
+        with open(os.path.join(directory, name), 'wb') as out:
+            out.write(make_mp3(3, seed=seed, mode=mode))
+    with open(os.path.join(directory, 'b', 'notes.txt'), 'wb') as out:
+        out.write(b'not audio')
+    return directory
+
+def test_decode_files():
+    """
+    test_decode_files : the workers give the same PCM as decoding in this process, in order
+    or not, and bad files come back with an error
+    """
+    directory = make_library()
+    try:
+        paths = iter_paths([directory])
+        assert [os.path.relpath(p, directory) for p in paths] == ['a.mp3', 'b/c.mp3', 'b/d.MP3']
+        expected = {}
+        for path in paths:
+            mp3 = MP3File(path)
+            expected[path] = mp3.read_pcm(10)
+        missing = os.path.join(directory, 'missing.mp3')
+        results = list(decode_files([directory, missing], workers=2))
+        assert [r.path for r in results] == paths + [missing]
+        for result in results[0:3]:
+            assert result.error is None
+            assert result.pcm == expected[result.path]
+            assert result.channels == len(expected[result.path])
+            assert result.samples == 3 * 1152
+            assert result.frequency == 44100
+            assert result.peak[0] == max(abs(s) for s in expected[result.path][0])
+        assert results[3].error.startswith('FileNotFoundError')
+        assert decode_file(os.path.join(directory, 'b', 'notes.txt')).error
+
+        results = list(decode_files(paths, workers=2, chunksize=2, ordered=False,
+                                    keep_pcm=False, max_frames=2))
+        assert sorted(r.path for r in results) == sorted(paths)
+        for result in results:
+            assert result.pcm is None
+            assert result.samples == 2 * 1152
+            assert result.summary() == decode_file(result.path, 2).summary()
+    finally:
+        shutil.rmtree(directory)
+
+def test_split_points():
+    """
+    test_split_points : segments cover every frame once, start where the warm-up frames
+    begin with an empty reservoir when possible, and there's no warm-up at the start
+    """
+    # MPEG 1 warms up on one frame of two granules, MPEG 2 on two frames of one
+    for version, warmup in [(3, 1), (2, 2)]:
+        filename = write_temp_file(make_mp3(50, seed=4, version=version))
+        try:
+            index = MP3File(filename).frame_index()
+            assert warmup_frames(index.header(0)) == warmup
+            points = split_points(index, 4)
+            assert points[0] == (0, 0, points[0][2])
+            assert points[-1][2] == 50
+            for (_, _, end), (warm_start, start, _) in zip(points, points[1:]):
+                assert start == end and warm_start == start - warmup
+            assert len(split_points(index, 100)) == 50
+        finally:
+            os.remove(filename)
+
+def test_decode_file_parallel():
+    """
+    test_decode_file_parallel : decoding in segments gives exactly the samples decoding in
+    one go does, but not without warming up
+    """
+    for mode, version in [(1, 3), (3, 3), (1, 2), (3, 0)]:
+        filename = write_temp_file(make_mp3(30, seed=mode, mode=mode, version=version))
+        try:
+            expected = decode_file(filename)
+            result = decode_file_parallel(filename, workers=2, segments=5)
+            assert result.error is None
+            assert result.samples == 30 * (1152 if version == 3 else 576)
+            assert result.pcm == expected.pcm
+            assert result.summary() == expected.summary()
+            cold = decode_file_parallel(filename, workers=2, segments=5, warmup=0)
+            assert cold.samples == result.samples and cold.pcm != expected.pcm
+        finally:
+            os.remove(filename)
+
+def test_split_decode_is_exact():
+    """
+    test_split_decode_is_exact : however a file is split, the samples are exactly the ones
+    decoding it in one go gives, for mono, stereo, and MPEG 2 and 2.5 at every rate
+    """
+    cases = [(3, 3, 0), (1, 3, 1), (0, 3, 2), (3, 2, 0), (1, 2, 1), (2, 2, 2), (1, 0, 0),
+             (3, 0, 2)]
+    for mode, version, frequency_index in cases:
+        filename = write_temp_file(make_mp3(24, seed=mode + version, mode=mode, version=version,
+                                            frequency_index=frequency_index))
+        try:
+            expected = decode_file(filename).pcm
+            for segments in (2, 3, 7):
+                result = decode_file_parallel(filename, workers=2, segments=segments)
+                assert result.error is None
+                assert result.pcm == expected
+        finally:
+            os.remove(filename)
+
+def test_main():
+    """
+    test_main : the command line prints a summary per file and fails if any file did
+    """
+    directory = make_library()
+    try:
+        assert batch_main(['-j', '1', directory]) == 0
+        assert batch_main(['-j', '2', '--split', directory]) == 0
+        assert batch_main(['-j', '1', '--unordered', os.path.join(directory, 'b', 'notes.txt')]) == 1
+    finally:
+        shutil.rmtree(directory)
+
+def main():
+    """
+    main : run tests
+    """
+    test_decode_files()
+    test_split_points()
+    test_decode_file_parallel()
+    test_split_decode_is_exact()
+    test_main()
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ test_bits.py : test the bits utility class
 import sys
 sys.path.append('../mp3po')
 
-from mp3po.util.bits import Bits
+from mp3po.util.bits import Bits, BitReader, EndOfBitsException
 
 def test_read_first_bit():
     """
@@ -15,12 +15,73 @@ def test_read_first_bit():
     assert test_bits.read(1) == '0'
     assert test_bits._position == 1
 
+def test_bit_reader_matches_bits():
+    """
+    test_bit_reader_matches_bits : the integer reader agrees with the string reader
+    """
+    data = bytes(range(7, 250, 3))
+    test_bits = Bits()
+    for i in data:
+        test_bits.add_bits(i)
+    reader = BitReader(data)
+    for width in [1, 3, 8, 12, 0, 9, 32, 5, 60, 1, 17, 64, 4]:
+        assert reader.tell() == test_bits.tell()
+        assert reader.peek(width) == test_bits.peek(width)
+        if width:
+            assert reader.read_bits_as_int(width) == test_bits.read_bits_as_int(width)
+        else:
+            assert reader.read_bits_as_int(width) == 0
+
+def test_bit_reader_read_bit_and_seek():
+    """
+    test_bit_reader_read_bit_and_seek : single bit reads, seeking backwards and the end of the data
+    """
+    reader = BitReader(b'\xa5\x0f')
+    assert [reader.read_bit() for _ in range(8)] == [1, 0, 1, 0, 0, 1, 0, 1]
+    reader.seek(4)
+    assert reader.read(8) == '01010000'
+    assert reader.bits_left() == 4
+    # reads starting inside the data are zero-padded past the end
+    assert reader.peek_bits_as_int(8) == 0xf0
+    assert reader.read(8) == '1111'
+    try:
+        reader.read_bit()
+        assert False
+    except EndOfBitsException:
+        pass
+
+def test_read_ints():
+    """
+    test_read_ints : a run of integers read in one go matches reading them one by one
+    """
+    data = bytes(range(3, 250, 7))
+    for count, width in [(1, 1), (11, 4), (18, 3), (7, 0), (18, 5), (3, 13)]:
+        reader = BitReader(data)
+        reader.seek(5)
+        one_by_one = [reader.read_bits_as_int(width) for _ in range(0, count)]
+        out = [99] * (count + 2)
+        reader.seek(5)
+        reader.read_ints(count, width, out, 1)
+        assert reader.tell() == 5 + count * width
+        assert out[1:count + 1] == (one_by_one if width else [99] * count)
+        assert out[0] == out[-1] == 99
+    reader = BitReader(b'\xff')
+    reader.seek(2)
+    try:
+        # the third integer would start past the end
+        reader.read_ints(3, 3, [0] * 3, 0)
+        assert False
+    except EndOfBitsException:
+        pass
+
 def main():
     """
     main : run tests
     """
-    test_bits = Bits(bin(123))
     test_read_first_bit()
+    test_bit_reader_matches_bits()
+    test_bit_reader_read_bit_and_seek()
+    test_read_ints()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,141 @@
+"""
+test_cache.py : test the decoded PCM cache
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+sys.path.append('../mp3po')
+
+from mp3_fixtures import make_mp3
+from test_mp3 import write_temp_file
+from mp3po.cache import DecodeCache, file_key
+from mp3po.mp3 import MP3File
+
+class CountingReader(io.BytesIO):
+    """
+    CountingReader : an in-memory file that counts the bytes read from it
+    """
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1) -> bytes:
+        """
+        read : read and count
+        """
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+def clip(pcm: list, start: int, nframes: int) -> list:
+    """
+    clip : frames start to start + nframes of decoded PCM
+    """
+    return [samples[start * 1152:(start + nframes) * 1152] for samples in pcm]
+
+def test_clips():
+    """
+    test_clips : clips through the cache are sample for sample the same as decoding the whole
+    file, and overlapping clips share blocks
+    """
+    data = make_mp3(20, seed=3)
+    full = MP3File(data).read_pcm(20)
+    cache = DecodeCache(block_frames=4)
+    assert cache.read_pcm(data, 3, 6) == clip(full, 3, 6)
+    assert (cache.stats.hits, cache.stats.misses) == (0, 3)
+    assert cache.read_pcm(data, 5, 9) == clip(full, 5, 9)
+    assert (cache.stats.hits, cache.stats.misses) == (2, 4)
+    assert cache.read_pcm(data, 0) == full
+    assert cache.read_pcm(data, 18, 10) == clip(full, 18, 2)
+    assert cache.read_pcm(data, 25, 3) == []
+    assert cache.stats.memory_bytes == 20 * 1152 * 2 * 8
+
+def test_lsf_clips():
+    """
+    test_lsf_clips : MPEG 2 and 2.5 blocks, with one granule a frame, warm up long enough to
+    match the whole file too
+    """
+    for version, mode in [(2, 1), (0, 3)]:
+        data = make_mp3(20, seed=5, mode=mode, version=version)
+        full = MP3File(data).read_pcm(20)
+        cache = DecodeCache(block_frames=3)
+        for start, nframes in [(4, 7), (0, 20), (10, 3)]:
+            assert cache.read_pcm(data, start, nframes) == [
+                samples[start * 576:(start + nframes) * 576] for samples in full]
+
+def test_hits_skip_decoding():
+    """
+    test_hits_skip_decoding : a clip that's all cached doesn't touch the file, and a changed
+    file gets a new key
+    """
+    filename = write_temp_file(make_mp3(8, seed=1))
+    try:
+        cache = DecodeCache(block_frames=4)
+        key = file_key(filename)
+        expected = cache.read_pcm(filename, 2, 4)
+        assert cache.read_pcm('no such file', 2, 4, key=key) == expected
+        with open(filename, 'wb') as out:
+            out.write(make_mp3(9, seed=1))
+        assert file_key(filename) != key
+    finally:
+        os.remove(filename)
+
+    # bytes and file objects are hashed the first time only
+    data = make_mp3(8, seed=2)
+    source = CountingReader(data)
+    cache = DecodeCache(block_frames=4)
+    expected = cache.read_pcm(source, 1, 6)
+    source.bytes_read = 0
+    assert cache.read_pcm(source, 0, 8) == MP3File(data).read_pcm(8)
+    assert cache.read_pcm(source, 2, 3) == clip(expected, 1, 3)
+    assert source.bytes_read == 0
+    assert cache.stats.misses == 2
+
+def test_eviction_and_spill():
+    """
+    test_eviction_and_spill : over budget, the least recently used blocks go to the spill
+    directory, come back from it intact, and are deleted from it when it's over budget too
+    """
+    data = make_mp3(16, seed=6)
+    full = MP3File(data).read_pcm(16)
+    block_bytes = 4 * 1152 * 2 * 8
+    spill_dir = tempfile.mkdtemp()
+    try:
+        cache = DecodeCache(max_bytes=2 * block_bytes, spill_dir=spill_dir,
+                            max_spill_bytes=block_bytes, block_frames=4)
+        assert cache.read_pcm(data, 0, 12) == clip(full, 0, 12)
+        # blocks 0 and 1 pushed out of memory, block 0 then out of the spill directory
+        assert (cache.stats.evictions, cache.stats.spills, cache.stats.spill_evictions) == (1, 1, 0)
+        assert cache.read_pcm(data, 12, 4) == clip(full, 12, 4)
+        assert (cache.stats.evictions, cache.stats.spills, cache.stats.spill_evictions) == (2, 2, 1)
+        assert cache.stats.memory_bytes == 2 * block_bytes
+        assert cache.stats.spill_bytes == block_bytes
+        assert len(os.listdir(spill_dir)) == 1
+        # block 1 comes back from disk, block 0 is decoded again
+        misses = cache.stats.misses
+        assert cache.read_pcm(data, 4, 4) == clip(full, 4, 4)
+        assert cache.stats.spill_hits == 1
+        assert cache.read_pcm(data, 0, 4) == clip(full, 0, 4)
+        assert cache.stats.misses == misses + 1
+        assert 0 < cache.stats.summary()['hit_rate'] < 1
+        cache.clear()
+        assert os.listdir(spill_dir) == []
+        assert cache.stats.memory_bytes == cache.stats.spill_bytes == 0
+    finally:
+        shutil.rmtree(spill_dir)
+
+def main():
+    """
+    main : run tests
+    """
+    test_clips()
+    test_lsf_clips()
+    test_hits_skip_decoding()
+    test_eviction_and_spill()
+
+if __name__ == '__main__':
+    main()
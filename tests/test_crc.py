@@ -0,0 +1,117 @@
+"""
+test_crc.py : test the CRC check of protected frames
+"""
+
+import random
+import sys
+sys.path.append('../mp3po')
+
+import mp3_fixtures
+from mp3_fixtures import make_mp3
+from test_incremental import feed_in_chunks
+from mp3po.crc import CRCCheck, CRCMismatchException, crc16
+from mp3po.incremental import IncrementalDecoder
+from mp3po.mp3 import MP3File
+
+def damaged_mp3(nframes: int, bad: int, where: int) -> (bytes, list):
+    """
+    damaged_mp3 : protected frames with one byte flipped in frame bad, where bytes after its
+    header. returns the data and the frame offsets
+    """
+    data = bytearray(make_mp3(nframes, seed=5, protected=True))
+    offsets = list(MP3File(bytes(data)).frame_index().offsets)
+    data[offsets[bad] + where] ^= 0x10
+    return bytes(data), offsets
+
+def test_crc16():
+    """
+    test_crc16 : the table driven CRC matches the standard check value and a bit at a time
+    """
+    assert crc16(b'123456789') == 0xAEE7
+    rand = random.Random(3)
+    for length in (0, 1, 17, 32):
+        side_info = bytes(rand.getrandbits(8) for _ in range(0, length))
+        header = bytes(rand.getrandbits(8) for _ in range(0, 4))
+        assert (crc16(side_info, crc16(header[2:4]))
+                == mp3_fixtures.frame_crc(header, side_info))
+
+def test_intact_frames():
+    """
+    test_intact_frames : intact protected frames all pass and decode as with no check
+    """
+    data = make_mp3(6, seed=5, protected=True)
+    mp3 = MP3File(data, crc='raise')
+    pcm = mp3.read_pcm(6)
+    assert (mp3.crc.checked, mp3.crc.failed) == (6, 0)
+    assert pcm == MP3File(data).read_pcm(6)
+    # unprotected frames have nothing to check
+    mp3 = MP3File(make_mp3(3, seed=5), crc='raise')
+    assert len(mp3.read_frames(3)) == 3
+    assert mp3.crc.checked == 0
+    try:
+        MP3File(data, crc='ignore')
+        assert False
+    except ValueError:
+        pass
+
+def test_policies():
+    """
+    test_policies : a frame with damaged side info is left out, kept without main data or
+    raised. either way the frames after it still get their reservoir data
+    """
+    data, offsets = damaged_mp3(6, 2, 4 + 2 + 3)
+    mp3 = MP3File(data, crc='skip')
+    frames = list(mp3.iter_frames())
+    assert len(frames) == 5
+    assert (mp3.crc.checked, mp3.crc.failed) == (6, 1)
+    assert all(frame.main_data is not None for frame in frames[2:])
+
+    mp3 = MP3File(data, crc='conceal')
+    frames = list(mp3.iter_frames())
+    assert len(frames) == 6
+    assert frames[2].main_data is None
+    assert all(frame.main_data is not None for frame in frames[3:])
+    assert mp3.crc.failed == 1
+
+    mp3 = MP3File(data, crc='raise')
+    try:
+        mp3.read_frames(6)
+        assert False
+    except CRCMismatchException as exception:
+        assert exception.offset == offsets[2]
+    # carry on from the frame after the bad one
+    assert mp3.position == offsets[3]
+    frames = mp3.read_frames(6)
+    assert len(frames) == 3
+    assert frames[0].main_data is not None
+
+    # a damaged CRC fails the same way
+    data, _ = damaged_mp3(6, 4, 4)
+    mp3 = MP3File(data, crc='skip')
+    assert len(mp3.read_frames(6)) == 5
+    assert mp3.crc.failed == 1
+
+def test_streamed():
+    """
+    test_streamed : frames straddling chunks are checked too, with the counts shared by
+    passing in a CRCCheck
+    """
+    data, _ = damaged_mp3(8, 5, 4 + 2 + 10)
+    check = CRCCheck('conceal')
+    pcm = feed_in_chunks(IncrementalDecoder(crc=check), data, [100, 7, 333])
+    assert len(pcm) == 8
+    assert (check.checked, check.failed) == (8, 1)
+    mp3 = MP3File(data, crc='conceal')
+    assert pcm == [mp3.decoder.decode(frame) for frame in mp3.iter_frames()]
+
+def main():
+    """
+    main : run tests
+    """
+    test_crc16()
+    test_intact_frames()
+    test_policies()
+    test_streamed()
+
+if __name__ == '__main__':
+    main()
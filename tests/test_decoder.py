@@ -0,0 +1,351 @@
+"""
+test_decoder.py : test the layer III decoding stages
+"""
+
+import math
+import random
+import sys
+sys.path.append('../mp3po')
+
+from mp3_fixtures import BitWriter, header_bytes, make_mp3, random_channel_side_info
+from mp3_fixtures import side_info_bytes
+from mp3po.decoder import Decoder, PRETAB, reorder, requantize, stereo
+from mp3po.frame import Frame
+from mp3po.header import ChannelEncodings, MP3Header
+from mp3po.main_data import LSF_PART_SIZES, LSF_SCALEFAC_PLANS, SCALEFAC_PLANS
+from mp3po.main_data import MainData, lsf_scalefac_widths
+from mp3po.sideinfo import SideInfo
+from mp3po.synthesis import ChannelSynthesis, SYNTH_WINDOW
+from mp3po.synthesis import fast_imdct12, fast_imdct36, fast_polyphase_matrices
+from mp3po.synthesis import fast_polyphase_matrix, imdct12, imdct36, polyphase_matrices
+from mp3po.synthesis import polyphase_matrix
+
+def frames_without_reservoir(data: bytes) -> list:
+    """
+    frames_without_reservoir : split a stream whose frames all have main_data_begin == 0
+    """
+    frames = []
+    position = 0
+    while position < len(data):
+        header = MP3Header(data[position:position + 4])
+        side_info_end = position + 4 + header.side_info_length
+        side_info = SideInfo(header, data[position + 4:side_info_end])
+        main_data = MainData(header, side_info, data[side_info_end:position + header.frame_size])
+        frames.append(Frame(header, side_info, main_data))
+        position += header.frame_size
+    return frames
+
+def analysis_filterbank(samples: list) -> list:
+    """
+    analysis_filterbank : the encoder's polyphase filterbank (ISO/IEC 11172-3 annex C.1.3)
+    returns one list of 32 subband samples per 32 input samples
+    """
+    window = [d / 32 for d in SYNTH_WINDOW]
+    matrix = [[math.cos((2 * k + 1) * (i - 16) * math.pi / 64) for i in range(0, 64)]
+              for k in range(0, 32)]
+    buffer = [0.0] * 512
+    slots = []
+    for start in range(0, len(samples), 32):
+        buffer = samples[start:start + 32][::-1] + buffer[:480]
+        z = [w * x for w, x in zip(window, buffer)]
+        y = [sum(z[i + 64 * j] for j in range(0, 8)) for i in range(0, 64)]
+        slots.append([sum(m * v for m, v in zip(row, y)) for row in matrix])
+    return slots
+
+def test_polyphase_reconstruction():
+    """
+    test_polyphase_reconstruction : analysis followed by synthesis gives back the input,
+    delayed by 481 samples
+    """
+    rand = random.Random(0)
+    samples = [rand.uniform(-1, 1) for _ in range(0, 32 * 18 * 3)]
+    slots = analysis_filterbank(samples)
+    synthesis = ChannelSynthesis()
+    pcm = []
+    for start in range(0, len(slots), 18):
+        block = slots[start:start + 18]
+        pcm.extend(synthesis.polyphase([block[t][k] for k in range(0, 32) for t in range(0, 18)]))
+    error = max(abs(pcm[n] - samples[n - 481]) for n in range(600, len(samples)))
+    assert error < 1e-3
+
+def test_fast_transforms_match_reference():
+    """
+    test_fast_transforms_match_reference : the factorized IMDCTs and polyphase matrixing
+    agree with the matrix products
+    """
+    rand = random.Random(1)
+    for reference, fast, size in [(imdct36, fast_imdct36, 18), (imdct12, fast_imdct12, 6),
+                                  (polyphase_matrix, fast_polyphase_matrix, 32)]:
+        for _ in range(0, 10):
+            values = [rand.uniform(-1000, 1000) for _ in range(0, size)]
+            want = reference(values)
+            got = fast(values)
+            assert len(got) == len(want)
+            assert max(abs(g - w) for g, w in zip(got, want)) < 1e-9
+
+def test_polyphase_matrices():
+    """
+    test_polyphase_matrices : matrixing a granule's 18 time slots at once gives exactly what
+    doing them one by one does
+    """
+    rand = random.Random(2)
+    samples = [rand.uniform(-1, 1) for _ in range(0, 576)]
+    got = fast_polyphase_matrices(samples)
+    assert [list(v) for v in got] == [fast_polyphase_matrix(samples[slot::18])
+                                      for slot in range(0, 18)]
+    for fast, reference in zip(got, polyphase_matrices(samples)):
+        assert max(abs(g - w) for g, w in zip(fast, reference)) < 1e-9
+
+def test_fast_decode_matches_reference():
+    """
+    test_fast_decode_matches_reference : decoding with the fast transforms gives the same
+    PCM as the reference matrix products
+    """
+    frames = frames_without_reservoir(make_mp3(4, seed=7, use_reservoir=False))
+    fast = Decoder()
+    reference = Decoder(reference=True)
+    for frame in frames:
+        for got, want in zip(fast.decode(frame), reference.decode(frame)):
+            assert max(abs(g - w) for g, w in zip(got, want)) < 1e-9
+
+def test_requantize_matches_formula():
+    """
+    test_requantize_matches_formula : the table driven requantizer agrees with
+    sign(is) * |is|^(4/3) * 2^(gain / 4) for long and short blocks
+    """
+    class Channel(object):
+        global_gain = 150
+        scalefac_scale = 1
+        preflag = 1
+        window_switch_flag = 0
+        block_type = 0
+        mixed_block_flag = 0
+        sub_block_gain = [1, 0, 3]
+    rand = random.Random(2)
+    bands = MainData.scale_band_indicies[48000]
+    lines = [rand.randint(-8206, 8206) for _ in range(0, 576)]
+    scalefac_l = [rand.randint(0, 15) for _ in range(0, 21)] + [0]
+    scalefac_s = [rand.randint(0, 7) for _ in range(0, 36)] + [0, 0, 0]
+    channel = Channel()
+    xr = requantize(channel, lines, 500, scalefac_l, scalefac_s, bands)
+    for sfb in range(0, 22):
+        for i in range(bands['L'][sfb], bands['L'][sfb + 1]):
+            exponent = 0.25 * (150 - 210) - (scalefac_l[sfb] + PRETAB[sfb])
+            want = math.copysign(abs(lines[i]) ** (4 / 3), lines[i]) * 2 ** exponent
+            assert abs(xr[i] - want) <= 1e-9 * abs(want) if i < 500 else xr[i] == 0.0
+
+    channel.window_switch_flag = 1
+    channel.block_type = 2
+    xr = requantize(channel, lines, 576, scalefac_l, scalefac_s, bands)
+    for sfb in range(0, 13):
+        width = bands['S'][sfb + 1] - bands['S'][sfb]
+        for window in range(0, 3):
+            start = 3 * bands['S'][sfb] + window * width
+            for i in range(start, start + width):
+                exponent = (0.25 * (150 - 210 - 8 * channel.sub_block_gain[window])
+                            - scalefac_s[3 * sfb + window])
+                want = math.copysign(abs(lines[i]) ** (4 / 3), lines[i]) * 2 ** exponent
+                assert abs(xr[i] - want) <= 1e-9 * abs(want)
+
+def test_reorder_short_blocks():
+    """
+    test_reorder_short_blocks : short block windows get interleaved band by band
+    """
+    class Channel(object):
+        window_switch_flag = 1
+        block_type = 2
+        mixed_block_flag = 0
+    bands = MainData.scale_band_indicies[44100]
+    xr = list(range(0, 576))
+    reorder(Channel(), xr, bands)
+    # band 0 is 4 lines wide: [w0 f0-3, w1 f0-3, w2 f0-3] -> [f0 w0-2, f1 w0-2, ...]
+    assert xr[0:12] == [0, 4, 8, 1, 5, 9, 2, 6, 10, 3, 7, 11]
+    assert sorted(xr) == list(range(0, 576))
+
+def test_silent_frames():
+    """
+    test_silent_frames : frames without any huffman data decode to silence
+    """
+    decoder = Decoder()
+    for frame in frames_without_reservoir(make_mp3(4, silent=True, use_reservoir=False)):
+        pcm = decoder.decode(frame)
+        assert len(pcm) == 2
+        assert len(pcm[0]) == len(pcm[1]) == 1152
+        assert not any(pcm[0]) and not any(pcm[1])
+
+def test_missing_main_data():
+    """
+    test_missing_main_data : a frame whose main data couldn't be put together decodes
+    to silence after the previous frame's tail has played out
+    """
+    frames = frames_without_reservoir(make_mp3(2, seed=5, use_reservoir=False))
+    decoder = Decoder()
+    decoder.decode(frames[0])
+    missing = frames[1]
+    pcm = decoder.decode(Frame(missing.header, missing.side_info, None))
+    assert len(pcm) == 2 and len(pcm[0]) == 1152
+    assert all(math.isfinite(s) for s in pcm[0])
+    pcm = decoder.decode(Frame(missing.header, missing.side_info, None))
+    assert max(abs(s) for s in pcm[0][576:]) < 1e-9
+
+def test_noise_frames():
+    """
+    test_noise_frames : random main data decodes to finite samples in every mode
+    """
+    for mode in range(0, 4):
+        decoder = Decoder()
+        for frame in frames_without_reservoir(make_mp3(3, seed=mode, mode=mode,
+                                                       use_reservoir=False)):
+            pcm = decoder.decode(frame)
+            assert len(pcm) == (1 if mode == 3 else 2)
+            for channel in pcm:
+                assert len(channel) == 1152
+                assert all(math.isfinite(s) for s in channel)
+            assert any(pcm[0])
+
+def test_lsf_scalefac_widths():
+    """
+    test_lsf_scalefac_widths : scalefac_compress splits into the four scale factor widths
+    """
+    assert lsf_scalefac_widths(0, False) == ([0, 0, 0, 0], 0)
+    assert lsf_scalefac_widths(399, False) == ([4, 4, 3, 3], 0)
+    assert lsf_scalefac_widths(450, False) == ([2, 2, 2, 0], 1)
+    assert lsf_scalefac_widths(511, False) == ([3, 2, 0, 0], 2)
+    assert lsf_scalefac_widths(2 * 179 + 1, True) == ([4, 5, 5, 0], 3)
+    assert lsf_scalefac_widths(2 * 200, True) == ([1, 1, 0, 0], 4)
+    assert lsf_scalefac_widths(2 * 255, True) == ([3, 2, 0, 0], 5)
+
+def test_scalefac_plans():
+    """
+    test_scalefac_plans : the plans read as many bits as the standard says, and every scale
+    factor sent lands in a band of its own
+    """
+    for compress, (slen1, slen2) in enumerate(MainData.scalefac_sizes):
+        plans = SCALEFAC_PLANS[compress]
+        assert [sum(count * width for _, _, count, width in plan[0]) for plan in plans] == [
+            11 * slen1 + 10 * slen2, 18 * slen1 + 18 * slen2, 17 * slen1 + 18 * slen2]
+    for intensity_right in (False, True):
+        for compress in range(0, 512):
+            widths, row = lsf_scalefac_widths(compress, intensity_right)
+            for kind, plan in enumerate(LSF_SCALEFAC_PLANS[intensity_right][compress]):
+                sizes = LSF_PART_SIZES[row][kind]
+                runs, limits_l, limits_s = plan
+                assert (sum(count * width for _, _, count, width in runs)
+                        == sum(map(lambda size, width: size * width, sizes, widths)))
+                slots = [(target, i) for target, start, count, _ in runs
+                         for i in range(start, start + count)]
+                assert len(set(slots)) == sum(sizes)
+                assert limits_l[21] == 0 and limits_s[36:] == bytes(3)
+
+def test_scfsi_reuse():
+    """
+    test_scfsi_reuse : the second granule takes the scale factors of the scfsi bands it
+    shares from the first granule and reads the rest
+    """
+    header = MP3Header(header_bytes(mode=3))
+    fields = random_channel_side_info(random.Random(0), 11 * 4 + 10 * 3)
+    fields.update(window_switch_flag=0, scalefac_compress=15, big_values=0)
+    second = dict(fields, part2_3_length=6 * 4 + 5 * 3)
+    side_info = SideInfo(header, side_info_bytes(0, [[fields], [second]], [[1, 0, 1, 0]]))
+    writer = BitWriter()
+    first_values = [sfb % 16 for sfb in range(0, 11)] + [sfb % 8 for sfb in range(11, 21)]
+    for sfb, value in enumerate(first_values):
+        writer.write(value, 4 if sfb < 11 else 3)
+    second_values = list(first_values)
+    for sfb in list(range(6, 11)) + list(range(16, 21)):
+        second_values[sfb] = 1
+        writer.write(1, 4 if sfb < 11 else 3)
+    main_data = MainData(header, side_info, writer.to_bytes() + bytes(4))
+    assert list(main_data.scalefac_l[0][0]) == first_values + [0]
+    assert list(main_data.scalefac_l[1][0]) == second_values + [0]
+    assert len(main_data.scalefac_s[1][0]) == 39 and not any(main_data.scalefac_s[1][0])
+
+def test_lsf_granule_matches_mpeg1():
+    """
+    test_lsf_granule_matches_mpeg1 : with no scale factors, the same huffman data decodes
+    to the same samples in an MPEG 2 frame as in the first granule of an MPEG 1 frame
+    """
+    rand = random.Random(4)
+    fields = random_channel_side_info(rand, 1500)
+    fields.update({'scalefac_compress' : 0, 'window_switch_flag' : 0, 'preflag' : 0,
+                   'table_select' : [13, 13, 13], 'big_values' : 200})
+    silent = dict(fields, part2_3_length=0, big_values=0)
+    huffman_bits = bytes(rand.getrandbits(8) for _ in range(0, 188))
+    decoded = []
+    for version, bitrate_index, granules in [(3, 9, [[fields], [silent]]), (2, 9, [[fields]])]:
+        header = MP3Header(header_bytes(bitrate_index, mode=3, version=version))
+        side_info = side_info_bytes(0, granules, [[0] * 4], lsf=version != 3)
+        slot = header.frame_size - 4 - header.side_info_length
+        frame = (header_bytes(bitrate_index, mode=3, version=version) + side_info
+                 + huffman_bits + bytes(slot - len(huffman_bits)))
+        pcm = Decoder().decode(frames_without_reservoir(frame)[0])
+        decoded.append(pcm[0][0:576])
+    assert any(decoded[0])
+    assert decoded[0] == decoded[1]
+
+def test_lsf_intensity_stereo():
+    """
+    test_lsf_intensity_stereo : MPEG 2 intensity positions scale one channel down by powers
+    of 2^-1/4, and positions at their band's limit aren't intensity coded
+    """
+    header = MP3Header(header_bytes(mode=1, mode_extention=1, version=2))
+    channel = SideInfo(header, side_info_bytes(
+        0, [[random_channel_side_info(random.Random(0), 0, lsf=True)] * 2], None,
+        lsf=True)).granules[0].channels[1]
+    channel.window_switch_flag = 0
+    channel.block_type = 0
+    channel.scalefac_compress = 0
+    bands = MainData.scale_band_indicies[22050]
+    left = [1.0] * 576
+    right = [0.0] * 576
+    scalefac_l = [1] * 11 + [2] * 10 + [0]
+    limits_l = [7] * 20 + [2, 0]
+    stereo(header, channel, [left, right], scalefac_l, None, bands, (limits_l, None))
+    # is_pos 1: left down one step
+    assert left[0] == 2 ** -0.25 and right[0] == 1.0
+    # is_pos 2: right down one step
+    assert left[bands['L'][11]] == 1.0 and right[bands['L'][11]] == 2 ** -0.25
+    # band 20 is at its limit, band 21 isn't sent
+    assert left[bands['L'][20]:] == [1.0] * (576 - bands['L'][20])
+    assert not any(right[bands['L'][20]:])
+
+def test_lsf_noise_frames():
+    """
+    test_lsf_noise_frames : random MPEG 2 and 2.5 frames decode to finite samples, 576 a
+    frame, at every sampling frequency and in every mode
+    """
+    for version in (2, 0):
+        for frequency_index in range(0, 3):
+            for mode in range(0, 4):
+                decoder = Decoder()
+                data = make_mp3(3, seed=mode + frequency_index, mode=mode, use_reservoir=False,
+                                version=version, frequency_index=frequency_index)
+                for frame in frames_without_reservoir(data):
+                    pcm = decoder.decode(frame)
+                    assert len(pcm) == (1 if mode == 3 else 2)
+                    for channel in pcm:
+                        assert len(channel) == 576
+                        assert all(math.isfinite(s) for s in channel)
+
+def main():
+    """
+    main : run tests
+    """
+    test_polyphase_reconstruction()
+    test_fast_transforms_match_reference()
+    test_polyphase_matrices()
+    test_fast_decode_matches_reference()
+    test_requantize_matches_formula()
+    test_reorder_short_blocks()
+    test_silent_frames()
+    test_missing_main_data()
+    test_noise_frames()
+    test_lsf_scalefac_widths()
+    test_scalefac_plans()
+    test_scfsi_reuse()
+    test_lsf_granule_matches_mpeg1()
+    test_lsf_intensity_stereo()
+    test_lsf_noise_frames()
+
+if __name__ == '__main__':
+    main()
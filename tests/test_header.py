@@ -6,6 +6,7 @@ import sys
 sys.path.append('../mp3po')
 
 from mp3po.header import MP3Header, MPEGVersionEncodings, ChannelEncodings, LayerEncodings
+from mp3po.header import InvalidFieldEncodingException
 
 def test_header_decoding():
     """
@@ -29,11 +30,57 @@ def test_header_decoding():
     assert header.padding == 1
     assert int(header.frame_size) == 626
 
+def test_from_int():
+    """
+    test_from_int : headers from header words match headers from bytes, and the same word
+    gives back the same header
+    """
+    fields = ['sync_word', 'mpeg_version', 'layer', 'error_protection', 'bitrate', 'frequency',
+              'pad_bit', 'priv_bit', 'channel', 'mode_extention', 'copy', 'original', 'emphasis',
+              'padding', 'samples_per_frame', 'frame_size', 'side_info_length']
+    for header_str in [b'\xff\xfb\xb0\x00', b'\xff\xfa\x92\x64', b'\xff\xfb\x50\xc7',
+                       b'\xff\xf3\x48\x8e']:
+        word = int.from_bytes(header_str, 'big')
+        header = MP3Header.from_int(word)
+        expected = MP3Header(header_str)
+        for field in fields:
+            assert getattr(header, field) == getattr(expected, field)
+        assert MP3Header.from_int(word) is header
+    # free format bitrate and reserved frequency
+    for header_str in [b'\xff\xfb\x00\x00', b'\xff\xfb\x9c\x00']:
+        try:
+            MP3Header.from_int(int.from_bytes(header_str, 'big'))
+            assert False, 'parsed an invalid header'
+        except InvalidFieldEncodingException:
+            pass
+
+def test_lsf_header():
+    """
+    test_lsf_header : MPEG 2 and 2.5 headers have their own bitrates, half size frames and
+    smaller side info
+    """
+    # MPEG 2, 80kbps, 22.05kHz, mono
+    header = MP3Header(b'\xff\xf3\x90\xc0')
+    assert header.mpeg_version == MPEGVersionEncodings.MPEG_V2
+    assert header.lsf
+    assert (header.bitrate, header.frequency, header.samples_per_frame) == (80000, 22050, 576)
+    assert header.frame_size == 72 * 80000 // 22050
+    assert header.side_info_length == 9
+    # MPEG 2.5, 8kbps, 8kHz, padded, stereo
+    header = MP3Header(b'\xff\xe3\x1a\x00')
+    assert header.mpeg_version == MPEGVersionEncodings.MPEG_V2_5
+    assert (header.bitrate, header.frequency) == (8000, 8000)
+    assert header.frame_size == 72 + 1
+    assert header.side_info_length == 17
+    assert not MP3Header(b'\xff\xfb\xb0\x00').lsf
+
 def main():
     """
     main : run tests
     """
     test_header_decoding()
+    test_from_int()
+    test_lsf_header()
 
 if __name__ == '__main__':
     main()
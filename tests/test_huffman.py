@@ -0,0 +1,97 @@
+"""
+test_huffman.py : test the huffman decoding
+"""
+
+import random
+import sys
+from array import array
+sys.path.append('../mp3po')
+
+from mp3po.huffman import HUFFMAN_TABLE_INFO, get_lookup_table, lookup_codeword, traverse_table
+from mp3po.huffman import decode_big_values, decode_count1, decode_quadruples, decode_region
+from mp3po.util.bits import BitReader
+
+def test_lookup_matches_tree_walk():
+    """
+    test_lookup_matches_tree_walk : the lookup tables decode the same values and lengths
+    as walking the tree one bit at a time
+    """
+    rand = random.Random(3)
+    data = bytes(rand.getrandbits(8) for _ in range(512))
+    for table_num, (table, tree_length, _) in enumerate(HUFFMAN_TABLE_INFO):
+        if tree_length == 0:
+            continue
+        lookup = get_lookup_table(table_num)
+        walked = BitReader(data)
+        looked_up = BitReader(data)
+        while walked.bits_left() > 64:
+            start = walked.tell()
+            x, y = traverse_table(table, walked)
+            got_x, got_y, length = lookup_codeword(looked_up, lookup)
+            assert (got_x, got_y) == (x, y)
+            assert length == walked.tell() - start
+            assert looked_up.tell() == walked.tell()
+
+def test_decode_region_matches_pairs():
+    """
+    test_decode_region_matches_pairs : a whole region decodes to the same lines as
+    decoding one pair at a time, and stops at the end bit
+    """
+    rand = random.Random(5)
+    data = bytes(rand.getrandbits(8) for _ in range(2048))
+    for table_num in [1, 7, 13, 16, 24, 31]:
+        reader = BitReader(data)
+        expected = []
+        for _ in range(0, 576, 2):
+            expected.extend(decode_big_values(reader, table_num))
+        end_bit = reader.tell()
+        lines = array('i', [7]) * 576
+        reader = BitReader(data)
+        assert decode_region(reader, table_num, 0, 576, lines, end_bit + 64) == 576
+        assert list(lines) == expected
+        assert reader.tell() == end_bit
+
+        # stop halfway through the data
+        lines = array('i', [7]) * 576
+        reader = BitReader(data)
+        stopped = decode_region(reader, table_num, 0, 576, lines, end_bit // 2)
+        assert 0 < stopped < 576
+        assert list(lines[:stopped]) == expected[:stopped]
+        assert not any(lines[stopped:])
+
+def test_decode_count1_stops_at_boundary():
+    """
+    test_decode_count1_stops_at_boundary : quadruples run until the end bit, a quadruple
+    that crosses it is thrown away and the rest of the granule is zeroed
+    """
+    rand = random.Random(11)
+    data = bytes(rand.getrandbits(8) for _ in range(64))
+    for table_select in [0, 1]:
+        reader = BitReader(data)
+        expected = []
+        ends = []
+        while len(expected) < 100:
+            expected.extend(decode_quadruples(reader, 32 + table_select))
+            ends.append(reader.tell())
+        # end one bit into a quadruple that is longer than one bit
+        last = 10
+        while ends[last + 1] - ends[last] == 1:
+            last += 1
+        end_bit = ends[last] + 1
+        stop = 100 + 4 * (last + 1)
+        lines = array('i', [7]) * 576
+        reader = BitReader(data)
+        assert decode_count1(reader, table_select, 100, lines, end_bit) == stop
+        assert list(lines[100:stop]) == expected[:stop - 100]
+        assert not any(lines[stop:])
+
+def main():
+    """
+    main : run tests
+    """
+    test_lookup_matches_tree_walk()
+    test_decode_region_matches_pairs()
+    test_decode_count1_stops_at_boundary()
+
+if __name__ == '__main__':
+    main()
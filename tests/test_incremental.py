@@ -0,0 +1,103 @@
+"""
+test_incremental.py : test the push style decoder and the sources MP3File reads through it
+"""
+
+import io
+import os
+import random
+import sys
+sys.path.append('../mp3po')
+
+from mp3_fixtures import make_mp3
+from test_mp3 import frame_summary, write_temp_file
+from test_stream import file_pcm
+from test_tags import id3v2_tag
+from mp3po.incremental import BRIDGE_SIZE, IncrementalDecoder
+from mp3po.mp3 import MP3File
+
+def feed_in_chunks(decoder: IncrementalDecoder, data: bytes, sizes: list) -> list:
+    """
+    feed_in_chunks : feed data in chunks of the given sizes (the last one repeated), pulling
+    PCM after each. returns the PCM blocks
+    """
+    pcm = []
+    position = 0
+    count = 0
+    while position < len(data):
+        size = sizes[min(count, len(sizes) - 1)]
+        decoder.feed(data[position:position + size])
+        position += size
+        count += 1
+        pcm.extend(decoder.pcm())
+    decoder.feed_eof()
+    pcm.extend(decoder.pcm())
+    return pcm
+
+def test_chunks():
+    """
+    test_chunks : any way the stream is cut up, it decodes the same as the file: byte by
+    byte, in chunks smaller and bigger than a frame, and bigger than the bridge between them
+    """
+    data = (id3v2_tag([('TIT2', b'\x03title')]) + b'\xff\xfb\x00junk'
+            + make_mp3(20, seed=4) + b'\xff\xfb')
+    expected = file_pcm(data)
+    assert len(expected) == 20
+    rand = random.Random(1)
+    for sizes in ([1], [100], [417], [BRIDGE_SIZE + 300], [3, BRIDGE_SIZE * 2, 10],
+                  [rand.randint(1, 3000) for _ in range(0, 40)], [len(data)]):
+        decoder = IncrementalDecoder(skip_id3v2=True)
+        assert feed_in_chunks(decoder, data, sizes) == expected
+
+def test_position():
+    """
+    test_position : position follows the end of each frame, and buffered what's left to
+    search, across chunks
+    """
+    data = make_mp3(6, seed=2, use_reservoir=False)
+    decoder = IncrementalDecoder()
+    decoder.feed(data[0:1000])
+    decoder.feed(data[1000:])
+    assert decoder.buffered() == len(data)
+    ends = []
+    for frame in decoder.frames():
+        ends.append(decoder.position)
+    assert decoder.next_frame() is None
+    decoder.feed_eof()
+    ends.extend(decoder.position for frame in decoder.frames())
+    frame_size = len(data) // 6
+    assert ends == [frame_size * i for i in range(1, 7)]
+    assert decoder.buffered() == 0
+
+def test_sources():
+    """
+    test_sources : MP3File reads paths, bytes and file objects alike, and a pipe style
+    stream decodes the same through iter_frames
+    """
+    data = id3v2_tag([('TIT2', b'\x03title')]) + make_mp3(8, seed=6)
+    filename = write_temp_file(data)
+    try:
+        expected = [frame_summary(f) for f in MP3File(filename).iter_frames()]
+        with open(filename, 'rb') as audio:
+            assert [frame_summary(f) for f in MP3File(audio).iter_frames()] == expected
+    finally:
+        os.remove(filename)
+    assert len(expected) == 8
+    assert [frame_summary(f) for f in MP3File(data).iter_frames()] == expected
+    mp3 = MP3File(io.BytesIO(data))
+    assert [frame_summary(f) for f in mp3.iter_frames()] == expected
+    assert mp3.tags['title'] == 'title'
+    assert MP3File(data).frame_index().offsets == MP3File(io.BytesIO(data)).frame_index().offsets
+    decoder = IncrementalDecoder(skip_id3v2=True)
+    frames = decoder.iter_frames(io.BytesIO(data), chunk_size=333)
+    assert [frame_summary(f) for f in frames] == expected
+
+def main():
+    """
+    main : run tests
+    """
+    test_chunks()
+    test_position()
+    test_sources()
+
+if __name__ == '__main__':
+    main()
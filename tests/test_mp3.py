@@ -0,0 +1,229 @@
+"""
+test_mp3.py : test reading frames out of MP3 files
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append('../mp3po')
+
+from mp3_fixtures import make_mp3, xing_frame
+from mp3po.batch import decode_file_parallel
+from mp3po.cache import DecodeCache
+from mp3po.main_data import MainData
+from mp3po.mp3 import MP3File
+from mp3po.sync import FrameScanner
+
+def write_temp_file(data: bytes) -> str:
+    """
+    write_temp_file : write data to a temporary file and return its name
+    """
+    handle, filename = tempfile.mkstemp(suffix='.mp3')
+    with os.fdopen(handle, 'wb') as out:
+        out.write(data)
+    return filename
+
+def frame_summary(frame) -> tuple:
+    """
+    frame_summary : enough of a frame to tell two frames apart
+    """
+    return (frame.header.frame_size, frame.side_info.main_data_begin,
+            [list(c) for g in frame.main_data.frequency_lines for c in g if c is not None])
+
+def test_iter_frames():
+    """
+    test_iter_frames : frames come out back to back after leading junk,
+    the same way from the memory map and from small chunks
+    """
+    junk = b'\x00\xff\x12' * 100
+    stream = make_mp3(6, use_reservoir=False)
+    filename = write_temp_file(junk + stream)
+    try:
+        mp3 = MP3File(filename)
+        assert mp3.position == len(junk)
+        frames = list(mp3.iter_frames())
+        assert len(frames) == 6
+        assert mp3.position == len(junk) + len(stream)
+
+        chunked = MP3File(filename)
+        chunked.chunk_size = 1000
+        chunked_frames = list(chunked.iter_frames(use_mmap=False))
+        assert [frame_summary(f) for f in chunked_frames] == [frame_summary(f) for f in frames]
+    finally:
+        os.remove(filename)
+
+def test_read_frames_continues():
+    """
+    test_read_frames_continues : read_frames picks up where the last call stopped
+    """
+    filename = write_temp_file(make_mp3(5, seed=3, use_reservoir=False))
+    try:
+        expected = [frame_summary(f) for f in MP3File(filename).read_frames(5)]
+        mp3 = MP3File(filename)
+        got = mp3.read_frames(2) + mp3.read_frames(2) + mp3.read_frames(2)
+        assert [frame_summary(f) for f in got] == expected
+        assert mp3.read_frames(1) == []
+    finally:
+        os.remove(filename)
+
+def test_bit_reservoir():
+    """
+    test_bit_reservoir : frames get their main data from main_data_begin bytes back
+    """
+    main_data = []
+    filename = write_temp_file(make_mp3(12, seed=4, main_data=main_data))
+    try:
+        frames = MP3File(filename).read_frames(12)
+        assert len(frames) == 12
+        assert any(f.side_info.main_data_begin for f in frames)
+        for frame, raw_bytes in zip(frames, main_data):
+            expected = MainData(frame.header, frame.side_info, raw_bytes)
+            assert frame.main_data.frequency_lines == expected.frequency_lines
+            assert frame.main_data.scalefac_l == expected.scalefac_l
+    finally:
+        os.remove(filename)
+
+def test_frame_index():
+    """
+    test_frame_index : the seek table has every frame's offset and first sample
+    """
+    junk = b'\x00' * 50
+    stream = make_mp3(8, seed=5)
+    filename = write_temp_file(junk + stream)
+    try:
+        index = MP3File(filename).frame_index()
+        assert len(index) == 8
+        assert list(index.offsets) == [len(junk) + 417 * i for i in range(0, 8)]
+        assert list(index.samples) == [1152 * i for i in range(0, 8)]
+        assert index.total_samples == 8 * 1152
+        assert index.end == len(junk) + len(stream)
+        assert index.frame_for_sample(0) == 0
+        assert index.frame_for_sample(1151) == 0
+        assert index.frame_for_sample(1152) == 1
+        assert index.frame_for_time(index.duration()) == 8
+        frames = MP3File(filename).read_frames(8)
+        for i, frame in enumerate(frames):
+            assert index.header(i).frame_size == frame.header.frame_size
+            assert index.main_data_begin(i) == frame.side_info.main_data_begin
+            assert str(index.side_info(i)) == str(frame.side_info)
+    finally:
+        os.remove(filename)
+
+def test_seek():
+    """
+    test_seek : after seeking, frames come out the same as when reading from the start,
+    main data from before the seek target included
+    """
+    filename = write_temp_file(make_mp3(20, seed=6))
+    try:
+        expected = [frame_summary(f) for f in MP3File(filename).read_frames(20)]
+        mp3 = MP3File(filename)
+        for target in [13, 2, 19, 0, 7]:
+            start = mp3.seek((target * 1152 + 100) / 44100)
+            assert start == target * 1152 / 44100
+            got = [frame_summary(f) for f in mp3.read_frames(20)]
+            assert got == expected[target:]
+        assert mp3.seek(1000.0) == 20 * 1152 / 44100
+        assert mp3.read_frames(1) == []
+    finally:
+        os.remove(filename)
+
+def free_format(data: bytes) -> bytes:
+    """
+    free_format : the same frames with the bitrate bits of their headers cleared
+    """
+    data = bytearray(data)
+    scanner = FrameScanner()
+    position = 0
+    while True:
+        position, header = scanner.next_frame(data, position, len(data))
+        if header is None:
+            return bytes(data)
+        data[position + 2] &= 0x0F
+        position += header.frame_size
+
+def test_free_format_seek():
+    """
+    test_free_format_seek : free format frames keep their sizes in the frame index, so
+    seeking, cached clips and split decodes work as for any other file
+    """
+    data = make_mp3(12, seed=8)
+    free = free_format(data)
+    assert free != data
+    filename = write_temp_file(free)
+    try:
+        expected = [frame_summary(f) for f in MP3File(filename).read_frames(12)]
+        assert expected == [frame_summary(f) for f in MP3File(data).read_frames(12)]
+        mp3 = MP3File(filename)
+        index = mp3.frame_index()
+        assert len(index) == 12
+        assert index.header(3).frame_size == index.offsets[4] - index.offsets[3]
+        for target in [9, 1, 5]:
+            mp3.seek_frame(target)
+            assert [frame_summary(f) for f in mp3.read_frames(12)] == expected[target:]
+        full = MP3File(data).read_pcm(12)
+        clip = DecodeCache(block_frames=4).read_pcm(filename, 5, 4)
+        assert clip == [samples[5 * 1152:9 * 1152] for samples in full]
+        assert decode_file_parallel(filename, 2).pcm == full
+    finally:
+        os.remove(filename)
+
+def test_xing_duration():
+    """
+    test_xing_duration : a Xing frame gives the duration and bitrate without a scan and
+    isn't returned as a frame itself
+    """
+    stream = make_mp3(10, seed=8)
+    toc = [i * 256 // 100 for i in range(0, 100)]
+    tag = xing_frame(10, 417 * 11, toc)
+    filename = write_temp_file(tag + stream)
+    try:
+        mp3 = MP3File(filename)
+        assert mp3.vbr_header.frames == 10
+        assert mp3.duration() == 10 * 1152 / 44100
+        assert abs(mp3.bitrate() - 417 * 11 * 8 / mp3.duration()) < 1e-6
+        assert mp3.index is None
+        assert mp3.first_frame == len(tag)
+        assert len(mp3.frame_index()) == 10
+        assert len(mp3.read_frames(20)) == 10
+    finally:
+        os.remove(filename)
+
+def test_approximate_seek():
+    """
+    test_approximate_seek : seeking by the table of contents or the bitrate lands on a frame
+    near the requested time without building the index
+    """
+    stream = make_mp3(20, seed=9, use_reservoir=False)
+    expected = None
+    toc = [i * 256 // 100 for i in range(0, 100)]
+    for prefix in [xing_frame(20, 417 * 21, toc), b'']:
+        filename = write_temp_file(prefix + stream)
+        try:
+            mp3 = MP3File(filename)
+            expected = expected or [frame_summary(f) for f in mp3.read_frames(20)]
+            assert mp3.seek(10 * 1152 / 44100 + 0.001, exact=False) > 0.26
+            assert mp3.index is None
+            got = [frame_summary(f) for f in mp3.read_frames(20)]
+            assert 8 <= 20 - len(got) <= 12
+            assert got == expected[20 - len(got):]
+            mp3.seek(100.0, exact=False)
+            assert mp3.read_frames(1) == []
+        finally:
+            os.remove(filename)
+
+def main():
+    """
+    main : run tests
+    """
+    test_iter_frames()
+    test_read_frames_continues()
+    test_bit_reservoir()
+    test_frame_index()
+    test_seek()
+    test_free_format_seek()
+    test_xing_duration()
+    test_approximate_seek()
+
+if __name__ == '__main__':
+    main()
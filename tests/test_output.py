@@ -0,0 +1,156 @@
+"""
+test_output.py : test the WAV and raw PCM writers and the decode command
+"""
+
+import io
+import os
+import struct
+import sys
+import wave
+from array import array
+sys.path.append('../mp3po')
+
+from mp3_fixtures import make_mp3
+from test_mp3 import write_temp_file
+from mp3po.__main__ import main as mp3po_main
+from mp3po.mp3 import MP3File
+from mp3po.output import F32LE, RawWriter, WavWriter, decode_to, interleave, to_s16
+
+class PipeOutput(object):
+    """
+    PipeOutput : a binary output that can't seek, like a pipe
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data) -> int:
+        """
+        write : collect the data
+        """
+        self.data += data
+        return len(data)
+
+    def flush(self):
+        """
+        flush : nothing to do
+        """
+
+    def tell(self):
+        """
+        tell : pipes don't know where they are
+        """
+        raise OSError('not seekable')
+
+def test_to_s16():
+    """
+    test_to_s16 : samples are scaled, rounded and clipped
+    """
+    samples = array('d', [0.0, 0.5, -0.5, 1.0, -1.0, 2.0, -3.0, 1 / 65536, -0.99999])
+    assert list(to_s16(samples)) == [0, 16384, -16384, 32767, -32768, 32767, -32768, 0,
+                                     -32768]
+
+def test_interleave():
+    """
+    test_interleave : channels are interleaved sample by sample, from any buffer
+    """
+    left = array('d', [0.25, 0.5, 0.75])
+    right = [-0.25, -0.5, -0.75]
+    assert list(interleave([left, right])) == [8192, -8192, 16384, -16384, 24576, -24576]
+    floats = interleave([memoryview(left), right], F32LE)
+    assert floats.typecode == 'f'
+    assert list(floats) == [0.25, -0.25, 0.5, -0.5, 0.75, -0.75]
+
+def test_wav():
+    """
+    test_wav : a WAV file written frame by frame holds the same samples as the decoded file,
+    with the sizes in its header patched in
+    """
+    data = make_mp3(6, seed=4)
+    pcm = MP3File(data).read_pcm(6)
+    out = io.BytesIO()
+    mp3 = MP3File(data)
+    with WavWriter(out, 2, mp3.first_header.frequency) as writer:
+        assert decode_to(mp3, writer) == 6
+    assert writer.frames == 6 * 1152
+    with wave.open(io.BytesIO(out.getvalue())) as wav:
+        assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (2, 2, 44100)
+        assert wav.getnframes() == 6 * 1152
+        samples = array('h', wav.readframes(wav.getnframes()))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    assert samples == interleave(pcm)
+
+def test_float_wav():
+    """
+    test_float_wav : 32-bit float WAVs have a fact chunk with the frame count
+    """
+    pcm = MP3File(make_mp3(2, seed=1, mode=3)).read_pcm(2)
+    out = io.BytesIO()
+    with WavWriter(out, 1, 44100, F32LE) as writer:
+        writer.write(pcm)
+    raw_bytes = out.getvalue()
+    assert raw_bytes[0:4] == b'RIFF' and raw_bytes[8:12] == b'WAVE'
+    assert struct.unpack('<I', raw_bytes[4:8])[0] == len(raw_bytes) - 8
+    assert struct.unpack('<HHIIHH', raw_bytes[20:36]) == (3, 1, 44100, 4 * 44100, 4, 32)
+    assert raw_bytes[38:42] == b'fact' and struct.unpack('<I', raw_bytes[46:50])[0] == 2304
+    assert raw_bytes[50:54] == b'data' and struct.unpack('<I', raw_bytes[54:58])[0] == 4 * 2304
+    assert raw_bytes[58:] == interleave(pcm, F32LE).tobytes()
+
+def test_raw_and_pipes():
+    """
+    test_raw_and_pipes : raw output is just the samples, and a WAV going somewhere that
+    can't seek keeps its placeholder sizes
+    """
+    pcm = MP3File(make_mp3(3, seed=2)).read_pcm(3)
+    out = io.BytesIO()
+    with RawWriter(out, 2) as writer:
+        writer.write(pcm)
+    assert not out.closed
+    assert out.getvalue() == interleave(pcm).tobytes()
+
+    pipe = PipeOutput()
+    with WavWriter(pipe, 2, 44100) as writer:
+        writer.write(pcm)
+    assert struct.unpack('<I', pipe.data[40:44])[0] == 0xFFFFFFFF
+    assert bytes(pipe.data[44:]) == interleave(pcm).tobytes()
+    try:
+        RawWriter(out, 2, 'u8')
+        assert False
+    except ValueError:
+        pass
+
+def test_main():
+    """
+    test_main : python -m mp3po decode writes a WAV file
+    """
+    data = make_mp3(4, seed=9)
+    filename = write_temp_file(data)
+    junk = write_temp_file(b'junk')
+    output = filename + '.wav'
+    try:
+        assert mp3po_main(['decode', filename, output]) == 0
+        with wave.open(output) as wav:
+            assert wav.getnframes() == 4 * 1152
+        assert mp3po_main(['decode', '--raw', '--format', 'f32le', '--max-frames', '2',
+                           filename, output]) == 0
+        assert os.path.getsize(output) == 2 * 1152 * 2 * 4
+        assert mp3po_main(['decode', junk, output]) == 1
+    finally:
+        os.remove(filename)
+        os.remove(junk)
+        os.remove(output)
+
+def main():
+    """
+    main : run tests
+    """
+    test_to_s16()
+    test_interleave()
+    test_wav()
+    test_float_wav()
+    test_raw_and_pipes()
+    test_main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+test_probe.py : test probing files from their frame headers
+"""
+
+import sys
+sys.path.append('../mp3po')
+
+import mp3po
+from mp3_fixtures import make_mp3, xing_frame
+from test_tags import id3v1_tag, id3v2_tag
+from mp3po.header import ChannelEncodings, LayerEncodings, MPEGVersionEncodings
+from mp3po.main_data import MainData
+from mp3po.sideinfo import SideInfo
+
+def test_cbr():
+    """
+    test_cbr : a constant bitrate file's format and exact length, counted or extrapolated
+    """
+    data = (id3v2_tag([('TIT2', b'\x03title')]) + make_mp3(40, seed=1, mode=3)
+            + id3v1_tag('title', 'artist', 1))
+    result = mp3po.probe(data)
+    assert result.mpeg_version == MPEGVersionEncodings.MPEG_V1
+    assert result.layer == LayerEncodings.THREE
+    assert result.channel_mode == ChannelEncodings.MONO
+    assert (result.channels, result.frequency) == (1, 44100)
+    assert (result.frames, result.samples) == (40, 40 * 1152)
+    assert abs(result.duration - 40 * 1152 / 44100) < 1e-9
+    # 417 byte frames, without padding
+    assert abs(result.bitrate - 417 * 8 * 44100 / 1152) < 1e-6
+    assert not result.vbr and result.exact and result.vbr_header is None
+
+    estimate = mp3po.probe(data, max_frames=5)
+    assert not estimate.exact
+    assert (estimate.frames, estimate.samples) == (40, 40 * 1152)
+    assert estimate.summary()['channel_mode'] == 'MONO'
+
+def test_vbr():
+    """
+    test_vbr : frames of different bitrates make a variable bitrate file, and a Xing tag's
+    frame count stands in for frames not walked
+    """
+    frames = [make_mp3(1, seed=i, bitrate_index=9 + i % 3, use_reservoir=False)
+              for i in range(0, 12)]
+    data = b''.join(frames)
+    result = mp3po.probe(data)
+    assert result.vbr and result.exact
+    assert result.frames == 12
+    assert abs(result.bitrate - len(data) * 8 / result.duration) < 1e-6
+
+    tagged = xing_frame(frames=12, nbytes=len(data) + 417) + data
+    result = mp3po.probe(tagged, max_frames=2)
+    assert result.vbr and not result.exact
+    assert result.vbr_header.kind == 'Xing'
+    assert result.frames == 12
+
+def test_headers_only():
+    """
+    test_headers_only : probing never parses side info or main data
+    """
+    def fail(*args):
+        raise AssertionError('parsed more than the headers')
+    side_info_init, main_data_init = SideInfo.__init__, MainData.__init__
+    SideInfo.__init__, MainData.__init__ = fail, fail
+    try:
+        assert mp3po.probe(make_mp3(10, seed=2)).frames == 10
+    finally:
+        SideInfo.__init__, MainData.__init__ = side_info_init, main_data_init
+
+def test_no_frames():
+    """
+    test_no_frames : a file without frames probes as empty
+    """
+    result = mp3po.probe(b'not an mp3 at all' * 10)
+    assert (result.frames, result.duration, result.layer) == (0, 0.0, None)
+
+def main():
+    """
+    main : run tests
+    """
+    test_cbr()
+    test_vbr()
+    test_headers_only()
+    test_no_frames()
+
+if __name__ == '__main__':
+    main()
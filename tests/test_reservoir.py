@@ -0,0 +1,45 @@
+"""
+test_reservoir.py : test the bit reservoir
+"""
+
+import sys
+sys.path.append('../mp3po')
+
+from mp3po.reservoir import BitReservoir
+
+def test_main_data_spans_frames():
+    """
+    test_main_data_spans_frames : main data starts main_data_begin bytes back, across
+    as many moves of the buffer as it takes
+    """
+    reservoir = BitReservoir(frames_per_move=1)
+    stream = b''
+    for index in range(0, 40):
+        slot = bytes([index]) * (300 + index)
+        begin = min(len(stream), 511, 7 * index)
+        got = reservoir.frame_main_data(begin, slot)
+        stream += slot
+        assert bytes(got) == stream[len(stream) - len(slot) - begin:]
+
+def test_missing_main_data():
+    """
+    test_missing_main_data : asking for more than the reservoir holds gives None,
+    but the slot is still kept for the frames after it
+    """
+    reservoir = BitReservoir()
+    assert reservoir.frame_main_data(10, b'abc') is None
+    assert bytes(reservoir.frame_main_data(3, b'def')) == b'abcdef'
+    reservoir.reset()
+    assert reservoir.frame_main_data(1, b'ghi') is None
+    assert bytes(reservoir.frame_main_data(0, b'x' * 5000)) == b'x' * 5000
+    assert bytes(reservoir.frame_main_data(2, b'jk')) == b'xxjk'
+
+def main():
+    """
+    main : run tests
+    """
+    test_main_data_spans_frames()
+    test_missing_main_data()
+
+if __name__ == '__main__':
+    main()
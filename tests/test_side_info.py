@@ -2,9 +2,11 @@
 test_side_info.py : test decoding MP3 side information
 """
 
+import random
 import sys
 sys.path.append('../mp3po')
 
+from mp3_fixtures import header_bytes, random_channel_side_info, side_info_bytes
 from mp3po.sideinfo import SideInfo
 from mp3po.header import MP3Header, ChannelEncodings
 
@@ -112,6 +114,58 @@ def test_side_info(side_info, wanted_results):
             print('want: {}'.format(granule_2_expected[key]))
             raise err
 
+def test_mono_side_info():
+    """
+    test_mono_side_info : mono frames have one channel per granule, and nothing has a __dict__
+    """
+    rand = random.Random(0)
+    channels = [[random_channel_side_info(rand, 1000)] for _ in range(0, 2)]
+    raw_bytes = side_info_bytes(300, channels, [[1, 0, 1, 1]])
+    assert len(raw_bytes) == 17
+    side_info = SideInfo(MP3Header(header_bytes(mode=3)), raw_bytes)
+    assert side_info.main_data_begin == 300
+    assert side_info.scfsi_band == [[1, 0, 1, 1]]
+    assert len(side_info.granules) == 2
+    for granule, expected in zip(side_info.granules, channels):
+        assert len(granule.channels) == 1
+        channel = granule.channels[0]
+        for key in ['part2_3_length', 'big_values', 'global_gain', 'scalefac_compress',
+                    'window_switch_flag', 'preflag', 'scalefac_scale', 'count1_table_select']:
+            assert getattr(channel, key) == expected[0][key]
+        assert not hasattr(channel, '__dict__')
+        assert not hasattr(granule, '__dict__')
+    assert not hasattr(side_info, '__dict__')
+
+def test_lsf_side_info():
+    """
+    test_lsf_side_info : MPEG 2/2.5 side info has one granule, 8 bits of main_data_begin,
+    9 bits of scalefac_compress and preflag from scalefac_compress
+    """
+    rand = random.Random(1)
+    channels = [[random_channel_side_info(rand, 1000, lsf=True) for _ in range(0, 2)]]
+    channels[0][0]['scalefac_compress'] = 501
+    channels[0][1]['scalefac_compress'] = 499
+    raw_bytes = side_info_bytes(200, channels, None, lsf=True)
+    assert len(raw_bytes) == 17
+    header = MP3Header(header_bytes(mode=0, version=2))
+    assert header.side_info_length == 17
+    side_info = SideInfo(header, raw_bytes)
+    assert side_info.main_data_begin == 200
+    assert len(side_info.granules) == 1
+    for channel, expected in zip(side_info.granules[0].channels, channels[0]):
+        for key in ['part2_3_length', 'big_values', 'global_gain', 'scalefac_compress',
+                    'window_switch_flag', 'scalefac_scale', 'count1_table_select']:
+            assert getattr(channel, key) == expected[key]
+    assert [c.preflag for c in side_info.granules[0].channels] == [1, 0]
+    # the right channel's scalefac_compress means something else with intensity stereo
+    header = MP3Header(header_bytes(mode=1, mode_extention=1, version=2))
+    channels[0][1]['scalefac_compress'] = 501
+    side_info = SideInfo(header, side_info_bytes(200, channels, None, lsf=True))
+    assert [c.preflag for c in side_info.granules[0].channels] == [1, 0]
+    mono = SideInfo(MP3Header(header_bytes(mode=3, version=0)),
+                    side_info_bytes(255, [channels[0][0:1]], None, lsf=True))
+    assert mono.main_data_begin == 255
+    assert len(mono.granules[0].channels) == 1
 
 def main():
     """
@@ -128,6 +182,8 @@ def main():
     side_info_two_bytes = b'\xe4\x15*\xcb\x97o \x00\x83\x05Y\x93k\x0cl\x0f\xa8\xa50Me\xe9\xc1\xf3\x9e&\x8d\xa6\x0b\x10hu'
     side_info_two = SideInfo(header_two, side_info_two_bytes)
     test_side_info(side_info_two, EXPECTED_RESULTS[1])
+    test_mono_side_info()
+    test_lsf_side_info()
 
 
 if __name__ == '__main__':
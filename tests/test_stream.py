@@ -0,0 +1,145 @@
+"""
+test_stream.py : test decoding MP3 data as it arrives
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import random
+import sys
+sys.path.append('../mp3po')
+
+from mp3_fixtures import make_mp3
+from test_mp3 import frame_summary, write_temp_file
+from test_tags import id3v2_tag
+from mp3po.mp3 import MP3File
+from mp3po.stream import AsyncMP3Decoder
+
+def file_pcm(data: bytes) -> list:
+    """
+    file_pcm : decode data through MP3File, one list of PCM blocks per frame
+    """
+    filename = write_temp_file(data)
+    try:
+        mp3 = MP3File(filename)
+        return [mp3.decoder.decode(frame) for frame in mp3.iter_frames()]
+    finally:
+        os.remove(filename)
+
+async def feed_randomly(decoder: AsyncMP3Decoder, data: bytes, seed=0):
+    """
+    feed_randomly : feed data in chunks of random sizes
+    """
+    rand = random.Random(seed)
+    position = 0
+    while position < len(data):
+        size = rand.randint(1, 700)
+        await decoder.feed(data[position:position + size])
+        position += size
+    decoder.feed_eof()
+
+async def collect(decoder: AsyncMP3Decoder) -> list:
+    """
+    collect : all the PCM blocks the decoder gives
+    """
+    return [pcm async for pcm in decoder]
+
+def test_feed():
+    """
+    test_feed : fed in odd sized chunks, the stream decodes the same as the file, ID3v2 tag
+    and reservoir included
+    """
+    data = id3v2_tag([('APIC', make_mp3(3, use_reservoir=False))]) + make_mp3(12, seed=3)
+    expected = file_pcm(data)
+    async def run():
+        decoder = AsyncMP3Decoder(max_buffer=0)
+        feeding = asyncio.ensure_future(feed_randomly(decoder, data))
+        got = await collect(decoder)
+        await feeding
+        return got
+    got = asyncio.run(run())
+    assert len(got) == 12
+    assert got == expected
+
+def test_stream_reader_and_executor():
+    """
+    test_stream_reader_and_executor : read from a StreamReader, decode in a thread pool
+    """
+    data = make_mp3(6, seed=4, mode=3)
+    expected = file_pcm(data)
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            decoder = AsyncMP3Decoder(executor=executor)
+            reading = asyncio.ensure_future(decoder.read_from(reader, chunk_size=100))
+            got = await collect(decoder)
+            await reading
+        return got
+    assert asyncio.run(run()) == expected
+
+def test_main_data_parsed_in_executor():
+    """
+    test_main_data_parsed_in_executor : the event loop only syncs frames and fills the
+    reservoir: the main data is parsed in the executor, with the same result
+    """
+    data = make_mp3(8, seed=7)
+    filename = write_temp_file(data)
+    try:
+        expected = [frame_summary(f) for f in MP3File(filename).iter_frames()]
+    finally:
+        os.remove(filename)
+    async def run():
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            decoder = AsyncMP3Decoder(executor=executor)
+            await decoder.feed(data)
+            decoder.feed_eof()
+            unparsed = decoder.incremental.next_frame()
+            assert unparsed.main_data is None
+            assert isinstance(unparsed.raw_main_data, bytes)
+            loop = asyncio.get_running_loop()
+            parsed = await loop.run_in_executor(executor, unparsed.parse_main_data)
+            return [parsed] + [frame async for frame in decoder.frames()]
+    frames = asyncio.run(run())
+    assert [frame_summary(f) for f in frames] == expected
+    assert all(frame.raw_main_data is None for frame in frames)
+
+def test_backpressure():
+    """
+    test_backpressure : feed waits while the buffer is full, and frames come out as soon
+    as they're complete
+    """
+    data = make_mp3(30, seed=5, use_reservoir=False)
+    async def run():
+        decoder = AsyncMP3Decoder(max_buffer=0)
+        await decoder.feed(data[0:decoder.max_buffer])
+        blocked = asyncio.ensure_future(decoder.feed(data[decoder.max_buffer:]))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        frames = decoder.frames()
+        first = await frames.__anext__()
+        await asyncio.sleep(0.01)
+        assert blocked.done()
+        decoder.feed_eof()
+        rest = [frame async for frame in frames]
+        return [first] + rest
+    frames = asyncio.run(run())
+    filename = write_temp_file(data)
+    try:
+        expected = [frame_summary(f) for f in MP3File(filename).iter_frames()]
+    finally:
+        os.remove(filename)
+    assert [frame_summary(f) for f in frames] == expected
+
+def main():
+    """
+    main : run tests
+    """
+    test_feed()
+    test_stream_reader_and_executor()
+    test_main_data_parsed_in_executor()
+    test_backpressure()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+test_sync.py : test finding frames in a byte stream
+"""
+
+import sys
+sys.path.append('../mp3po')
+
+from mp3_fixtures import header_bytes, make_mp3
+from mp3po.sync import FrameScanner, is_valid_header_word
+
+def scan(data: bytes, chunk_size=None) -> list:
+    """
+    scan : (offset, frame size) of every frame the scanner finds, feeding it the data
+    chunk_size bytes at a time if given
+    """
+    scanner = FrameScanner()
+    frames = []
+    base = 0
+    buffer = b''
+    chunk_size = chunk_size or len(data)
+    for start in range(0, len(data) + 1, chunk_size):
+        buffer += data[start:start + chunk_size]
+        final = start + chunk_size >= len(data)
+        position = 0
+        while True:
+            position, header = scanner.next_frame(buffer, position, len(buffer), final)
+            if header is None:
+                break
+            frames.append((base + position, header.frame_size))
+            position += header.frame_size
+        if final:
+            break
+        base += position
+        buffer = buffer[position:]
+    return frames
+
+def test_header_word_validation():
+    """
+    test_header_word_validation : reserved codes and other layers don't pass
+    """
+    assert is_valid_header_word(0xFFFB9064)
+    assert not is_valid_header_word(0xFFFB9C64)   # reserved frequency
+    assert not is_valid_header_word(0xFFFBF064)   # bad bitrate
+    assert not is_valid_header_word(0xFFEB9064)   # reserved version
+    assert not is_valid_header_word(0xFFF99064)   # reserved layer
+    assert not is_valid_header_word(0xFFFD9064)   # layer II
+    assert not is_valid_header_word(0xFF7B9064)   # not a sync word
+
+def test_false_syncs():
+    """
+    test_false_syncs : valid looking headers in junk aren't frames unless another frame
+    follows them
+    """
+    junk = (b'\x00' * 37 + header_bytes() + b'\xff\xfb' + b'\xff' * 20) * 10
+    stream = make_mp3(5, use_reservoir=False)
+    frames = scan(junk + stream)
+    assert frames == [(len(junk) + 417 * i, 417) for i in range(0, 5)]
+
+def test_resync_after_corruption():
+    """
+    test_resync_after_corruption : a broken frame is skipped and the scanner picks up at
+    the next good one
+    """
+    stream = bytearray(make_mp3(8, use_reservoir=False))
+    stream[3 * 417 + 1] = 0x00
+    stream[5 * 417 + 100:5 * 417 + 104] = header_bytes(bitrate_index=14)
+    scanner = FrameScanner()
+    frames = []
+    position = 0
+    while True:
+        position, header = scanner.next_frame(stream, position, len(stream))
+        if header is None:
+            break
+        frames.append(position)
+        position += header.frame_size
+    assert frames == [417 * i for i in range(0, 8) if i != 3]
+    assert scanner.resyncs == 1
+    assert scanner.skipped == 417
+
+def test_chunks():
+    """
+    test_chunks : the frames found don't depend on how the data is split up
+    """
+    data = b'\xff' * 10 + make_mp3(6) + b'TAG' + bytes(125)
+    whole = scan(data)
+    assert len(whole) == 6
+    for chunk_size in [1, 7, 416, 417, 1000]:
+        assert scan(data, chunk_size) == whole
+
+def test_free_format():
+    """
+    test_free_format : free format frames are as long as the distance to the next one
+    """
+    sizes = [500, 501, 500, 501]
+    data = b''.join(header_bytes(bitrate_index=0, pad_bit=size - 500) + bytes(size - 4)
+                    for size in sizes)
+    assert scan(data) == [(sum(sizes[0:i]), size) for i, size in enumerate(sizes)]
+    header = FrameScanner().next_frame(data, 0, len(data))[1]
+    assert header.bitrate == 500 * 44100 // 144
+
+def main():
+    """
+    main : run tests
+    """
+    test_header_word_validation()
+    test_false_syncs()
+    test_resync_after_corruption()
+    test_chunks()
+    test_free_format()
+
+if __name__ == '__main__':
+    main()
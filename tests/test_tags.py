@@ -0,0 +1,155 @@
+"""
+test_tags.py : test skipping and reading ID3v2, ID3v1 and APEv2 tags
+"""
+
+import os
+import sys
+sys.path.append('../mp3po')
+
+from mp3_fixtures import header_bytes, make_mp3
+from test_mp3 import frame_summary, write_temp_file
+from mp3po.mp3 import MP3File
+from mp3po.tags import id3v2_size, parse_id3v2, synchsafe
+
+def synchsafe_bytes(value: int) -> bytes:
+    """
+    synchsafe_bytes : encode a 28-bit synchsafe integer
+    """
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+def id3v2_tag(frames: list, major=3, footer=False, padding=0) -> bytes:
+    """
+    id3v2_tag : an ID3v2.3 or 2.4 tag holding (frame id, body) pairs, or (frame id, body,
+    format flags) triples
+    """
+    body = b''
+    for frame_id, frame_body, *format_flags in frames:
+        size = len(frame_body).to_bytes(4, 'big')
+        if major == 4:
+            size = synchsafe_bytes(len(frame_body))
+        flags = bytes([0, format_flags[0] if format_flags else 0])
+        body += frame_id.encode('ascii') + size + flags + frame_body
+    body += bytes(padding)
+    flags = 0x10 if footer else 0
+    tag = b'ID3' + bytes([major, 0, flags]) + synchsafe_bytes(len(body)) + body
+    if footer:
+        tag += b'3DI' + bytes([major, 0, flags]) + synchsafe_bytes(len(body))
+    return tag
+
+def id3v1_tag(title: str, artist: str, track: int) -> bytes:
+    """
+    id3v1_tag : an ID3v1.1 tag
+    """
+    def field(text, size):
+        return text.encode('latin-1').ljust(size, b'\x00')
+    return (b'TAG' + field(title, 30) + field(artist, 30) + field('', 30) + b'1999'
+            + field('hi', 28) + bytes([0, track, 17]))
+
+def ape_tag(items: dict) -> bytes:
+    """
+    ape_tag : an APEv2 tag with a header and footer
+    """
+    body = b''
+    for key, value in items.items():
+        value = value.encode('utf-8')
+        body += len(value).to_bytes(4, 'little') + bytes(4) + key.encode('ascii') + b'\x00' + value
+    def block(flags):
+        return (b'APETAGEX' + (2000).to_bytes(4, 'little') + (len(body) + 32).to_bytes(4, 'little')
+                + len(items).to_bytes(4, 'little') + flags.to_bytes(4, 'little') + bytes(8))
+    return block(0xA0000000) + body + block(0x80000000)
+
+def test_synchsafe():
+    """
+    test_synchsafe : 7 bits per byte
+    """
+    assert synchsafe(b'\x00\x00\x02\x01') == 257
+    assert synchsafe(synchsafe_bytes(12345678)) == 12345678
+    assert id3v2_size(id3v2_tag([], padding=300, footer=True)) == 320
+    assert id3v2_size(b'ID3\x03\x00\x00\x00\x00\x80\x00') == 0
+
+def test_leading_tags():
+    """
+    test_leading_tags : ID3v2 tags full of things that look like frames are skipped
+    """
+    # cover art that's nothing but frame headers
+    art = (header_bytes() + bytes(413)) * 50
+    tag = (id3v2_tag([('TIT2', b'\x03Song \xc3\xa9'), ('APIC', art)], padding=100)
+           + id3v2_tag([('TPE1', b'\x01\xff\xfeB\x00a\x00n\x00d\x00'),
+                        ('COMM', b'\x00engdesc\x00comment')], major=4, footer=True))
+    stream = make_mp3(4, use_reservoir=False)
+    filename = write_temp_file(tag + stream)
+    try:
+        mp3 = MP3File(filename)
+        assert mp3.audio_start == len(tag)
+        assert mp3.position == len(tag)
+        assert len(mp3.read_frames(10)) == 4
+        assert mp3._tags is None
+        assert mp3.tags.get('title') == 'Song \xe9'
+        assert mp3.tags['artist'] == 'Band'
+        assert mp3.tags['comment'] == 'comment'
+        assert len(mp3.tags.id3v2['APIC'][0]) == len(art)
+        assert mp3.tags.get('album') is None
+    finally:
+        os.remove(filename)
+
+def test_id3v24_frame_flags():
+    """
+    test_id3v24_frame_flags : ID3v2.4 frames with a data length indicator, group id or
+    unsynchronization give just their data
+    """
+    text = b'\x03Song \xc3\xa9'
+    tag = id3v2_tag([('TIT2', synchsafe_bytes(len(text)) + text, 0x01),
+                     ('TPE1', b'\x07' + synchsafe_bytes(6) + b'\x03Band', 0x41),
+                     ('TALB', synchsafe_bytes(6) + b'\x03\xff\x00\xe0x', 0x03),
+                     ('TRCK', b'\x037', 0x00)], major=4)
+    frames = parse_id3v2(tag)
+    assert frames['TIT2'] == [text]
+    assert frames['TPE1'] == [b'\x03Band']
+    assert frames['TALB'] == [b'\x03\xff\xe0x']
+    assert frames['TRCK'] == [b'\x037']
+
+def test_trailing_tags():
+    """
+    test_trailing_tags : frames stop before APEv2 and ID3v1 tags at the end of the file
+    """
+    stream = make_mp3(5, seed=2)
+    expected = None
+    for trailer, fields in [
+            (ape_tag({'Artist' : 'Someone', 'Album' : 'Something'}) + id3v1_tag('Title', 'O', 7),
+             {'artist' : 'Someone', 'album' : 'Something', 'title' : 'Title', 'track' : '7'}),
+            (id3v1_tag('Title', 'Other', 7),
+             {'artist' : 'Other', 'title' : 'Title', 'comment' : 'hi', 'year' : '1999'}),
+            (ape_tag({'Title' : 'APE'}), {'title' : 'APE', 'artist' : None}),
+            # APEv2 after the ID3v1 tag
+            (id3v1_tag('Title', 'O', 7) + ape_tag({'Artist' : 'Someone'}),
+             {'artist' : 'Someone', 'title' : 'Title', 'track' : '7'})]:
+        filename = write_temp_file(stream + trailer)
+        try:
+            mp3 = MP3File(filename)
+            assert mp3.audio_end == len(stream)
+            frames = [frame_summary(f) for f in mp3.read_frames(10)]
+            expected = expected or frames
+            assert frames == expected and len(frames) == 5
+            assert len(MP3File(filename).frame_index()) == 5
+            for name, value in fields.items():
+                assert mp3.tags.get(name) == value
+        finally:
+            os.remove(filename)
+    # the ape tag wins over id3v1
+    filename = write_temp_file(stream + ape_tag({'Artist' : 'Someone'}) + id3v1_tag('T', 'O', 1))
+    try:
+        assert MP3File(filename).tags['artist'] == 'Someone'
+    finally:
+        os.remove(filename)
+
+def main():
+    """
+    main : run tests
+    """
+    test_synchsafe()
+    test_leading_tags()
+    test_id3v24_frame_flags()
+    test_trailing_tags()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+test_trace.py : test the opt-in trace hook
+"""
+
+import contextlib
+import io
+import logging
+import sys
+sys.path.append('../mp3po')
+
+from mp3_fixtures import make_mp3
+from mp3po import trace
+from mp3po.mp3 import MP3File
+
+def test_frame_events():
+    """
+    test_frame_events : each frame reports where it is and what its side info says, and
+    nothing goes to stdout
+    """
+    data = b'junk' + make_mp3(5, seed=7)
+    events = []
+    out = io.StringIO()
+    trace.set_hook(lambda event, fields: events.append((event, fields)))
+    try:
+        with contextlib.redirect_stdout(out):
+            mp3 = MP3File(data)
+            frames = list(mp3.iter_frames())
+    finally:
+        trace.set_hook(None)
+    assert out.getvalue() == ''
+    index = mp3.frame_index()
+    assert [event for event, _ in events] == ['frame'] * 5
+    assert [fields['offset'] for _, fields in events] == list(index.offsets)
+    assert ([fields['main_data_begin'] for _, fields in events]
+            == [frame.side_info.main_data_begin for frame in frames])
+    assert events[0][1]['main_data_bytes'] is not None
+    channel = frames[2].side_info.granules[1].channels[0]
+    assert events[2][1]['granules'][1][0]['table_select'] == list(channel.table_select)
+
+    # off again: no more events
+    list(MP3File(data).iter_frames())
+    assert len(events) == 5
+
+def test_log_events():
+    """
+    test_log_events : events can go to a logger instead
+    """
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    logger = logging.getLogger('mp3po.test')
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    trace.log_events(to_logger=logger)
+    try:
+        list(MP3File(make_mp3(2, seed=1)).iter_frames())
+    finally:
+        trace.set_hook(None)
+        logger.removeHandler(handler)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("frame {'offset': 0,")
+
+def main():
+    """
+    main : run tests
+    """
+    test_frame_events()
+    test_log_events()
+
+if __name__ == '__main__':
+    main()
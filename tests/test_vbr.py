@@ -0,0 +1,60 @@
+"""
+test_vbr.py : test reading Xing/Info and VBRI tags
+"""
+
+import sys
+sys.path.append('../mp3po')
+
+from mp3_fixtures import vbri_frame, xing_frame
+from mp3po.header import MP3Header
+from mp3po.vbr import parse_vbr_header
+
+def test_xing():
+    """
+    test_xing : every optional field gets read, and missing ones are None
+    """
+    toc = [i * 256 // 100 for i in range(0, 100)]
+    frame = xing_frame(1000, 400000, toc, 57)
+    tag = parse_vbr_header(MP3Header(frame[0:4]), frame)
+    assert tag.kind == 'Xing'
+    assert (tag.frames, tag.bytes, tag.toc, tag.quality) == (1000, 400000, toc, 57)
+    assert tag.seek_offset(0.0) == 0
+    assert abs(tag.seek_offset(0.5) - 200000) < 400000 / 256
+    assert abs(tag.seek_offset(0.995) - 398000) < 400000 / 256
+
+    frame = xing_frame(frames=20, kind=b'Info', mode=3)
+    tag = parse_vbr_header(MP3Header(frame[0:4]), frame)
+    assert tag.kind == 'Info'
+    assert (tag.frames, tag.bytes, tag.toc, tag.quality) == (20, None, None, None)
+    assert tag.seek_offset(0.5) is None
+
+def test_vbri():
+    """
+    test_vbri : the VBRI table of contents adds up frame group sizes
+    """
+    frame = vbri_frame(40, 20000, [4000, 6000, 2000, 8000], 10, scale=2)
+    tag = parse_vbr_header(MP3Header(frame[0:4]), frame)
+    assert tag.kind == 'VBRI'
+    assert (tag.frames, tag.bytes, tag.quality) == (40, 20000, 75)
+    assert tag.toc == [4000, 6000, 2000, 8000]
+    assert tag.seek_offset(0.25) == 4000
+    assert tag.seek_offset(0.375) == 7000
+    assert tag.seek_offset(1.0) == 20000
+
+def test_no_tag():
+    """
+    test_no_tag : an ordinary frame doesn't have a tag
+    """
+    frame = xing_frame(kind=b'Nope')
+    assert parse_vbr_header(MP3Header(frame[0:4]), frame) is None
+
+def main():
+    """
+    main : run tests
+    """
+    test_xing()
+    test_vbri()
+    test_no_tag()
+
+if __name__ == '__main__':
+    main()